@@ -0,0 +1,495 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+import numpy as np
+from resampler import ResamplingBridge
+
+
+class CallbackStats:
+    """Timing of audio callbacks against their real-time deadline."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.audio_time = 0.0     # Real time covered by the processed blocks
+        self.max_time = 0.0
+        self.last_time = 0.0
+        self.last_load = 0.0      # last_time / deadline
+        self.peak_load = 0.0      # Highest load since a reader last cleared it (BlockSizeController)
+        self.overruns = 0         # Callbacks that took longer than their deadline
+        self.xruns = 0            # Under/overflows reported by the driver
+        self.histogram = None     # diagnostics.TimingHistogram while timing diagnostics run
+
+    def record(self, duration, frames, sample_rate, status=0):
+        self.count += 1
+        self.total_time += duration
+        self.last_time = duration
+        if duration > self.max_time:
+            self.max_time = duration
+        deadline = frames / sample_rate
+        self.audio_time += deadline
+        self.last_load = duration / deadline
+        if self.last_load > self.peak_load:
+            self.peak_load = self.last_load
+        if duration > deadline:
+            self.overruns += 1
+        if status:
+            self.xruns += 1
+        histogram = self.histogram
+        if histogram is not None:
+            histogram.add(duration, deadline)
+
+    def summary(self):
+        mean = self.total_time / self.count if self.count else 0.0
+        return {
+            "callbacks": self.count,
+            "mean_ms": mean * 1000,
+            "max_ms": self.max_time * 1000,
+            "mean_load": self.total_time / self.audio_time if self.audio_time else 0.0,
+            "last_load": self.last_load,
+            "overruns": self.overruns,
+            "xruns": self.xruns,
+        }
+
+
+class AudioBackend(ABC):
+    """
+    Duplex audio stream abstraction.
+
+    Backends call process(indata, outdata, status) with float32 arrays of shape
+    (frames, channels) in the range -1..1. The callback writes its result into
+    outdata in place.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.process = None
+        self.sample_rate = 44100
+        self.channels = 2
+        self.blocksize = 1024
+        self.latency = None
+        self.input_rate = None
+        self.bridge = None
+        self.stats = CallbackStats()
+
+    def list_devices(self):
+        """Return a list of dicts with index, name, max_input_channels, max_output_channels, default_samplerate."""
+        return []
+
+    def find_device(self, keywords, kind="output"):
+        """
+        Return the index of the first device whose name contains one of the keywords.
+        A keyword that is a plain integer is treated as a device index.
+        """
+        channel_key = "max_input_channels" if kind == "input" else "max_output_channels"
+        devices = self.list_devices()
+        for keyword in keywords:
+            keyword = keyword.strip()
+            if keyword.isdigit():
+                return int(keyword)
+            for device in devices:
+                if device[channel_key] > 0 and keyword.lower() in device["name"].lower():
+                    return device["index"]
+        return None
+
+    def device_rate(self, index):
+        """Native (default) sample rate of a device, or None if unknown."""
+        for device in self.list_devices():
+            if device["index"] == index:
+                return int(device["default_samplerate"])
+        return None
+
+    @abstractmethod
+    def open(self, process, sample_rate=44100, channels=2, blocksize=1024, latency=None,
+             input_device=None, output_device=None, input_rate=None):
+        """
+        Open the stream at `sample_rate`. If `input_rate` differs, the input is
+        captured on its own stream at that rate and resampled for the callback.
+        """
+
+    def configure(self, process, sample_rate, channels, blocksize, latency, input_rate):
+        """Store stream parameters and set up a resampling bridge if the rates differ."""
+        self.process = process
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.latency = latency
+        self.input_rate = input_rate if input_rate is not None else sample_rate
+        self.bridge = None
+        if self.input_rate != sample_rate:
+            self.bridge = ResamplingBridge(self.input_rate, sample_rate, channels, blocksize)
+            print(f"Resampling input from {self.input_rate} Hz to {sample_rate} Hz")
+
+    @abstractmethod
+    def start(self):
+        """Start delivering callbacks."""
+
+    @abstractmethod
+    def stop(self):
+        """Stop delivering callbacks; the stream stays open."""
+
+    @abstractmethod
+    def close(self):
+        """Stop and release the stream."""
+
+    def share(self):
+        """
+        Return another backend of the same kind for a second stream, sharing
+        this one's host API handle where the library allows it.
+        """
+        return type(self)()
+
+    def rescan(self):
+        """Re-enumerate devices. The stream must be closed first."""
+
+    def is_active(self):
+        """Whether the stream is still delivering callbacks."""
+        return True
+
+    def run_callback(self, indata, outdata, frames, status=0):
+        """Invoke the processing callback and record its timing."""
+        start = time.perf_counter()
+        try:
+            self.process(indata, outdata, status)
+        except Exception as e:
+            print(f"Processing error: {e}")
+            outdata[:] = indata  # Pass through original audio on error
+        self.stats.record(time.perf_counter() - start, frames, self.sample_rate, status)
+
+
+class PyAudioBackend(AudioBackend):
+    """PortAudio through PyAudio, using paFloat32 so input needs no int16 conversion."""
+
+    name = "pyaudio"
+
+    def __init__(self, host=None):
+        super().__init__()
+        import pyaudio
+        self.pyaudio = pyaudio
+        # Backends made by share() use their host's PyAudio instance instead of starting another
+        self.host = host if host is not None else self
+        if host is None:
+            self.pa = pyaudio.PyAudio()
+        self.stream = None
+        self.input_stream = None
+        self.indata = None
+        self.outdata = None
+
+    def list_devices(self):
+        devices = []
+        for i in range(self.host.pa.get_device_count()):
+            info = self.host.pa.get_device_info_by_index(i)
+            devices.append({
+                "index": i,
+                "name": info["name"],
+                "max_input_channels": info["maxInputChannels"],
+                "max_output_channels": info["maxOutputChannels"],
+                "default_samplerate": info["defaultSampleRate"],
+            })
+        return devices
+
+    def open(self, process, sample_rate=44100, channels=2, blocksize=1024, latency=None,
+             input_device=None, output_device=None, input_rate=None):
+        # PyAudio does not expose a suggested latency, so `latency` is informational
+        self.configure(process, sample_rate, channels, blocksize, latency, input_rate)
+        self.indata = np.zeros((blocksize, channels), dtype=np.float32)
+        self.outdata = np.zeros((blocksize, channels), dtype=np.float32)
+        if self.bridge is not None:
+            self.input_stream = self.host.pa.open(
+                format=self.pyaudio.paFloat32,
+                channels=channels,
+                rate=self.input_rate,
+                input=True,
+                input_device_index=input_device,
+                frames_per_buffer=blocksize,
+                stream_callback=self.input_callback,
+                start=False,
+            )
+            self.stream = self.host.pa.open(
+                format=self.pyaudio.paFloat32,
+                channels=channels,
+                rate=sample_rate,
+                output=True,
+                output_device_index=output_device,
+                frames_per_buffer=blocksize,
+                stream_callback=self.callback,
+                start=False,
+            )
+            return
+        self.stream = self.host.pa.open(
+            format=self.pyaudio.paFloat32,
+            channels=channels,
+            rate=sample_rate,
+            input=True,
+            output=True,
+            input_device_index=input_device,
+            output_device_index=output_device,
+            frames_per_buffer=blocksize,
+            stream_callback=self.callback,
+            start=False,
+        )
+
+    def input_callback(self, in_data, frame_count, time_info, status):
+        self.bridge.push_input(np.frombuffer(in_data, dtype=np.float32).reshape(-1, self.channels))
+        return (None, self.pyaudio.paContinue)
+
+    def callback(self, in_data, frame_count, time_info, status):
+        if len(self.outdata) != frame_count:
+            self.indata = np.zeros((frame_count, self.channels), dtype=np.float32)
+            self.outdata = np.zeros((frame_count, self.channels), dtype=np.float32)
+        if self.bridge is not None:
+            self.bridge.pull_input(self.indata)
+            indata = self.indata
+        else:
+            indata = np.frombuffer(in_data, dtype=np.float32).reshape(-1, self.channels)
+        self.run_callback(indata, self.outdata, frame_count, status)
+        return (self.outdata.tobytes(), self.pyaudio.paContinue)
+
+    def start(self):
+        if self.input_stream is not None:
+            self.input_stream.start_stream()
+        self.stream.start_stream()
+
+    def stop(self):
+        for stream in (self.input_stream, self.stream):
+            if stream is not None:
+                stream.stop_stream()
+
+    def close(self):
+        for stream in (self.input_stream, self.stream):
+            if stream is not None:
+                stream.close()
+        self.input_stream = None
+        self.stream = None
+
+    def share(self):
+        return PyAudioBackend(host=self.host)
+
+    def rescan(self):
+        # PortAudio only enumerates devices on initialization, so restart this
+        # backend's single instance rather than creating another one. Shared
+        # backends just close; their streams must be closed before the host rescans.
+        self.close()
+        if self.host is not self:
+            return
+        self.pa.terminate()
+        self.pa = self.pyaudio.PyAudio()
+
+    def is_active(self):
+        return self.stream is not None and self.stream.is_active()
+
+
+class SoundDeviceBackend(AudioBackend):
+    """PortAudio through sounddevice with native float32 NumPy buffers."""
+
+    name = "sounddevice"
+
+    def __init__(self):
+        super().__init__()
+        import sounddevice
+        self.sd = sounddevice
+        self.stream = None
+        self.input_stream = None
+        self.indata = None
+
+    def list_devices(self):
+        devices = []
+        for i, info in enumerate(self.sd.query_devices()):
+            devices.append({
+                "index": i,
+                "name": info["name"],
+                "max_input_channels": info["max_input_channels"],
+                "max_output_channels": info["max_output_channels"],
+                "default_samplerate": info["default_samplerate"],
+            })
+        return devices
+
+    def open(self, process, sample_rate=44100, channels=2, blocksize=1024, latency=None,
+             input_device=None, output_device=None, input_rate=None):
+        self.configure(process, sample_rate, channels, blocksize, latency, input_rate)
+        latency = latency if latency is not None else "low"
+        if self.bridge is not None:
+            self.indata = np.zeros((blocksize, channels), dtype=np.float32)
+            self.input_stream = self.sd.InputStream(
+                samplerate=self.input_rate,
+                blocksize=blocksize,
+                device=input_device,
+                channels=channels,
+                dtype="float32",
+                latency=latency,
+                callback=self.input_callback,
+            )
+            self.stream = self.sd.OutputStream(
+                samplerate=sample_rate,
+                blocksize=blocksize,
+                device=output_device,
+                channels=channels,
+                dtype="float32",
+                latency=latency,
+                callback=self.output_callback,
+            )
+            return
+        self.stream = self.sd.Stream(
+            samplerate=sample_rate,
+            blocksize=blocksize,
+            device=(input_device, output_device),
+            channels=channels,
+            dtype="float32",
+            latency=latency,
+            callback=self.callback,
+        )
+
+    def callback(self, indata, outdata, frames, time_info, status):
+        self.run_callback(indata, outdata, frames, int(bool(status)))
+
+    def input_callback(self, indata, frames, time_info, status):
+        self.bridge.push_input(indata)
+
+    def output_callback(self, outdata, frames, time_info, status):
+        if len(self.indata) != frames:
+            self.indata = np.zeros((frames, self.channels), dtype=np.float32)
+        self.bridge.pull_input(self.indata)
+        self.run_callback(self.indata, outdata, frames, int(bool(status)))
+
+    def start(self):
+        if self.input_stream is not None:
+            self.input_stream.start()
+        self.stream.start()
+
+    def stop(self):
+        for stream in (self.input_stream, self.stream):
+            if stream is not None:
+                stream.stop()
+
+    def close(self):
+        for stream in (self.input_stream, self.stream):
+            if stream is not None:
+                stream.close()
+        self.input_stream = None
+        self.stream = None
+
+    def rescan(self):
+        self.close()
+        self.sd._terminate()
+        self.sd._initialize()
+
+    def is_active(self):
+        return self.stream is not None and self.stream.active
+
+
+class NullBackend(AudioBackend):
+    """
+    Hardware-free backend for benchmarking and headless testing.
+
+    Feeds `source` (a (frames, channels) array, looped) or silence through the
+    callback on a worker thread, either paced in real time or as fast as possible.
+    """
+
+    name = "null"
+
+    def __init__(self, source=None, realtime=True):
+        super().__init__()
+        self.source = source
+        self.realtime = realtime
+        self.position = 0
+        self.indata = None
+        self.outdata = None
+        self.running = False
+        self.worker = None
+
+    def share(self):
+        return NullBackend(self.source, self.realtime)
+
+    def list_devices(self):
+        return [{
+            "index": 0,
+            "name": "Null Loopback",
+            "max_input_channels": 2,
+            "max_output_channels": 2,
+            "default_samplerate": 44100.0,
+        }]
+
+    def open(self, process, sample_rate=44100, channels=2, blocksize=1024, latency=None,
+             input_device=None, output_device=None, input_rate=None):
+        # `source` is taken to be at input_rate; a bridge resamples it like a real split stream
+        self.configure(process, sample_rate, channels, blocksize, latency, input_rate)
+        self.input_credit = 0.0
+        self.indata = np.zeros((blocksize, channels), dtype=np.float32)
+        self.outdata = np.zeros((blocksize, channels), dtype=np.float32)
+
+    def next_input(self):
+        if self.source is None:
+            return self.indata
+        if self.bridge is not None:
+            # Feed exactly one output block's worth of source frames on average
+            self.input_credit += self.blocksize * self.input_rate / self.sample_rate
+            frames = int(self.input_credit)
+            self.input_credit -= frames
+            indices = (self.position + np.arange(frames)) % len(self.source)
+            self.position = (self.position + frames) % len(self.source)
+            self.bridge.push_input(self.source[indices])
+            self.bridge.pull_input(self.indata)
+            return self.indata
+        frames = self.blocksize
+        start = self.position
+        self.position = (start + frames) % len(self.source)
+        if start + frames <= len(self.source):
+            return self.source[start:start + frames]  # View, like a driver buffer
+        indices = (start + np.arange(frames)) % len(self.source)
+        np.take(self.source, indices, axis=0, out=self.indata)
+        return self.indata
+
+    def run_blocks(self, count):
+        """Synchronously process `count` blocks; returns the last output block."""
+        for _ in range(count):
+            self.run_callback(self.next_input(), self.outdata, self.blocksize)
+        return self.outdata
+
+    def run(self):
+        period = self.blocksize / self.sample_rate
+        next_block = time.perf_counter()
+        while self.running:
+            self.run_callback(self.next_input(), self.outdata, self.blocksize)
+            if self.realtime:
+                next_block += period
+                delay = next_block - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.worker = threading.Thread(target=self.run, name="NullBackend", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        self.running = False
+        if self.worker is not None:
+            self.worker.join(timeout=1.0)
+            self.worker = None
+
+    def close(self):
+        self.stop()
+
+    def is_active(self):
+        return self.running
+
+
+BACKENDS = {
+    "pyaudio": PyAudioBackend,
+    "sounddevice": SoundDeviceBackend,
+    "null": NullBackend,
+}
+
+
+def create_backend(name):
+    """Instantiate a backend by name ("pyaudio", "sounddevice" or "null")."""
+    try:
+        return BACKENDS[name.lower()]()
+    except KeyError:
+        raise ValueError(f"Unknown audio backend: {name}")
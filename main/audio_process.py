@@ -0,0 +1,426 @@
+"""
+Optional audio process (AUDIO_PROCESS=1): the streams, EQ engines and limiters
+run in a child process with raised scheduling priority, so Qt painting,
+Spotify HTTP calls and pickle I/O in the GUI process no longer hold the GIL
+the audio callback needs.
+
+The processes share one memory block:
+
+- a parameter slot per zone (enabled flag and gains), written by the GUI,
+- a stats slot per zone (callback timing, block size, loudness), written by
+  the audio process,
+- a spectrum slot per zone (long-term input level per band for
+  AUTO_EQ_MODE=spectrum), written by the audio process,
+- a ring of the displayed zone's output audio, which the GUI's spectrum
+  analyzer reads directly.
+
+Slots are seqlocks: the single writer makes the sequence odd, writes and makes
+it even again, and the reader retries if it changed under it, so neither side
+ever waits on the other. Only rare commands (reopen, capture, cache warming,
+correction profiles, diagnostics, shutdown) travel over a pipe.
+"""
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from correction import apply_corrections_from_env
+from ring_buffer import SharedRingBuffer
+
+LOUDNESS_FIELDS = ("input_momentary", "input_integrated", "eq_momentary", "eq_short_term",
+                   "eq_integrated", "compensation_db")
+STATS_FIELDS = ("callbacks", "mean_ms", "max_ms", "mean_load", "last_load", "overruns", "xruns",
+                "sample_rate", "blocksize", "active", "open") + LOUDNESS_FIELDS
+COUNT_FIELDS = ("callbacks", "overruns", "xruns", "sample_rate", "blocksize")
+
+
+class SnapshotSlot:
+    """Latest-value seqlock over a float64 array laid out as [sequence, values...]."""
+
+    MAX_RETRIES = 100  # A write takes microseconds; this allows a few milliseconds
+
+    def __init__(self, array):
+        self.array = array
+        self.last = (0.0, np.zeros(len(array) - 1))  # Last consistent read in this process
+
+    def write(self, values):
+        """Single writer only."""
+        self.array[0] += 1
+        self.array[1:] = values
+        self.array[0] += 1
+
+    def read(self):
+        """
+        Return (sequence, values copy); sequence 0 means never written. If the
+        writer stays mid-write (e.g. it died there), gives up after MAX_RETRIES
+        and returns the last consistent snapshot instead of spinning forever.
+        """
+        for _ in range(self.MAX_RETRIES):
+            sequence = self.array[0]
+            if sequence % 2 == 0:
+                values = self.array[1:].copy()
+                if self.array[0] == sequence:
+                    self.last = (sequence, values)
+                    return sequence, values.copy()
+            time.sleep(0)
+        return self.last[0], self.last[1].copy()
+
+
+class SharedLayout:
+    """Views of the shared block: parameter and stats slots per zone, then the display ring."""
+
+    def __init__(self, buffer, zones, bands, ring_frames, channels=2):
+        offset = 0
+
+        def take(count):
+            nonlocal offset
+            array = np.ndarray((count,), dtype=np.float64, buffer=buffer, offset=offset)
+            offset += count * 8
+            return array
+
+        self.params = [SnapshotSlot(take(2 + bands)) for _ in range(zones)]
+        self.stats = [SnapshotSlot(take(1 + len(STATS_FIELDS))) for _ in range(zones)]
+        self.spectra = [SnapshotSlot(take(1 + bands)) for _ in range(zones)]
+        self.ring = SharedRingBuffer(buffer[offset:], ring_frames, channels)
+
+    @staticmethod
+    def nbytes(zones, bands, ring_frames, channels=2):
+        return 8 * zones * (2 + bands + 1 + len(STATS_FIELDS) + 1 + bands) + SharedRingBuffer.nbytes(ring_frames, channels)
+
+
+class DisplayFeed:
+    """
+    Stands in for the spectrum analyzer and response curve inside the audio
+    process: the displayed zone's output goes into the shared ring, and rate
+    changes reach the GUI through the stats slot instead.
+    """
+
+    def __init__(self, ring):
+        self.ring = ring
+
+    def push(self, block):
+        self.ring.write(block)
+
+    def set_sample_rate(self, sample_rate):
+        pass
+
+
+def raise_priority():
+    """Best-effort higher scheduling priority for the calling (audio) process."""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            if kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), 0x00000080):  # HIGH_PRIORITY_CLASS
+                return "high priority class"
+            raise OSError("SetPriorityClass failed")
+        if hasattr(os, "sched_setscheduler"):
+            try:
+                # Threads PortAudio starts later inherit the policy
+                os.sched_setscheduler(0, os.SCHED_RR, os.sched_param(10))
+                return "SCHED_RR"
+            except PermissionError:
+                pass
+        os.nice(-10)
+        return "nice -10"
+    except (OSError, AttributeError) as e:
+        print(f"Audio process keeps normal priority: {e}")
+        return None
+
+
+def run_audio_process(bands, specs, backend_name, engine_name, memory_name, ring_frames, connection):
+    """Entry point of the audio process."""
+    from blocksize import blocksize_controller_from_env
+    from diagnostics import Diagnostics
+    from zones import ZoneManager
+
+    priority = raise_priority()
+    if priority:
+        print(f"Audio process running with {priority}")
+    memory = shared_memory.SharedMemory(name=memory_name)
+    layout = SharedLayout(memory.buf, len(specs), len(bands), ring_frames)
+    manager = ZoneManager(bands, specs, backend_name=backend_name, engine_name=engine_name)
+    feed = DisplayFeed(layout.ring)
+    print("Available Audio Devices:")
+    for device in manager.backend.list_devices():
+        print(f"Index {device['index']}: {device['name']}")
+
+    seen = [0.0] * len(manager.zones)
+    apply_params(manager, layout, seen)
+    manager.start()
+    controller = blocksize_controller_from_env(manager)
+    diagnostics = Diagnostics(manager)
+    next_stats = 0.0
+    try:
+        while True:
+            if connection.poll(0.01):
+                command, args = connection.recv()
+                if command == "close":
+                    break
+                handle_command(manager, feed, diagnostics, command, args)
+            apply_params(manager, layout, seen)
+            now = time.perf_counter()
+            if now >= next_stats:
+                next_stats = now + 0.1
+                publish_stats(manager, layout)
+    except (EOFError, OSError):
+        pass  # The GUI went away
+    finally:
+        if controller is not None:
+            controller.stop()
+        diagnostics.stop_all()
+        manager.close()
+
+
+def apply_params(manager, layout, seen):
+    """Pick up parameter snapshots the GUI wrote since the last pass."""
+    for i, zone in enumerate(manager.zones):
+        sequence, values = layout.params[i].read()
+        if sequence != seen[i] and sequence:
+            seen[i] = sequence
+            zone.enabled = bool(values[0])
+            zone.set_gains(values[1:])
+
+
+def publish_stats(manager, layout):
+    for i, zone in enumerate(manager.zones):
+        stats = zone.stats()
+        stats["active"] = float(zone.backend.is_active())
+        stats.update({key: math.nan if value is None else value for key, value in stats.pop("loudness").items()})
+        layout.stats[i].write([stats[field] for field in STATS_FIELDS])
+        if zone.spectrum is not None:
+            levels = zone.spectrum_levels()
+            layout.spectra[i].write(np.full(len(zone.engine.bands), math.nan) if levels is None else levels)
+
+
+def handle_command(manager, feed, diagnostics, command, args):
+    try:
+        if command == "reopen":
+            manager.reopen()
+        elif command == "retry":
+            manager.retry_failed()
+        elif command == "display":
+            for i, zone in enumerate(manager.zones):
+                if i == args:
+                    zone.attach_display(feed, feed)
+                elif zone.analyzer is feed:
+                    zone.attach_display(None, None)
+        elif command == "prepare":
+            index, gains = args
+            manager.zones[index].prepare(gains)
+        elif command == "correction":
+            index, profile = args
+            manager.zones[index].set_correction(profile)
+        elif command == "diagnostics":
+            kind, enabled, diagnostics.directory = args
+            if enabled:
+                diagnostics.start(kind)
+            else:
+                diagnostics.stop(kind)
+        elif command == "start_capture":
+            manager.start_capture(args)
+        elif command == "stop_capture":
+            manager.stop_capture()
+    except Exception as e:
+        print(f"Error handling audio process command '{command}': {e}")
+
+
+class RemoteZone:
+    """GUI-side handle of a zone running in the audio process; mirrors the parts of Zone the GUI uses."""
+
+    def __init__(self, process, index, name, bands):
+        self.process = process
+        self.index = index
+        self.name = name
+        self.preset = "Flat"
+        self.current_gains = [0] * bands
+        self._enabled = True
+        self.analyzer = None
+        self.response_curve = None
+        self.sample_rate = None
+        self.correction = None  # Profile loaded from the GUI, sent again if the audio process restarts
+        self.write_params()
+
+    def write_params(self):
+        with self.process.lock:
+            self.process.layout.params[self.index].write([float(self._enabled)] + list(self.current_gains))
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, enabled):
+        self._enabled = enabled
+        self.write_params()
+
+    def set_gains(self, gains):
+        self.current_gains = [int(gain) for gain in gains]
+        self.write_params()
+
+    def gains(self):
+        return list(self.current_gains)
+
+    def prepare(self, gains):
+        self.process.send("prepare", (self.index, [float(gain) for gain in gains]))
+
+    def set_correction(self, profile):
+        self.correction = profile
+        self.process.send("correction", (self.index, profile))
+
+    def spectrum_levels(self):
+        sequence, levels = self.process.layout.spectra[self.index].read()
+        if sequence == 0 or np.isnan(levels).any():
+            return None
+        return levels
+
+    def attach_display(self, analyzer, response_curve):
+        """Point `analyzer` at the shared output ring and have the audio process feed it from this zone."""
+        self.analyzer = analyzer
+        self.response_curve = response_curve
+        if analyzer is not None:
+            analyzer.ring = self.process.layout.ring
+            self.sample_rate = None  # Rates are applied on the next stats() read
+            self.process.send("display", self.index)
+
+    def read_stats(self):
+        sequence, values = self.process.layout.stats[self.index].read()
+        values = dict(zip(STATS_FIELDS, values.tolist()))
+        summary = {key: value for key, value in values.items() if key not in LOUDNESS_FIELDS and key != "active"}
+        for key in COUNT_FIELDS:
+            summary[key] = int(summary[key])
+        summary["zone"] = self.name
+        summary["correction"] = self.correction["name"] if self.correction else None
+        summary["loudness"] = {key: None if math.isnan(values[key]) else values[key] for key in LOUDNESS_FIELDS}
+        summary["active"] = bool(values["active"]) or sequence == 0  # Not reported yet while starting
+        summary["open"] = bool(values["open"]) or sequence == 0
+        return summary
+
+    def stats(self):
+        """Latest stats from the audio process; also moves the attached displays to a new stream rate."""
+        summary = self.read_stats()
+        rate = summary["sample_rate"]
+        if rate and rate != self.sample_rate and self.analyzer is not None:
+            self.sample_rate = rate
+            self.analyzer.set_sample_rate(rate)
+            self.response_curve.set_sample_rate(rate)
+        return summary
+
+
+class AudioProcess:
+    """
+    Runs the zones in a child process. Offers the ZoneManager methods the GUI
+    uses (zones, start, reopen, close, capture, is_active, stats), so it can
+    stand in for one.
+    """
+
+    def __init__(self, bands, specs, backend_name="pyaudio", engine_name="cascade", ring_frames=8192):
+        self.bands = list(bands)
+        self.specs = specs
+        self.backend_name = backend_name
+        self.engine_name = engine_name
+        self.ring_frames = ring_frames
+        self.memory = shared_memory.SharedMemory(
+            create=True, size=SharedLayout.nbytes(len(specs), len(self.bands), ring_frames))
+        self.layout = SharedLayout(self.memory.buf, len(specs), len(self.bands), ring_frames)
+        self.lock = threading.Lock()  # Serializes GUI-side writers: slots have one writer, the pipe one sender
+        self.context = multiprocessing.get_context("spawn")  # Never fork a process running Qt
+        self.process = None
+        self.connection = None
+        self.display_index = 0
+        self.diagnostics = {}  # Kind -> report directory of the diagnostics running in the audio process
+        self.capture_directory = None  # Directory of the running capture, if any
+        self.zones = [RemoteZone(self, i, name, len(self.bands)) for i, (name, _, _) in enumerate(specs)]
+        apply_corrections_from_env(self.zones)  # Cached fits, so the GUI knows the profiles too
+
+    def start(self):
+        """Start the audio process; it opens the streams itself."""
+        if self.connection is not None:
+            self.connection.close()
+        self.connection, child_connection = self.context.Pipe()
+        self.process = self.context.Process(
+            target=run_audio_process,
+            args=(self.bands, self.specs, self.backend_name, self.engine_name, self.memory.name,
+                  self.ring_frames, child_connection),
+            name="AudioProcess",
+            daemon=True,
+        )
+        self.process.start()
+        child_connection.close()
+        self.send("display", self.display_index)
+        for zone in self.zones:
+            if zone.correction is not None:
+                zone.set_correction(zone.correction)
+        # A restarted process starts without them; its report covers the time since the restart
+        for kind, directory in list(self.diagnostics.items()):
+            self.send("diagnostics", (kind, True, directory))
+        if self.capture_directory is not None:
+            self.send("start_capture", self.capture_directory)  # Continues in new files
+
+    def send(self, command, args=None):
+        if command == "display":
+            self.display_index = args
+        elif command == "diagnostics":
+            kind, enabled, directory = args
+            if enabled:
+                self.diagnostics[kind] = directory
+            else:
+                self.diagnostics.pop(kind, None)
+        elif command == "start_capture":
+            self.capture_directory = args
+        elif command == "stop_capture":
+            self.capture_directory = None
+        with self.lock:
+            if self.connection is None:
+                return
+            try:
+                self.connection.send((command, args))
+            except (BrokenPipeError, OSError) as e:
+                print(f"Audio process unreachable: {e}")
+
+    def reopen(self):
+        """Reopen the streams; restarts the audio process if it died."""
+        if self.process is not None and self.process.is_alive():
+            self.send("reopen")
+            return
+        print("Audio process not running, restarting it")
+        self.start()  # It reads the current parameters from the shared slots
+
+    def start_capture(self, directory):
+        self.send("start_capture", directory)
+
+    def stop_capture(self):
+        self.send("stop_capture")
+
+    def retry_failed(self):
+        self.send("retry")
+
+    def has_failed(self):
+        """Whether the audio process could not open some zone's stream."""
+        return not all(zone.read_stats()["open"] for zone in self.zones)
+
+    def is_active(self):
+        """Whether the audio process is alive and every opened zone's stream is delivering callbacks."""
+        if self.process is None or not self.process.is_alive():
+            return False
+        return all(stats["active"] for stats in (zone.read_stats() for zone in self.zones) if stats["open"])
+
+    def stats(self):
+        return [zone.stats() for zone in self.zones]
+
+    def close(self):
+        if self.process is not None:
+            self.send("close")
+            self.process.join(timeout=5.0)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        # The analyzer may still hold views of the block, so only release its name;
+        # the mapping itself goes away with the process
+        self.memory.unlink()
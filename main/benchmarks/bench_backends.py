@@ -0,0 +1,75 @@
+"""
+Compare the callback cost of the old PyAudio bytes-in/bytes-out path with the
+in-place float path used by the backends, without audio hardware.
+
+Run from the main/ directory:
+    python benchmarks/bench_backends.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from audio_backend import NullBackend
+from eq_engine import EqualizerEngine
+from limiter import Limiter
+
+BANDS = [60, 170, 310, 600, 1000, 3000, 6000, 12000, 14000, 16000]
+GAINS = [6, 4, 3, 2, 0, 2, 4, 6, 5, 3]
+BLOCKS = 2000
+
+
+def make_chain(full_scale, dsp):
+    """Return a block -> block function: the EQ + limiter chain, or a passthrough."""
+    if not dsp:
+        return lambda block: block
+    engine = EqualizerEngine(BANDS)
+    engine.set_gains(GAINS)
+    limiter = Limiter(full_scale=full_scale)
+    return lambda block: limiter.process(engine.process(block))
+
+
+def bench_bytes_path(blocksize, source, dsp):
+    """Replicates the old int16 bytes callback: frombuffer -> process -> astype -> tobytes."""
+    chain = make_chain(32767.0, dsp)
+    in_bytes = (source[:blocksize] * 32767).astype(np.int16).tobytes()
+    times = []
+    for _ in range(BLOCKS):
+        start = time.perf_counter()
+        audio_data = np.frombuffer(in_bytes, dtype=np.int16).reshape(-1, 2)
+        processed = chain(audio_data)
+        np.clip(processed, -32768, 32767).astype(np.int16).tobytes()
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+def bench_inplace_path(blocksize, source, dsp):
+    """Drives the float32 in-place callback through the null backend."""
+    chain = make_chain(1.0, dsp)
+
+    def process(indata, outdata, status):
+        np.clip(chain(indata), -1.0, 1.0, out=outdata)
+
+    backend = NullBackend(source=source, realtime=False)
+    backend.open(process, blocksize=blocksize)
+    times = []
+    for _ in range(BLOCKS):
+        start = time.perf_counter()
+        backend.run_blocks(1)
+        times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    source = (rng.standard_normal((44100, 2)) * 0.1).astype(np.float32)
+    print(f"{'blocksize':>10} {'chain':>12} {'path':>10} {'mean us':>10} {'p99 us':>10} {'load %':>8}")
+    for dsp in (False, True):
+        for blocksize in (128, 256, 512, 1024):
+            for name, bench in (("bytes", bench_bytes_path), ("in-place", bench_inplace_path)):
+                times = bench(blocksize, source, dsp) * 1e6
+                load = np.mean(times) / (blocksize / 44100 * 1e6) * 100
+                print(f"{blocksize:>10} {'eq+limiter' if dsp else 'passthrough':>12} {name:>10} "
+                      f"{np.mean(times):>10.1f} {np.percentile(times, 99):>10.1f} {load:>8.2f}")
@@ -0,0 +1,40 @@
+"""
+Time to fit a correction against a synthetic headphone measurement, for
+several band counts, and how close the fitted bands get to the target.
+
+The budget is well under a second per fit. Run from the main/ directory:
+    python benchmarks/bench_correction.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from correction import PeakingFitter, correction_curve
+from dsp import peaking_sos, sos_response_db
+
+BAND_COUNTS = [5, 10, 15, 20]
+REPEATS = 5
+
+
+def synthetic_measurement(rng):
+    """Bass roll-off, a 3 kHz ear-gain peak, treble resonances and measurement ripple."""
+    freqs = np.geomspace(20, 20000, 600)
+    sos = peaking_sos([40, 2800, 6500, 9000, 12000], [0.6, 2.0, 4.0, 3.0, 1.5], [-5, 7, -6, 4, -3], 48000)
+    db = sos_response_db(sos, freqs, 48000).sum(axis=0) + rng.normal(0, 0.3, len(freqs))
+    return freqs, db
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    curve = correction_curve(synthetic_measurement(rng))
+    print(f"{'bands':>6} {'fit ms':>8} {'RMS error dB':>13}")
+    for count in BAND_COUNTS:
+        fitter = PeakingFitter()
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            _, error = fitter.fit(curve, count)
+        elapsed = (time.perf_counter() - start) / REPEATS
+        print(f"{count:>6} {elapsed * 1000:>8.1f} {error:>13.2f}")
@@ -0,0 +1,75 @@
+"""
+Cost of the dynamic EQ against the static cascade at 10 and 31 bands, and how
+much it pulls a bass boost back on a bass-heavy signal.
+
+The budget (see DynamicEqualizerEngine) is at most 2% of the block deadline
+on top of the static cascade at 1024 frames. Run from the main/ directory:
+    python benchmarks/bench_dynamic_eq.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dynamic_eq import DynamicEqualizerEngine
+from eq_engine import EqualizerEngine
+
+SAMPLE_RATE = 44100
+BLOCKSIZES = [256, 1024, 4096]
+BUDGET = 0.02
+REPEATS = 500
+
+LAYOUTS = {
+    "10-band": [60, 170, 310, 600, 1000, 3000, 6000, 12000, 14000, 16000],
+    "31-band": list(np.geomspace(20, 20000, 31)),
+}
+
+
+def time_engine(engine, block):
+    engine.process(block)
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        engine.process(block)
+    return (time.perf_counter() - start) / REPEATS
+
+
+def bass_boost(bands):
+    """+6 dB below 100 Hz, +3 dB up to 300 Hz, like the bass-heavy genre presets."""
+    return [6 if band < 100 else 3 if band < 300 else 0 for band in bands]
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    print(f"{'layout':>8} {'block':>6} {'static us':>10} {'dynamic us':>11} {'extra':>7} {'budget':>7}")
+    for name, bands in LAYOUTS.items():
+        for blocksize in BLOCKSIZES:
+            block = rng.standard_normal((blocksize, 2)) * 0.1
+            static = EqualizerEngine(bands, SAMPLE_RATE)
+            dynamic = DynamicEqualizerEngine(bands, SAMPLE_RATE)
+            # Every band active, and loud enough that the dynamic sections are redesigned each block
+            gains = [3] * len(bands)
+            static.set_gains(gains)
+            dynamic.set_gains(gains)
+            dynamic.threshold_db[:] = -80.0
+            static_time = time_engine(static, block)
+            dynamic_time = time_engine(dynamic, block)
+            extra = (dynamic_time - static_time) / (blocksize / SAMPLE_RATE)
+            verdict = ("ok" if extra <= BUDGET else "OVER") if blocksize == 1024 else ""
+            print(f"{name:>8} {blocksize:>6} {static_time * 1e6:>10.1f} {dynamic_time * 1e6:>11.1f} "
+                  f"{extra * 100:>6.2f}% {verdict:>7}")
+
+    # Bass line at -12 dBFS RMS over quiet noise
+    print()
+    bands = LAYOUTS["10-band"]
+    t = np.arange(SAMPLE_RATE * 3) / SAMPLE_RATE
+    bass = np.sqrt(2) * 10 ** (-12 / 20) * np.sin(2 * np.pi * 60 * t)
+    signal = (bass[:, None] + rng.standard_normal((len(t), 2)) * 0.01)
+    print(f"{'engine':>8} {'60 Hz reduction dB':>19} {'output peak dBFS':>17}")
+    for engine in (EqualizerEngine(bands, SAMPLE_RATE), DynamicEqualizerEngine(bands, SAMPLE_RATE)):
+        engine.set_gains(bass_boost(bands))
+        output = np.concatenate([engine.process(signal[i:i + 1024]) for i in range(0, len(signal), 1024)])
+        reduction = getattr(engine, "reduction_db", np.zeros(len(bands)))[0]
+        peak = 20 * np.log10(np.max(np.abs(output[SAMPLE_RATE:])))
+        print(f"{type(engine).__name__[:8]:>8} {reduction:>19.1f} {peak:>17.1f}")
@@ -0,0 +1,382 @@
+"""
+Accuracy-versus-speed validation of the EQ engines against a float64
+reference built independently of the engines: one peaking_sos section per
+band, makeup gain from the peak of the cascade's response on a dense linear
+grid (scipy's sosfreqz), run over the whole signal in one sosfilt call.
+
+The oversampled engine is held to what it aims for instead: its high bands
+(at or above a quarter of the rate) designed at twice the rate, applied to
+the whole signal through scipy's zero-phase resample_poly with a long Kaiser
+filter, and their change added to the low bands' output. Its half-band
+stages roll that change off above about 0.43 of the rate, as documented, so
+it is fed test signals band-limited to 0.4 of the rate and its response is
+checked up to there; everything else is held to the same thresholds.
+
+Every trial draws a random band layout, preset, sample rate, block size and
+test signal, runs each engine block by block and compares it with the
+reference after compensating the engine's latency:
+
+- max / RMS error: sample error relative to the reference's RMS, in dB,
+- response: largest deviation of the engine's measured magnitude response
+  (from an impulse) from the reference's analytic one, 20 Hz - 20 kHz,
+- boundary: how far the largest jump of the error signal across a block
+  boundary exceeds its largest jump anywhere else, relative to the
+  reference's RMS, in dB, i.e. clicks the blocking adds on top of the
+  engine's general error (-300 when there are none),
+- speed: processed audio time over processing time (x real time).
+
+Engines are then placed on a speed/accuracy curve; an engine fails if its
+worst trial exceeds any threshold. Besides the shipped engines, a float32
+cascade and FFT convolution at two lengths are included as candidates.
+Exits with status 1 if any engine fails. Run from the main/ directory:
+    python benchmarks/bench_engine_accuracy.py [--trials 20] [--json report.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+from scipy import fft as sp_fft
+from scipy.signal import firwin, resample_poly, sosfilt, sosfreqz
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dsp import peaking_sos, sos_response_db
+from dynamic_eq import DynamicEqualizerEngine
+from eq_engine import EqualizerEngine
+from oversampling import OversampledEqualizerEngine
+from presets import BANDS, DEFAULT_GENRE_PRESETS
+
+SAMPLE_RATES = [44100, 48000, 96000]
+BLOCKSIZES = [64, 128, 256, 480, 512, 1024, 2048, 4096]
+LAYOUTS = {
+    "10-band": BANDS,
+    "31-band": list(np.geomspace(20, 20000, 31)),
+}
+SETTLE_SECONDS = 0.25  # Start-up transients (FIR histories, decimator state) are not counted
+IMPULSE_FRAMES = 1 << 16
+REFERENCE_GRID_POINTS = 1 << 16
+REFERENCE_RESAMPLER_TAPS = 255  # Per output phase of the reference's 2x resampler
+OVERSAMPLED_BANDWIDTH = 0.4  # Fraction of the rate the oversampled engine is checked below
+
+
+class Float32Engine(EqualizerEngine):
+    """Candidate: the cascade with coefficients, state and samples in float32."""
+
+    def reset(self):
+        super().reset()
+        self.zi32 = np.zeros(self.zi.shape, dtype=np.float32)
+        self.sos32 = {}
+
+    def process(self, block):
+        settings = self.settings
+        if settings.is_flat:
+            return np.asarray(block, dtype=np.float64)
+        sos = self.sos32.get(id(settings))
+        if sos is None:
+            sos = self.sos32[id(settings)] = settings.sos.astype(np.float32)
+        active = settings.active
+        output, self.zi32[active] = sosfilt(sos, np.asarray(block, dtype=np.float32), axis=0,
+                                            zi=self.zi32[active])
+        output *= np.float32(settings.makeup_gain)
+        return output
+
+
+class FFTConvolutionEngine(EqualizerEngine):
+    """Candidate: the cascade's impulse response truncated to `taps`, applied by overlap-save FFT convolution."""
+
+    def __init__(self, bands, taps=4096, **options):
+        self.taps = taps
+        self.spectra = {}
+        super().__init__(bands, **options)
+
+    def reset(self):
+        super().reset()
+        self.history = np.zeros((self.taps - 1, self.channels))
+
+    def process(self, block):
+        settings = self.settings
+        extended = np.concatenate((self.history, np.asarray(block, dtype=np.float64)))
+        self.history = extended[len(block):]
+        if settings.is_flat:
+            return extended[self.taps - 1:]
+        size = sp_fft.next_fast_len(len(extended), real=True)
+        spectrum = self.spectra.get((id(settings), size))
+        if spectrum is None:
+            impulse = np.zeros(self.taps)
+            impulse[0] = 1.0
+            spectrum = sp_fft.rfft(sosfilt(settings.sos, impulse) * settings.makeup_gain, size)[:, None]
+            self.spectra[(id(settings), size)] = spectrum
+        output = sp_fft.irfft(sp_fft.rfft(extended, size, axis=0) * spectrum, size, axis=0)
+        return output[self.taps - 1:len(extended)]
+
+
+# Name -> (engine class, options, block multiple, reference oversampling factor)
+ENGINES = {
+    "cascade": (EqualizerEngine, {}, 1, 1),
+    "cascade-float32": (Float32Engine, {}, 1, 1),
+    # Threshold out of reach: the dynamic engine must then match the static cascade
+    "dynamic-idle": (DynamicEqualizerEngine, {"threshold_db": 200.0}, 1, 1),
+    "oversampled": (OversampledEqualizerEngine, {"factor": 2}, 1, 2),
+    "fft-2048": (FFTConvolutionEngine, {"taps": 2048}, 1, 1),
+    "fft-8192": (FFTConvolutionEngine, {"taps": 8192}, 1, 1),
+}
+
+
+def make_signal(kind, frames, sample_rate, rng):
+    """Stereo test signal at about -20 dBFS RMS."""
+    t = np.arange(frames) / sample_rate
+    if kind == "white":
+        signal = rng.standard_normal((frames, 2))
+    elif kind == "pink":
+        spectrum = sp_fft.rfft(rng.standard_normal((frames, 2)), axis=0)
+        spectrum /= np.sqrt(np.maximum(np.arange(len(spectrum)), 1))[:, None]
+        signal = sp_fft.irfft(spectrum, frames, axis=0)
+    elif kind == "sweep":
+        # Log sweep 20 Hz -> 20 kHz (or Nyquist), the right channel a quarter period behind
+        high = min(20000.0, 0.45 * sample_rate)
+        rate = np.log(high / 20.0) / t[-1]
+        phase = 2 * np.pi * 20.0 * (np.exp(rate * t) - 1) / rate
+        signal = np.column_stack([np.sin(phase), np.cos(phase)])
+    else:  # "bursts": gated tones with hard edges, the worst case for boundary clicks
+        freqs = rng.uniform(30, 0.4 * sample_rate, 4)
+        signal = np.sin(2 * np.pi * freqs[None, :] * t[:, None]).reshape(frames, 2, 2).sum(axis=2)
+        signal *= (np.floor(t * rng.uniform(3, 12)) % 2)[:, None]
+    rms = np.sqrt(np.mean(signal ** 2))
+    return signal * (0.1 / rms if rms > 0 else 1.0)
+
+
+def random_trial(rng, seconds):
+    layout_name = rng.choice(list(LAYOUTS) + ["random"])
+    if layout_name == "random":
+        bands = sorted(np.exp(rng.uniform(np.log(25), np.log(16000), rng.integers(4, 20))))
+    else:
+        bands = LAYOUTS[layout_name]
+    if layout_name == "10-band" and rng.random() < 0.5:
+        preset_name = rng.choice(list(DEFAULT_GENRE_PRESETS))
+        gains = np.array(DEFAULT_GENRE_PRESETS[preset_name], dtype=np.float64)
+    else:
+        preset_name = "random"
+        gains = rng.integers(-12, 13, len(bands)).astype(np.float64)
+        gains[rng.random(len(bands)) < 0.3] = 0.0  # Some bands off, as in real presets
+        if not gains.any():
+            gains[0] = 6.0
+    sample_rate = int(rng.choice(SAMPLE_RATES))
+    return {
+        "layout": str(layout_name),
+        "bands": [float(band) for band in bands],
+        "preset": str(preset_name),
+        "gains": gains,
+        "sample_rate": sample_rate,
+        "blocksize": int(rng.choice(BLOCKSIZES)),
+        "signal": str(rng.choice(["white", "pink", "sweep", "bursts"])),
+        "frames": int(seconds * sample_rate),
+    }
+
+
+def reference_design(trial, factor=1, high_ratio=0.25, Q=1.0):
+    """
+    The float64 reference design: every non-zero band's peaking section and the
+    makeup gain, as (low sos, high sos, makeup gain). With `factor` > 1, bands at or
+    above `high_ratio` of the rate are designed at `factor` times the rate and
+    returned as the high sections; either sos may be None.
+    """
+    gains = trial["gains"]
+    bands = np.asarray(trial["bands"])
+    sample_rate = trial["sample_rate"]
+    active = np.flatnonzero(gains)
+    is_high = bands[active] >= high_ratio * sample_rate if factor > 1 else np.zeros(len(active), dtype=bool)
+    # Whole-cascade peak on a dense linear grid plus the band centers; only boosts are pulled down
+    freqs = np.union1d(np.linspace(1.0, sample_rate / 2, REFERENCE_GRID_POINTS, endpoint=False),
+                       bands[bands < sample_rate / 2])
+    response = np.ones(len(freqs), dtype=complex)
+    design = []
+    for indices, rate in ((active[~is_high], sample_rate), (active[is_high], sample_rate * factor)):
+        if len(indices) == 0:
+            design.append(None)
+            continue
+        sos = peaking_sos(bands[indices], Q, gains[indices], rate)
+        response *= sosfreqz(sos, worN=freqs, fs=rate)[1]
+        design.append(sos)
+    peak_db = 20 * np.log10(np.max(np.abs(response)))
+    return design[0], design[1], 10 ** (-max(peak_db, 0.0) / 20)
+
+
+def band_limit(signal, sample_rate, cutoff):
+    """Zero-phase brick-wall lowpass (FFT of the whole signal); the engine and the reference see the same input."""
+    spectrum = sp_fft.rfft(signal, axis=0)
+    spectrum[sp_fft.rfftfreq(len(signal), 1 / sample_rate) > cutoff] = 0.0
+    return sp_fft.irfft(spectrum, len(signal), axis=0)
+
+
+def run_reference(design, signal, factor=1):
+    """The reference output: low sections in one sosfilt call, high sections (if any) oversampled, then makeup."""
+    low, high, makeup_gain = design
+    output = signal if low is None else sosfilt(low, signal, axis=0)
+    if high is not None:
+        # Zero-phase resampling, so the reference has no latency
+        taps = firwin(2 * REFERENCE_RESAMPLER_TAPS * factor + 1, 1 / factor, window=("kaiser", 14.0))
+        upsampled = resample_poly(output, factor, 1, axis=0, window=taps)
+        modification = sosfilt(high, upsampled, axis=0) - upsampled
+        output = output + resample_poly(modification, 1, factor, axis=0, window=taps)
+    return output * makeup_gain
+
+
+def reference_response_db(design, freqs, sample_rate, factor=1):
+    """Analytic magnitude response of a reference design in dB."""
+    low, high, makeup_gain = design
+    response_db = np.full(len(freqs), 20 * np.log10(makeup_gain))
+    if low is not None:
+        response_db += sos_response_db(low, freqs, sample_rate).sum(axis=0)
+    if high is not None:
+        response_db += sos_response_db(high, freqs, sample_rate * factor).sum(axis=0)
+    return response_db
+
+
+def run_blocks(engine, signal, blocksize):
+    """Process `signal` block by block; returns (output, processing seconds)."""
+    outputs = []
+    elapsed = 0.0
+    for i in range(0, len(signal), blocksize):
+        block = signal[i:i + blocksize]
+        start = time.perf_counter()
+        outputs.append(engine.process(block))
+        elapsed += time.perf_counter() - start
+    return np.concatenate(outputs), elapsed
+
+
+def measure(name, trial, signal, reference, design):
+    engine_class, options, multiple, factor = ENGINES[name]
+    sample_rate = trial["sample_rate"]
+    # Engines that need a block multiple get the nearest one
+    blocksize = max(multiple, trial["blocksize"] // multiple * multiple)
+    engine = engine_class(trial["bands"], sample_rate=sample_rate, **options)
+    engine.set_gains(trial["gains"])
+    frames = len(signal) // blocksize * blocksize  # Whole blocks only, as a stream delivers them
+    signal, reference = signal[:frames], reference[:frames]
+    output, elapsed = run_blocks(engine, signal, blocksize)
+
+    latency = engine.latency()
+    settle = int(SETTLE_SECONDS * sample_rate)
+    error = output[latency + settle:] - reference[settle:len(reference) - latency]
+    scale = np.sqrt(np.mean(reference[settle:] ** 2))
+    max_db = 20 * np.log10(max(np.max(np.abs(error)), 1e-15) / scale)
+    rms_db = 20 * np.log10(max(np.sqrt(np.mean(error ** 2)), 1e-15) / scale)
+
+    # Error jumps across block boundaries (in output time) beyond the largest jump inside blocks
+    steps = np.abs(np.diff(error, axis=0)).max(axis=1)
+    boundaries = np.arange(blocksize - latency - settle, len(error), blocksize)
+    boundaries = boundaries[(boundaries > 0) & (boundaries < len(error))] - 1
+    inside = np.ones(len(steps), dtype=bool)
+    inside[boundaries] = False
+    excess = steps[boundaries].max() - steps[inside].max() if len(boundaries) else 0.0
+    boundary_db = 20 * np.log10(max(excess, 1e-15) / scale)
+
+    # Measured magnitude response from an impulse, against the analytic reference response
+    engine.reset()
+    impulse = np.zeros((-(-(IMPULSE_FRAMES + latency) // blocksize) * blocksize, 2))
+    impulse[0] = 1.0
+    response, _ = run_blocks(engine, impulse, blocksize)
+    # Not cropped at the latency: linear-phase stages ring before it, and a delay leaves the magnitude alone
+    spectrum = np.abs(sp_fft.rfft(response[:IMPULSE_FRAMES, 0]))
+    freqs = sp_fft.rfftfreq(IMPULSE_FRAMES, 1 / sample_rate)
+    bandwidth = 0.45 if factor == 1 else OVERSAMPLED_BANDWIDTH
+    check = np.geomspace(20, min(20000, bandwidth * sample_rate), 256)
+    measured_db = 20 * np.log10(np.maximum(np.interp(check, freqs, spectrum), 1e-12))
+    expected_db = reference_response_db(design, check, sample_rate, factor)
+    response_db = float(np.max(np.abs(measured_db - expected_db)))
+
+    return {
+        "max_db": float(max_db),
+        "rms_db": float(rms_db),
+        "response_db": response_db,
+        "boundary_db": float(boundary_db),
+        "speed": len(signal) / sample_rate / elapsed,
+        "blocksize": blocksize,
+    }
+
+
+def summarize(results, thresholds):
+    """Worst-case accuracy and median speed per engine, with pass/fail."""
+    summary = {}
+    for name, trials in results.items():
+        worst = {key: max(trial[key] for trial in trials) for key in ("max_db", "rms_db", "response_db", "boundary_db")}
+        failures = [key for key, limit in thresholds.items() if worst[key] > limit]
+        summary[name] = {**worst, "speed": float(np.median([trial["speed"] for trial in trials])),
+                         "passed": not failures, "failures": failures}
+    return summary
+
+
+def pareto_front(summary):
+    """Engines not dominated: no other engine is at least as fast and as accurate (worst RMS error) and better on one."""
+    return {
+        name for name, entry in summary.items()
+        if not any(other["speed"] >= entry["speed"] and other["rms_db"] <= entry["rms_db"]
+                   and (other["speed"] > entry["speed"] or other["rms_db"] < entry["rms_db"])
+                   for other_name, other in summary.items() if other_name != name)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate EQ engines against the float64 reference.")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=2.0, help="signal length per trial")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--engine", action="append", choices=sorted(ENGINES), help="engine to check (repeatable)")
+    parser.add_argument("--max-error-db", type=float, default=-40.0, help="worst sample error allowed")
+    parser.add_argument("--rms-error-db", type=float, default=-60.0, help="worst RMS error allowed")
+    parser.add_argument("--response-db", type=float, default=0.1, help="worst response deviation allowed")
+    parser.add_argument("--boundary-db", type=float, default=-60.0, help="worst block-boundary step allowed")
+    parser.add_argument("--json", help="also write trials and summary to this file")
+    args = parser.parse_args()
+    thresholds = {"max_db": args.max_error_db, "rms_db": args.rms_error_db,
+                  "response_db": args.response_db, "boundary_db": args.boundary_db}
+    names = args.engine or list(ENGINES)
+
+    rng = np.random.default_rng(args.seed)
+    results = {name: [] for name in names}
+    trials = []
+    for _ in range(args.trials):
+        trial = random_trial(rng, args.seconds)
+        signal = make_signal(trial["signal"], trial["frames"], trial["sample_rate"], rng)
+        references = {}  # Reference oversampling factor -> (input, design, output)
+        trial_results = {}
+        for name in names:
+            factor = ENGINES[name][3]
+            if factor not in references:
+                source = signal
+                if factor > 1:
+                    source = band_limit(signal, trial["sample_rate"], OVERSAMPLED_BANDWIDTH * trial["sample_rate"])
+                design = reference_design(trial, factor)
+                references[factor] = (source, design, run_reference(design, source, factor))
+            source, design, reference = references[factor]
+            trial_results[name] = measure(name, trial, source, reference, design)
+        for name, result in trial_results.items():
+            results[name].append(result)
+        trials.append({**{key: value for key, value in trial.items() if key != "gains"},
+                       "gains": trial["gains"].tolist(), "results": trial_results})
+
+    summary = summarize(results, thresholds)
+    front = pareto_front(summary)
+    print(f"{args.trials} trials; worst case per engine (thresholds: max {args.max_error_db} dB, "
+          f"RMS {args.rms_error_db} dB, response {args.response_db} dB, boundary {args.boundary_db} dB)")
+    print(f"{'engine':>16} {'x realtime':>11} {'max dB':>8} {'RMS dB':>8} {'resp dB':>8} {'bound dB':>9} "
+          f"{'curve':>6} {'result':>7}")
+    # Fastest first: reading down the table trades speed for accuracy
+    for name, entry in sorted(summary.items(), key=lambda item: -item[1]["speed"]):
+        result = "pass" if entry["passed"] else "FAIL"
+        print(f"{name:>16} {entry['speed']:>11.0f} {entry['max_db']:>8.1f} {entry['rms_db']:>8.1f} "
+              f"{entry['response_db']:>8.3f} {entry['boundary_db']:>9.1f} "
+              f"{'front' if name in front else '':>6} {result:>7}")
+        for key in entry["failures"]:
+            worst = max(results[name], key=lambda trial_result: trial_result[key])
+            index = results[name].index(worst)
+            trial = trials[index]
+            print(f"{'':>18}{key} worst in trial {index}: {trial['layout']} {trial['preset']}, "
+                  f"{trial['signal']}, {trial['sample_rate']} Hz, {worst['blocksize']} frames")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"thresholds": thresholds, "summary": summary, "trials": trials}, file, indent=1)
+    sys.exit(0 if all(entry["passed"] for entry in summary.values()) else 1)
@@ -0,0 +1,62 @@
+"""
+Per-block cost of loudness metering and matching next to the EQ itself, and
+the integrated-loudness query after increasingly long listening sessions
+(constant, since gating runs on a fixed-size histogram).
+
+Run from the main/ directory:
+    python benchmarks/bench_loudness.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from eq_engine import EqualizerEngine
+from loudness import LoudnessMatcher, LoudnessMeter
+from presets import BANDS, DEFAULT_GENRE_PRESETS
+
+SAMPLE_RATE = 44100
+BLOCKSIZES = [256, 1024, 4096]
+SESSION_MINUTES = [1, 10, 60]
+REPEATS = 2000
+
+
+def time_call(function, repeats=REPEATS):
+    function()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    print(f"{'block':>6} {'eq us':>8} {'meter us':>9} {'match us':>9} {'match load':>11}")
+    for blocksize in BLOCKSIZES:
+        block = rng.standard_normal((blocksize, 2)) * 0.1
+        engine = EqualizerEngine(BANDS, sample_rate=SAMPLE_RATE)
+        engine.set_gains(DEFAULT_GENRE_PRESETS["Electronic"])
+        wet = engine.process(block)
+        meter = LoudnessMeter(SAMPLE_RATE, 2)
+        matcher = LoudnessMatcher(SAMPLE_RATE, 2)
+        key = engine.settings.gains.tobytes()
+        eq = time_call(lambda: engine.process(block))
+        metering = time_call(lambda: meter.process(block))
+        matching = time_call(lambda: matcher.process(block, wet.copy(), key))
+        deadline = blocksize / SAMPLE_RATE
+        print(f"{blocksize:>6} {eq * 1e6:>8.1f} {metering * 1e6:>9.1f} {matching * 1e6:>9.1f} "
+              f"{matching / deadline * 100:>10.2f}%")
+
+    print()
+    print(f"{'minutes':>8} {'feed s':>7} {'integrated us':>14} {'LUFS':>7}")
+    one_second = rng.standard_normal((SAMPLE_RATE, 2)) * 0.1
+    for minutes in SESSION_MINUTES:
+        meter = LoudnessMeter(SAMPLE_RATE, 2)
+        start = time.perf_counter()
+        for second in range(minutes * 60):
+            meter.process(one_second * (0.2 + 0.8 * (second % 7) / 7))
+        feed = time.perf_counter() - start
+        query = time_call(meter.integrated)
+        print(f"{minutes:>8} {feed:>7.2f} {query * 1e6:>14.1f} {meter.integrated():>7.1f}")
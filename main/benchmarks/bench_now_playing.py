@@ -0,0 +1,59 @@
+"""
+Reaction time and idle cost of the MPRIS now-playing source, against a fake
+MPRIS player on the session bus.
+
+Latency is measured from the player sending PropertiesChanged to the source
+returning the new track from get_current_track (what the GUI and daemon do
+on a change). Idle cost is the process CPU time while nothing changes. For
+comparison, polling the Web API once a second notices a change 500 ms late
+on average. Needs jeepney and a session bus; without a desktop session, run
+it under a private one. Run from the main/ directory:
+    python benchmarks/bench_now_playing.py
+    dbus-run-session python benchmarks/bench_now_playing.py
+"""
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from now_playing import FakePlayer, MprisSource
+
+CHANGES = 200
+IDLE_SECONDS = 5.0
+
+
+if __name__ == "__main__":
+    player = FakePlayer("autoeq_bench")
+    source = MprisSource("autoeq_bench")
+    changed = threading.Event()
+    source.start(changed.set)
+
+    latencies = []
+    for i in range(CHANGES):
+        changed.clear()
+        sent_at = player.play(i, f"Track {i}", "Artist")
+        # Other signals (e.g. the source's own start) may wake it first; wait for this track
+        while True:
+            if not changed.wait(1.0):
+                raise SystemExit(f"No change seen for track {i}")
+            changed.clear()
+            track = source.get_current_track()
+            if track and track["name"] == f"Track {i}":
+                break
+        latencies.append(time.perf_counter() - sent_at)
+        time.sleep(0.005)
+
+    cpu_start = time.process_time()
+    time.sleep(IDLE_SECONDS)
+    idle_cpu = time.process_time() - cpu_start
+    source.stop()
+    player.close()
+
+    latencies = np.array(latencies) * 1000
+    print(f"{CHANGES} track changes: p50 {np.percentile(latencies, 50):.2f} ms, "
+          f"p99 {np.percentile(latencies, 99):.2f} ms, max {latencies.max():.2f} ms")
+    print(f"Idle: {idle_cpu * 1000:.1f} ms CPU in {IDLE_SECONDS:.0f} s "
+          f"({idle_cpu / IDLE_SECONDS * 100:.3f}% of a core)")
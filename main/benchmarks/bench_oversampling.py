@@ -0,0 +1,78 @@
+"""
+Extra CPU cost of oversampling the high bands, per band layout, and how
+close the result comes to the analog peaking response near Nyquist.
+
+Cost is the per-block time of the oversampled engine against the plain
+cascade with the same gains. Deviation is the largest difference from the
+analog prototype between 8 kHz and 18 kHz (where the 12k-16k bands live),
+measured from an impulse response. Run from the main/ directory:
+    python benchmarks/bench_oversampling.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from eq_engine import EqualizerEngine
+from oversampling import OversampledEqualizerEngine
+
+REPEATS = 200
+BLOCKSIZE = 1024
+IMPULSE_FRAMES = 1 << 15
+
+LAYOUTS = {
+    "10-band": [60, 170, 310, 600, 1000, 3000, 6000, 12000, 14000, 16000],
+    "31-band": list(np.geomspace(20, 20000, 31)),
+    "high-only": [12000, 14000, 16000],
+}
+
+
+def time_engine(engine, block):
+    engine.process(block)
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        engine.process(block)
+    return (time.perf_counter() - start) / REPEATS
+
+
+def analog_db(freqs, bands, gains, Q=1.0):
+    """Summed magnitude of the analog peaking prototypes the RBJ designs are derived from."""
+    A = 10 ** (np.asarray(gains) / 40)
+    s = 1j * freqs[:, None] / np.asarray(bands)[None, :]
+    return (20 * np.log10(np.abs((s * s + s * A / Q + 1) / (s * s + s / (A * Q) + 1)))).sum(axis=1)
+
+
+def deviation_db(engine, bands, gains, sample_rate):
+    impulse = np.zeros((IMPULSE_FRAMES, engine.channels))
+    impulse[0] = 1.0
+    engine.reset()
+    response = engine.process(impulse)[:, 0] / engine.settings.makeup_gain
+    freqs = np.fft.rfftfreq(IMPULSE_FRAMES, 1 / sample_rate)
+    measured = 20 * np.log10(np.abs(np.fft.rfft(response)))
+    band = (freqs >= 8000) & (freqs <= 18000)
+    return np.max(np.abs(measured[band] - analog_db(freqs[band], bands, gains)))
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    print(f"{'layout':>10} {'rate':>6} {'factor':>6} {'high':>5} {'cascade us':>11} {'oversampled us':>15} "
+          f"{'extra us':>9} {'ratio':>6} {'cascade dev':>12} {'oversampled dev':>16} {'latency':>8}")
+    for name, bands in LAYOUTS.items():
+        gains = rng.choice([-9, -6, -3, 3, 6, 9], len(bands))
+        for sample_rate in (44100, 48000):
+            block = rng.standard_normal((BLOCKSIZE, 2)) * 0.1
+            cascade = EqualizerEngine(bands, sample_rate)
+            cascade.set_gains(gains)
+            cascade_time = time_engine(cascade, block) * 1e6
+            cascade_dev = deviation_db(cascade, bands, gains, sample_rate)
+            for factor in (2, 4):
+                engine = OversampledEqualizerEngine(bands, sample_rate, factor=factor)
+                engine.set_gains(gains)
+                engine_time = time_engine(engine, block) * 1e6
+                print(f"{name:>10} {sample_rate:>6} {factor:>6} {int(engine.is_high.sum()):>5} "
+                      f"{cascade_time:>11.0f} {engine_time:>15.0f} {engine_time - cascade_time:>9.0f} "
+                      f"{engine_time / cascade_time:>6.2f} {cascade_dev:>12.2f} "
+                      f"{deviation_db(engine, bands, gains, sample_rate):>16.2f} {engine.latency():>8}")
+    print(f"\n{BLOCKSIZE}-frame blocks, stereo; deviation in dB from the analog response over 8-18 kHz")
@@ -0,0 +1,74 @@
+"""
+Per-rate processing cost, coefficient cache behaviour and resampler cost.
+
+Shows what running at the device's native rate costs compared to 44.1 kHz,
+how much a rate switch costs with a cold and a warm coefficient cache, and
+what the streaming resampler adds when input and output rates differ. Run
+from the main/ directory:
+    python benchmarks/bench_sample_rates.py
+"""
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from eq_engine import CoefficientCache, EqualizerEngine
+from limiter import Limiter
+from resampler import StreamingResampler
+
+BANDS = [60, 170, 310, 600, 1000, 3000, 6000, 12000, 14000, 16000]
+RATES = (44100, 48000, 88200, 96000, 192000)
+BLOCK_MS = 20
+REPEATS = 200
+
+
+def time_call(function, repeats=REPEATS):
+    function()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    gains = rng.uniform(-9, 9, len(BANDS))
+
+    print(f"{'rate':>7} {'block':>6} {'eq us':>7} {'limiter us':>11} {'cpu %':>6}")
+    for rate in RATES:
+        blocksize = rate * BLOCK_MS // 1000
+        block = rng.standard_normal((blocksize, 2)) * 0.1
+        engine = EqualizerEngine(BANDS, rate)
+        engine.set_gains(gains)
+        limiter = Limiter(rate)
+        eq_time = time_call(lambda: engine.process(block))
+        limiter_time = time_call(lambda: limiter.process(block))
+        load = (eq_time + limiter_time) / (BLOCK_MS / 1000) * 100
+        print(f"{rate:>7} {blocksize:>6} {eq_time * 1e6:>7.0f} {limiter_time * 1e6:>11.0f} {load:>6.2f}")
+
+    print()
+    cache = CoefficientCache()
+    engine = EqualizerEngine(BANDS, 44100, cache=cache)
+    engine.set_gains(gains)
+    start = time.perf_counter()
+    for rate in RATES:
+        engine.set_sample_rate(rate)
+    cold = (time.perf_counter() - start) / len(RATES)
+    start = time.perf_counter()
+    for rate in RATES:
+        engine.set_sample_rate(rate)
+    warm = (time.perf_counter() - start) / len(RATES)
+    print(f"rate switch: cold {cold * 1e6:.0f} us, cached {warm * 1e6:.0f} us "
+          f"({cache.hits} hits, {cache.misses} misses)")
+
+    print()
+    print(f"{'input':>7} {'output':>7} {'block':>6} {'resample us':>12} {'cpu %':>6}")
+    for input_rate, output_rate in ((44100, 48000), (48000, 44100), (44100, 96000), (96000, 48000)):
+        blocksize = input_rate * BLOCK_MS // 1000
+        block = rng.standard_normal((blocksize, 2)) * 0.1
+        resampler = StreamingResampler(input_rate, output_rate)
+        resample_time = time_call(lambda: resampler.process(block))
+        load = resample_time / (BLOCK_MS / 1000) * 100
+        print(f"{input_rate:>7} {output_rate:>7} {blocksize:>6} {resample_time * 1e6:>12.0f} {load:>6.2f}")
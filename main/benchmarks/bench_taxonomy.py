@@ -0,0 +1,78 @@
+"""
+Build, load and query cost of the sub-genre taxonomy index against the classifier.
+
+genre/dataset.json only holds a couple of hundred sub-genres, so the index is
+also built from a synthetic list expanded with regional and style prefixes to
+show how lookups scale. Run from the main/ directory:
+    python benchmarks/bench_taxonomy.py
+"""
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from taxonomy import TaxonomyIndex, build_index
+
+DATASET = os.path.join(os.path.dirname(__file__), "..", "genre", "dataset.json")
+PREFIXES = ["", "uk", "german", "japanese", "brazilian", "swedish", "french", "deep", "modern",
+            "classic", "underground", "experimental", "melodic", "dark", "lo-fi", "russian",
+            "korean", "mexican", "italian", "australian", "canadian", "nordic", "polish", "dutch"]
+QUERIES = ["dance pop", "progresive rock", "synthpop", "swedish melodic death metal", "uk garage house",
+           "alt rock", "deep tech house", "kpop"]
+REPEATS = 2000
+
+
+def time_call(function, repeats=REPEATS):
+    function()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) / repeats
+
+
+def expanded_dataset(path, prefixes):
+    with open(path) as file:
+        dataset = json.load(file)
+    return {genre: [f"{prefix} {name}".strip() for prefix in prefixes for name in names]
+            for genre, names in dataset.items()}
+
+
+if __name__ == "__main__":
+    directory = tempfile.mkdtemp()
+    print(f"{'names':>7} {'build ms':>9} {'load ms':>8} {'file KiB':>9} {'exact us':>9} "
+          f"{'fuzzy us':>9} {'cached us':>10}")
+    for prefixes in (PREFIXES[:1], PREFIXES[:6], PREFIXES):
+        dataset_path = os.path.join(directory, f"dataset{len(prefixes)}.json")
+        index_path = os.path.join(directory, f"dataset{len(prefixes)}.idx")
+        with open(dataset_path, "w") as file:
+            json.dump(expanded_dataset(DATASET, prefixes), file)
+        start = time.perf_counter()
+        build_index(dataset_path, index_path)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        index = TaxonomyIndex(index_path)
+        load = time.perf_counter() - start
+
+        exact = np.mean([time_call(lambda: index.exact(query)) for query in QUERIES])
+        fuzzy = np.mean([time_call(lambda: index.fuzzy(query), REPEATS // 10) for query in QUERIES])
+        cached = np.mean([time_call(lambda: index.lookup(query)) for query in QUERIES])
+        print(f"{len(index):>7} {build * 1000:>9.1f} {load * 1000:>8.2f} {os.path.getsize(index_path) / 1024:>9.0f} "
+              f"{exact * 1e6:>9.1f} {fuzzy * 1e6:>9.1f} {cached * 1e6:>10.2f}")
+
+    print()
+    for query in QUERIES:
+        print(f"{query!r:>32} -> {index.fuzzy(query)}")
+
+    try:
+        with open(os.path.join(os.path.dirname(DATASET), "genre_model.pkl"), "rb") as file:
+            model = pickle.load(file)
+    except ImportError as e:
+        print(f"\nClassifier not timed: {e}")
+    else:
+        predict = np.mean([time_call(lambda: model.predict([query]), REPEATS // 10) for query in QUERIES])
+        print(f"\nclassifier predict: {predict * 1e6:.0f} us per query")
@@ -0,0 +1,57 @@
+"""
+Startup time, memory and per-zone load for N zones in one process.
+
+Uses the null backend, so it runs without audio hardware. Half of the zones
+share one preset, which shows up as coefficient cache hits. Run from the
+main/ directory:
+    python benchmarks/bench_zones.py
+"""
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from zones import ZoneManager
+
+BANDS = [60, 170, 310, 600, 1000, 3000, 6000, 12000, 14000, 16000]
+SAMPLE_RATE = 44100
+BLOCKS = 200
+
+if __name__ == "__main__":
+    os.environ.setdefault("AUDIO_BLOCKSIZE", "1024")
+    rng = np.random.default_rng(0)
+    source = (rng.standard_normal((SAMPLE_RATE, 2)) * 0.1).astype(np.float32)
+    shared_preset = rng.integers(-9, 10, len(BANDS))
+
+    # Warm up imports and scipy so the first row is not charged for them
+    ZoneManager(BANDS, [("warmup", ["0"], ["0"])], backend_name="null").zones[0].set_gains(shared_preset)
+
+    print(f"{'zones':>5} {'startup ms':>11} {'memory KiB':>11} {'per zone':>9} "
+          f"{'cache hits':>10} {'mean load %':>12} {'max load %':>11}")
+    for count in (1, 2, 4, 8, 16):
+        specs = [(f"zone{i}", ["0"], ["0"]) for i in range(count)]
+        tracemalloc.start()
+        start = time.perf_counter()
+        manager = ZoneManager(BANDS, specs, backend_name="null")
+        for i, zone in enumerate(manager.zones):
+            zone.set_gains(shared_preset if i % 2 == 0 else rng.integers(-9, 10, len(BANDS)))
+            zone.backend.source = source
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            manager.start()
+        startup = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0] / 1024
+        tracemalloc.stop()
+
+        for zone in manager.zones:
+            # Drive the blocks synchronously instead of on the backend's paced thread
+            zone.backend.stop()
+            zone.backend.stats.reset()
+            zone.backend.run_blocks(BLOCKS)
+        loads = [stats["mean_load"] * 100 for stats in manager.stats()]
+        print(f"{count:>5} {startup * 1000:>11.1f} {memory:>11.0f} {memory / count:>9.0f} "
+              f"{manager.cache.hits:>10} {np.mean(loads):>12.2f} {np.max(loads):>11.2f}")
+        manager.close()
@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+
+
+class BlockSizeController:
+    """
+    Adapts each zone's block size to the headroom its callback actually has.
+
+    Every `interval` seconds the callbacks of the last window are compared to
+    their deadline. A window with an xrun or an overrun doubles the block
+    size right away, as do two windows in a row with a callback above
+    `high_load` of its deadline; `stable_windows` windows in a row below
+    `low_load` halve it. A size that failed is not tried again for `hold`
+    seconds, doubling each time it fails, so the controller settles on the
+    smallest size the machine sustains instead of oscillating.
+    """
+
+    def __init__(self, zone_manager, min_blocksize=128, max_blocksize=4096, interval=2.0,
+                 low_load=0.35, high_load=0.8, stable_windows=3, hold=30.0):
+        self.zone_manager = zone_manager
+        self.min_blocksize = min_blocksize
+        self.max_blocksize = max_blocksize
+        self.interval = interval
+        self.low_load = low_load
+        self.high_load = high_load
+        self.stable_windows = stable_windows
+        self.hold = hold
+        self.windows = {}  # Zone name -> state of its current measurement window
+        self.stop_event = threading.Event()
+        self.worker = None
+
+    def start(self):
+        if self.worker is not None:
+            return
+        self.stop_event.clear()
+        self.worker = threading.Thread(target=self.run, name="BlockSizeController", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.worker is not None:
+            self.worker.join(timeout=2.0)
+            self.worker = None
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            for zone in self.zone_manager.zones:
+                try:
+                    self.check(zone)
+                except Exception as e:
+                    print(f"Error adapting block size for zone '{zone.name}': {e}")
+
+    def check(self, zone):
+        """Judge the window since the last check and resize the zone's stream if needed."""
+        backend = zone.backend
+        stats = backend.stats
+        counters = (stats.count, stats.overruns + stats.xruns)
+        peak = stats.peak_load
+        stats.peak_load = 0.0
+        window = self.windows.setdefault(zone.name, {"backend": None, "counters": counters,
+                                                     "calm": 0, "strained": 0, "bans": {}})
+        previous = window["counters"]
+        window["counters"] = counters
+        if window["backend"] is not backend:
+            # New or resized stream: its first callbacks include start-up glitches, so skip a window
+            window["backend"] = backend
+            window["calm"] = window["strained"] = 0
+            return None
+        if counters[0] == previous[0] or not zone.backend.is_active():
+            return None
+
+        now = time.monotonic()
+        blocksize = zone.blocksize
+        window["strained"] = window["strained"] + 1 if peak > self.high_load else 0
+        if counters[1] > previous[1] or window["strained"] >= 2:
+            window["calm"] = window["strained"] = 0
+            if blocksize >= self.max_blocksize:
+                return None
+            # Keep away from the failing size for a while, longer each time it fails
+            _, penalty = window["bans"].get(blocksize, (0.0, self.hold / 2))
+            penalty = min(penalty * 2, 3600.0)
+            window["bans"][blocksize] = (now + penalty, penalty)
+            return self.resize(zone, blocksize * 2)
+
+        window["calm"] = window["calm"] + 1 if peak < self.low_load else 0
+        smaller = blocksize // 2
+        if (window["calm"] >= self.stable_windows and smaller >= self.min_blocksize
+                and window["bans"].get(smaller, (0.0, 0.0))[0] <= now):
+            return self.resize(zone, smaller)
+        return None
+
+    def resize(self, zone, blocksize):
+        self.zone_manager.resize(zone, blocksize)
+        return blocksize
+
+
+def blocksize_controller_from_env(zone_manager):
+    """A started controller if AUDIO_BLOCKSIZE=auto, else None."""
+    if os.getenv("AUDIO_BLOCKSIZE") != "auto":
+        return None
+    controller = BlockSizeController(
+        zone_manager,
+        min_blocksize=int(os.getenv("AUDIO_BLOCKSIZE_MIN", "128")),
+        max_blocksize=int(os.getenv("AUDIO_BLOCKSIZE_MAX", "4096")),
+    )
+    controller.start()
+    return controller
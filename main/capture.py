@@ -0,0 +1,128 @@
+import json
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import numpy as np
+
+MAGIC = b"AEQCAP01"
+# File header: magic, channels, reserved, bytes of records committed so far
+FILE_HEADER = struct.Struct("<8sII Q")
+# Record header: kind, payload bytes, timestamp (s since capture start), value (status for blocks)
+RECORD_HEADER = struct.Struct("<IIdi4x")
+
+BLOCK = 1
+PARAMS = 2
+STATE = 3  # Processing state when the capture started (Zone.snapshot)
+
+
+class CaptureWriter:
+    """
+    Append-only capture of audio callback traffic in a preallocated memory-mapped file.
+
+    Written from the audio thread: a block costs one struct pack and one memcpy
+    into the mapping, with no allocation or system call. Once `max_bytes` is
+    used up further records are dropped (and counted) rather than growing the
+    file. The committed length in the file header is updated after every
+    record, so a capture survives a crash up to the last complete record.
+    """
+
+    def __init__(self, path, channels=2, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.channels = channels
+        self.file = open(path, "w+b")
+        self.file.truncate(max_bytes)
+        self.mm = mmap.mmap(self.file.fileno(), max_bytes)
+        self.buffer = np.frombuffer(self.mm, dtype=np.uint8)
+        self.offset = FILE_HEADER.size
+        self.start_time = time.perf_counter()
+        self.dropped = 0
+        self.lock = threading.Lock()  # Only contended while closing
+        self.closed = False
+        FILE_HEADER.pack_into(self.mm, 0, MAGIC, channels, 0, 0)
+
+    def append(self, kind, value, payload):
+        """Append one record; `payload` is a contiguous uint8 array."""
+        with self.lock:
+            if self.closed:
+                return
+            timestamp = time.perf_counter() - self.start_time
+            size = len(payload)
+            end = self.offset + RECORD_HEADER.size + (size + 7) // 8 * 8
+            if end > len(self.buffer):
+                self.dropped += 1
+                return
+            RECORD_HEADER.pack_into(self.mm, self.offset, kind, size, timestamp, value)
+            start = self.offset + RECORD_HEADER.size
+            self.buffer[start:start + size] = payload
+            self.offset = end
+            struct.pack_into("<Q", self.mm, 16, end - FILE_HEADER.size)
+
+    def record_block(self, block, status=0):
+        block = np.ascontiguousarray(block, dtype=np.float32)
+        self.append(BLOCK, int(status), block.reshape(-1).view(np.uint8))
+
+    def record_params(self, params):
+        self.append(PARAMS, 0, np.frombuffer(json.dumps(params).encode(), dtype=np.uint8))
+
+    def record_state(self, state):
+        self.append(STATE, 0, np.frombuffer(pickle.dumps(state, pickle.HIGHEST_PROTOCOL), dtype=np.uint8))
+
+    def close(self):
+        """Stop recording and trim the file to what was written."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            used = self.offset
+            del self.buffer
+            self.mm.flush()
+            self.mm.close()
+            self.file.truncate(used)
+            self.file.close()
+        if self.dropped:
+            print(f"Capture {self.path} was full; {self.dropped} records dropped")
+
+
+class CaptureReader:
+    """Reads a capture written by CaptureWriter."""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            self.data = file.read()
+        magic, self.channels, _, used = FILE_HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an AutoEQ capture")
+        self.end = FILE_HEADER.size + used
+
+    def records(self):
+        """
+        Yield (kind, timestamp, value, payload) tuples in recorded order. Block
+        payloads are (frames, channels) float32 arrays, parameter and state payloads dicts.
+        """
+        offset = FILE_HEADER.size
+        while offset < self.end:
+            kind, size, timestamp, value = RECORD_HEADER.unpack_from(self.data, offset)
+            start = offset + RECORD_HEADER.size
+            if kind == BLOCK:
+                payload = np.frombuffer(self.data, dtype=np.float32, count=size // 4, offset=start)
+                payload = payload.reshape(-1, self.channels)
+            elif kind == STATE:
+                payload = pickle.loads(self.data[start:start + size])
+            else:
+                payload = json.loads(self.data[start:start + size])
+            yield kind, timestamp, value, payload
+            offset = start + (size + 7) // 8 * 8
+
+
+def capture_path(directory, zone_name):
+    """A new capture file name for a zone inside `directory`."""
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.join(directory, f"{zone_name}-{time.strftime('%Y%m%d-%H%M%S')}")
+    path, count = stem + ".aeqcap", 1
+    while os.path.exists(path):  # A capture resumed after an audio process restart in the same second
+        count += 1
+        path = f"{stem}-{count}.aeqcap"
+    return path
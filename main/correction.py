@@ -0,0 +1,299 @@
+"""
+Headphone/speaker correction: fit parametric peaking bands that turn a
+measured frequency response into a target curve, and apply them as a stage
+that stacks with the genre preset.
+
+Measurement and target files are text with one "frequency, dB" pair per
+line, as exported by AutoEQ (frequency,raw CSV), REW or most measurement
+rigs; header and comment lines are skipped. Without a target the correction
+aims for a flat response.
+
+Fitting runs well under a second and results are cached by the files'
+contents, so startup only pays for it once per measurement. Fit a file from
+the command line with:
+    python correction.py measurement.csv [target.csv] [bands]
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import numpy as np
+from scipy.optimize import least_squares
+from scipy.signal import sosfilt
+from dsp import peaking_sos, sos_response_db
+from presets import get_resource_path
+
+GRID = np.geomspace(20, 20000, 384)
+FIT_RANGE = (20.0, 16000.0)  # Measurements above 16 kHz depend too much on fit to be worth correcting
+MAX_BOOST_DB = 6.0
+MAX_CUT_DB = 12.0
+Q_RANGE = (0.2, 6.0)
+FIT_RATE = 48000  # Bands are fitted at one rate and redesigned for whatever rate the stream runs at
+CACHE_PATH = "presets/correction_cache.json"
+NUMBER = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+def load_curve(path):
+    """Read (freqs, dB) from a measurement or target file, sorted by frequency."""
+    rows = []
+    with open(path, "r", encoding="utf-8-sig") as file:
+        for line in file:
+            values = NUMBER.findall(line)
+            if len(values) >= 2 and NUMBER.match(line.strip()):
+                rows.append((float(values[0]), float(values[1])))
+    if len(rows) < 2:
+        raise ValueError(f"No frequency response found in {path}")
+    data = np.array(sorted(rows))
+    freqs, index = np.unique(data[:, 0], return_index=True)
+    keep = freqs > 0
+    return freqs[keep], data[index, 1][keep]
+
+
+def curve_on_grid(freqs, db, grid=GRID):
+    """Interpolate a curve onto `grid` on a log-frequency axis, holding the end values."""
+    return np.interp(np.log(grid), np.log(freqs), db)
+
+
+def correction_curve(measurement, target=None, grid=GRID):
+    """
+    dB the correction should add on `grid`: target minus measurement, with the
+    two aligned over 300 Hz - 3 kHz and limited to MAX_BOOST_DB / MAX_CUT_DB.
+    """
+    measured = curve_on_grid(*measurement, grid)
+    wanted = np.zeros_like(measured) if target is None else curve_on_grid(*target, grid)
+    error = wanted - measured
+    midband = (grid >= 300) & (grid <= 3000)
+    error -= error[midband].mean()
+    return np.clip(error, -MAX_CUT_DB, MAX_BOOST_DB)
+
+
+class PeakingFitter:
+    """
+    Least-squares fit of `count` peaking bands to a dB curve.
+
+    Parameters are (log freq, log Q, gain) per band. Band responses come from
+    one vectorized peaking_sos / sos_response_db call for all bands, and
+    because each band's row only depends on its own parameters, the whole
+    Jacobian costs three more batched calls (one per parameter kind with every
+    band perturbed at once) instead of 3 x count single evaluations.
+    """
+
+    def __init__(self, grid=GRID, sample_rate=FIT_RATE, fit_range=FIT_RANGE):
+        self.grid = grid
+        self.sample_rate = sample_rate
+        self.weights = ((grid >= fit_range[0]) & (grid <= fit_range[1])).astype(np.float64)
+        self.low = np.log(fit_range[0])
+        self.high = np.log(fit_range[1])
+
+    def rows(self, params, count):
+        log_f, log_q, gain = params.reshape(3, count)
+        return sos_response_db(peaking_sos(np.exp(log_f), np.exp(log_q), gain, self.sample_rate),
+                               self.grid, self.sample_rate)
+
+    def initial(self, curve, count):
+        """Greedy start: put each band on the largest remaining error, then subtract it."""
+        residual = curve * self.weights
+        params = np.empty((3, count))
+        for i in range(count):
+            index = int(np.argmax(np.abs(residual)))
+            params[:, i] = (np.clip(np.log(self.grid[index]), self.low, self.high), 0.0,
+                            np.clip(residual[index], -MAX_CUT_DB, MAX_BOOST_DB))
+            residual -= self.rows(params[:, i], 1)[0] * self.weights
+        return params.ravel()
+
+    def fit(self, curve, count=10):
+        """Return ((count, 3) array of freq, Q, gain, RMS error in dB over the fit range)."""
+        steps = np.repeat([1e-4, 1e-4, 1e-3], count)
+
+        def residuals(params):
+            return (self.rows(params, count).sum(axis=0) - curve) * self.weights
+
+        def jacobian(params):
+            base = self.rows(params, count)
+            columns = []
+            for kind in range(3):
+                shifted = params.copy()
+                shifted[kind * count:(kind + 1) * count] += steps[kind * count]
+                columns.append(((self.rows(shifted, count) - base) / steps[kind * count]).T)
+            return np.hstack(columns) * self.weights[:, None]
+
+        lower = np.repeat([self.low, np.log(Q_RANGE[0]), -MAX_CUT_DB], count)
+        upper = np.repeat([self.high, np.log(Q_RANGE[1]), MAX_BOOST_DB], count)
+        start = np.clip(self.initial(curve, count), lower + 1e-9, upper - 1e-9)
+        result = least_squares(residuals, start, jac=jacobian, bounds=(lower, upper),
+                               x_scale=np.repeat([0.5, 0.5, 3.0], count), ftol=1e-4, xtol=1e-4,
+                               max_nfev=200)  # Tighter tolerances cost 4x the time for < 0.01 dB
+        log_f, log_q, gain = result.x.reshape(3, count)
+        error = float(np.sqrt(np.sum(result.fun ** 2) / np.sum(self.weights)))
+        bands = np.column_stack([np.exp(log_f), np.exp(log_q), gain])
+        return bands[np.argsort(bands[:, 0])], error
+
+
+def file_digest(*paths, extra=""):
+    digest = hashlib.sha256(extra.encode())
+    for path in paths:
+        if path:
+            with open(path, "rb") as file:
+                digest.update(hashlib.sha256(file.read()).digest())
+    return digest.hexdigest()
+
+
+def load_cache(path=CACHE_PATH):
+    try:
+        with open(get_resource_path(path), "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_cache(cache, path=CACHE_PATH):
+    full_path = get_resource_path(path)
+    temp_path = full_path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(cache, file, indent=1)
+    os.replace(temp_path, full_path)
+
+
+def fit_profile(measurement_path, target_path=None, count=10, cache_path=CACHE_PATH):
+    """
+    Correction profile for a measurement (and optional target) file:
+    {"name", "bands": [[freq, Q, gain], ...], "preamp_db", "error_db"}.
+    Cached under the hash of both files and the band count.
+    """
+    key = file_digest(measurement_path, target_path, extra=f"{count}")
+    cache = load_cache(cache_path)
+    if key in cache:
+        return cache[key]
+    target = load_curve(target_path) if target_path else None
+    curve = correction_curve(load_curve(measurement_path), target)
+    bands, error = PeakingFitter().fit(curve, count)
+    # Preamp keeps the largest boost of the fitted response from clipping
+    peak = float(np.max(sos_response_db(peaking_sos(bands[:, 0], bands[:, 1], bands[:, 2], FIT_RATE),
+                                        GRID, FIT_RATE).sum(axis=0)))
+    profile = {
+        "name": os.path.splitext(os.path.basename(measurement_path))[0],
+        "bands": [[round(float(value), 4) for value in band] for band in bands],
+        "preamp_db": round(-max(peak, 0.0), 2),
+        "error_db": round(error, 3),
+    }
+    cache[key] = profile
+    try:
+        save_cache(cache, cache_path)
+    except OSError as e:
+        print(f"Could not save correction cache: {e}")
+    return profile
+
+
+def parse_corrections(text):
+    """
+    Parse a CORRECTION_PROFILE value: one path for every zone, or per zone as
+    "Desk=headphones.csv;Patio=speakers.csv". Returns {zone name or "*": path}.
+    """
+    entries = [entry.strip() for entry in text.split(";") if entry.strip()]
+    if len(entries) == 1 and "=" not in entries[0]:
+        return {"*": entries[0]}
+    corrections = {}
+    for entry in entries:
+        name, _, path = entry.partition("=")
+        if not path:
+            raise ValueError(f"Correction '{entry}' needs zone=path")
+        corrections[name.strip()] = path.strip()
+    return corrections
+
+
+def apply_corrections_from_env(zones):
+    """Fit and apply CORRECTION_PROFILE (against CORRECTION_TARGET) to the matching zones."""
+    text = os.getenv("CORRECTION_PROFILE")
+    if not text:
+        return
+    target = os.getenv("CORRECTION_TARGET") or None
+    count = int(os.getenv("CORRECTION_BANDS", "10"))
+    corrections = parse_corrections(text)
+    for zone in zones:
+        path = corrections.get(zone.name, corrections.get("*"))
+        if not path:
+            continue
+        try:
+            profile = fit_profile(path, target, count)
+        except (OSError, ValueError) as e:
+            print(f"[{zone.name}] Error loading correction {path}: {e}")
+            continue
+        zone.set_correction(profile)
+
+
+class CorrectionStage:
+    """
+    Fitted correction bands (with their preamp) as one cascade with its own
+    filter state, run after the genre EQ. Sections and state are swapped as a
+    pair so a new profile never meets the old profile's state.
+    """
+
+    def __init__(self, sample_rate=44100, channels=2):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.profile = None
+        self.state = None  # (sos, zi), or None while there is no correction
+
+    def set_profile(self, profile):
+        self.profile = profile
+        self.design()
+
+    def set_sample_rate(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.design()
+
+    def design(self):
+        profile = self.profile
+        if not profile or not profile["bands"]:
+            self.state = None
+            return
+        bands = np.asarray(profile["bands"], dtype=np.float64)
+        freqs = np.minimum(bands[:, 0], 0.45 * self.sample_rate)
+        sos = peaking_sos(freqs, bands[:, 1], bands[:, 2], self.sample_rate)
+        sos[0, :3] *= 10 ** (profile["preamp_db"] / 20)
+        zi = np.zeros((len(sos), 2, self.channels))
+        self.state = (sos, zi)
+
+    def reset(self):
+        state = self.state
+        if state is not None:
+            state[1][:] = 0.0
+
+    def snapshot(self):
+        state = self.state
+        return None if state is None else state[1].copy()
+
+    def restore(self, zi):
+        state = self.state
+        if state is not None and zi is not None:
+            state[1][:] = zi
+
+    def is_flat(self):
+        return self.state is None
+
+    def process(self, block):
+        """Filter a (frames, channels) block; returned unchanged without a correction."""
+        state = self.state
+        if state is None:
+            return block
+        sos, zi = state
+        output, zi[:] = sosfilt(sos, block, axis=0, zi=zi)
+        return output
+
+
+if __name__ == "__main__":
+    import time
+
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    measurement_path = sys.argv[1]
+    target_path = sys.argv[2] if len(sys.argv) > 2 else None
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 10
+    start = time.perf_counter()
+    target = load_curve(target_path) if target_path else None
+    bands, error = PeakingFitter().fit(correction_curve(load_curve(measurement_path), target), count)
+    print(f"Fitted {count} bands in {(time.perf_counter() - start) * 1000:.0f} ms, RMS error {error:.2f} dB")
+    for freq, q, gain in bands:
+        print(f"  {freq:8.1f} Hz  Q {q:5.2f}  {gain:+6.2f} dB")
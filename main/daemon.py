@@ -0,0 +1,335 @@
+"""
+Headless AutoEQ service: runs the audio zones and Spotify auto-EQ without Qt
+and exposes a small JSON control API on localhost.
+
+    python daemon.py
+
+    GET  /presets                   preset names and gains
+    GET  /zones                     zones with their preset, gains, bypass state and closest presets
+    GET  /stats                     per-zone callback load plus process figures
+    GET  /diagnostics               running diagnostics and the reports written so far
+    POST /apply   {"preset", "zone"?}            apply a preset (all zones if no zone given)
+    POST /save    {"name", "zone"?, "gains"?}    save a zone's gains (or given gains) as a preset
+    POST /equalizer {"enabled", "zone"?}         enable or bypass the EQ
+    POST /auto-eq {"enabled"}
+    POST /capture {"enabled", "directory"?}      start or stop recording callback traffic
+    POST /correction {"path", "target"?, "zone"?}  fit a measured response and correct with it (null path removes it)
+    POST /assign  {"artist", "genre"}            assign a genre to an artist (the classifier learns from it)
+    POST /diagnostics {"kind", "enabled"}        start or stop profile / timing / memory (report written on stop)
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from dotenv import load_dotenv
+from presets import BANDS, PresetStore
+from zones import ZoneManager, zone_specs_from_env
+from device_monitor import DeviceMonitor
+from blocksize import blocksize_controller_from_env
+from prefetch import PresetPrefetcher
+from correction import fit_profile
+from spectral_eq import spectrum_matcher_from_env
+from diagnostics import diagnostics_from_env
+from now_playing import now_playing_source_from_env
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class EqualizerService:
+    """The GUI's audio and auto-EQ logic without any widgets."""
+
+    def __init__(self):
+        start = time.perf_counter()
+        self.presets = PresetStore()
+        self.lock = threading.Lock()  # Serializes preset edits and saves from API threads
+        self.auto_eq_enabled = os.getenv("AUTO_EQ", "1") != "0"
+        self.zone_manager = ZoneManager(
+            BANDS,
+            zone_specs_from_env(),
+            backend_name=os.getenv("AUDIO_BACKEND", "pyaudio"),
+            engine_name=os.getenv("EQ_ENGINE", "cascade"),
+        )
+        self.device_monitor = DeviceMonitor(self.zone_manager, self.zone_manager.reopen)
+        self.blocksize_controller = None
+        self.diagnostics = None
+        self.spectrum_matcher = spectrum_matcher_from_env(BANDS)
+        self.spotify = None
+        self.now_playing_source = None
+        self.source_changed = threading.Event()  # Set by event-driven now-playing sources
+        self.prefetcher = None
+        self.now_playing = None
+        self.genre = None
+        self.running = False
+        self.started = time.time()
+        self.startup_time = time.perf_counter() - start
+
+    def start(self):
+        start = time.perf_counter()
+        self.zone_manager.start()
+        # AUDIO_CAPTURE records callback traffic for offline replay
+        if os.getenv("AUDIO_CAPTURE"):
+            self.zone_manager.start_capture(os.getenv("AUDIO_CAPTURE"))
+        self.device_monitor.start()
+        self.blocksize_controller = blocksize_controller_from_env(self.zone_manager)
+        self.diagnostics = diagnostics_from_env(self.zone_manager)
+        self.running = True
+        threading.Thread(target=self.run_auto_eq, name="AutoEQ", daemon=True).start()
+        if self.spectrum_matcher is not None:
+            threading.Thread(target=self.run_spectral_eq, name="SpectralEQ", daemon=True).start()
+        self.startup_time += time.perf_counter() - start
+
+    def stop(self):
+        self.running = False
+        self.source_changed.set()
+        if self.now_playing_source is not None:
+            self.now_playing_source.stop()
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        if self.spotify is not None:
+            self.spotify.close()
+        self.device_monitor.stop()
+        if self.blocksize_controller is not None:
+            self.blocksize_controller.stop()
+        self.diagnostics.stop_all()
+        self.zone_manager.close()
+
+    def find_zones(self, name=None):
+        if name is None:
+            return self.zone_manager.zones
+        zones = [zone for zone in self.zone_manager.zones if zone.name == name]
+        if not zones:
+            raise ValueError(f"No zone named '{name}'")
+        return zones
+
+    def apply_preset(self, preset_name, zone_name=None):
+        values = self.presets.get(preset_name)
+        if values is None:
+            raise ValueError(f"No preset found for: {preset_name}")
+        for zone in self.find_zones(zone_name):
+            zone.preset = preset_name
+            zone.set_gains(values)
+
+    def save_preset(self, preset_name, zone_name=None, gains=None):
+        """Save gains (default: the zone's current gains) as a custom preset, or overwrite a genre preset."""
+        if gains is None:
+            gains = self.find_zones(zone_name)[0].gains()
+        if len(gains) != len(BANDS):
+            raise ValueError(f"Expected {len(BANDS)} gains")
+        gains = [int(gain) for gain in gains]
+        with self.lock:
+            if preset_name in self.presets.genre_presets:
+                self.presets.genre_presets[preset_name] = gains
+                self.presets.save_genre_presets()
+            else:
+                self.presets.custom_presets[preset_name] = gains
+                self.presets.save_custom_presets()
+
+    def assign_genre(self, artist_name, genre):
+        if self.presets.get(genre) is None:
+            raise ValueError(f"Preset '{genre}' does not exist.")
+        with self.lock:
+            self.presets.artist_genres[artist_name] = genre
+            self.presets.save_artist_genres()
+        if self.spotify is not None:
+            self.spotify.learn_genre(artist_name, genre)
+
+    def set_enabled(self, enabled, zone_name=None):
+        for zone in self.find_zones(zone_name):
+            zone.enabled = enabled
+
+    def set_correction(self, path, target=None, zone_name=None):
+        """Fit a measurement file (and optional target) and apply it; path None removes the correction."""
+        profile = None
+        if path:
+            try:
+                profile = fit_profile(path, target or os.getenv("CORRECTION_TARGET") or None,
+                                      int(os.getenv("CORRECTION_BANDS", "10")))
+            except OSError as e:
+                raise ValueError(f"Cannot read {e.filename}: {e.strerror}")
+        for zone in self.find_zones(zone_name):
+            zone.set_correction(profile)
+
+    def run_auto_eq(self):
+        """
+        Poll Spotify once a second (or just after the current track should end),
+        or wait for an event-driven source to report a change, and apply the
+        genre preset to every zone, like the GUI.
+        """
+        try:
+            from spotify_integration import SpotifyIntegration
+            self.spotify = SpotifyIntegration()
+        except Exception as e:
+            print(f"Spotify unavailable, auto EQ disabled: {e}")
+            return
+        self.prefetcher = PresetPrefetcher(self.spotify, self.presets, self.zone_manager)
+        self.prefetcher.start()
+        source = self.now_playing_source = now_playing_source_from_env(self.spotify)
+        source.start(self.source_changed.set)
+        self.source_changed.set()  # Read whatever already plays
+        track_id = None
+        delay = 1.0
+        while self.running:
+            if source.event_driven:
+                self.source_changed.wait()
+                self.source_changed.clear()
+            else:
+                time.sleep(delay)
+            delay = 1.0
+            track = source.get_current_track()
+            fetched_at = time.perf_counter()
+            if not track:
+                self.now_playing = self.genre = None
+                continue
+            self.now_playing = f"{track['name']} by {track['artist']}"
+            self.genre, prefetched = self.prefetcher.genre_for(track["artist"])
+            track_changed = track["id"] != track_id
+            gains = self.prefetcher.gains_for(track["artist"], self.genre)
+            if self.auto_eq_enabled and self.genre and gains is not None:
+                # Each artist has its own blend, so blended zones follow track changes too
+                stale = [zone for zone in self.zone_manager.zones
+                         if zone.preset != self.genre or (self.prefetcher.blend and track_changed)]
+                for zone in stale:
+                    zone.preset = self.genre
+                    zone.set_gains(gains)
+                if stale and track_changed and track_id is not None:
+                    self.prefetcher.record_switch(track, fetched_at, prefetched)
+            if track_changed:
+                track_id = track["id"]
+                self.prefetcher.wake()
+            remaining = (track["duration_ms"] - track["progress_ms"]) / 1000
+            if 0 < remaining < delay:
+                delay = remaining + 0.05
+
+    def run_spectral_eq(self):
+        """AUTO_EQ_MODE=spectrum: step each zone's gains towards its preset's target curve."""
+        while self.running:
+            time.sleep(self.spectrum_matcher.interval)
+            if not self.auto_eq_enabled:
+                continue
+            for zone in self.zone_manager.zones:
+                gains = self.spectrum_matcher.update(zone, self.presets.get(zone.preset))
+                if gains is not None:
+                    zone.set_gains(gains)
+
+    def stats(self):
+        stats = {
+            "zones": self.zone_manager.stats(),
+            "startup_ms": self.startup_time * 1000,
+            "uptime_s": time.time() - self.started,
+            "coefficient_cache": {
+                "entries": len(self.zone_manager.cache.entries),
+                "hits": self.zone_manager.cache.hits,
+                "misses": self.zone_manager.cache.misses,
+            },
+            "now_playing": self.now_playing,
+            "genre": self.genre,
+            "auto_eq": self.auto_eq_enabled,
+        }
+        if self.prefetcher is not None:
+            stats["prefetch"] = self.prefetcher.summary()
+        if resource is not None:
+            # ru_maxrss is in KiB on Linux
+            stats["max_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return stats
+
+    def zones(self):
+        return [
+            {"name": zone.name, "preset": zone.preset, "gains": zone.gains(), "enabled": zone.enabled,
+             "nearest_presets": [name for name, _ in self.presets.matrix().nearest(zone.gains(), 3)]}
+            for zone in self.zone_manager.zones
+        ]
+
+
+class ControlHandler(BaseHTTPRequestHandler):
+    """JSON request handler; `service` is set on the server."""
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/presets":
+            self.reply(200, {name: service.presets.get(name) for name in service.presets.names()})
+        elif self.path == "/zones":
+            self.reply(200, service.zones())
+        elif self.path == "/stats":
+            self.reply(200, service.stats())
+        elif self.path == "/diagnostics":
+            self.reply(200, service.diagnostics.status())
+        else:
+            self.reply(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        service = self.server.service
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/apply":
+                service.apply_preset(body["preset"], body.get("zone"))
+            elif self.path == "/save":
+                service.save_preset(body["name"], body.get("zone"), body.get("gains"))
+            elif self.path == "/equalizer":
+                service.set_enabled(bool(body["enabled"]), body.get("zone"))
+            elif self.path == "/auto-eq":
+                service.auto_eq_enabled = bool(body["enabled"])
+                service.source_changed.set()  # Event-driven sources wouldn't re-apply until the next track
+            elif self.path == "/assign":
+                service.assign_genre(body["artist"], body["genre"])
+            elif self.path == "/correction":
+                service.set_correction(body["path"], body.get("target"), body.get("zone"))
+            elif self.path == "/diagnostics":
+                if body["enabled"]:
+                    service.diagnostics.start(body["kind"])
+                else:
+                    service.diagnostics.stop(body["kind"])
+            elif self.path == "/capture":
+                if body["enabled"]:
+                    service.zone_manager.start_capture(body.get("directory") or os.getenv("AUDIO_CAPTURE", "captures"))
+                else:
+                    service.zone_manager.stop_capture()
+            else:
+                self.reply(404, {"error": f"Unknown path: {self.path}"})
+                return
+        except KeyError as e:
+            self.reply(400, {"error": f"Missing field: {e}"})
+            return
+        except (ValueError, TypeError) as e:
+            self.reply(400, {"error": str(e)})
+            return
+        self.reply(200, {"ok": True})
+
+    def reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass  # Keep the console for audio and Spotify messages
+
+
+def create_server(service, port):
+    """Control server bound to localhost only."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), ControlHandler)
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    service = EqualizerService()
+    service.start()
+    server = create_server(service, int(os.getenv("EQ_CONTROL_PORT", "8765")))
+    print(f"AutoEQ daemon listening on http://127.0.0.1:{server.server_port} "
+          f"(started in {service.startup_time * 1000:.0f} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
@@ -0,0 +1,101 @@
+import os
+import sys
+import threading
+import time
+
+
+def system_device_signature():
+    """
+    Cheap OS-level fingerprint of the connected audio endpoints, or None if
+    the platform offers nothing suitable. Polling this does not touch PortAudio.
+    """
+    if sys.platform == "win32":
+        import winreg
+        signature = []
+        for flow in ("Render", "Capture"):
+            path = rf"SOFTWARE\Microsoft\Windows\CurrentVersion\MMDevices\Audio\{flow}"
+            try:
+                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, path) as key:
+                    for i in range(winreg.QueryInfoKey(key)[0]):
+                        endpoint = winreg.EnumKey(key, i)
+                        with winreg.OpenKey(key, endpoint) as endpoint_key:
+                            state = winreg.QueryValueEx(endpoint_key, "DeviceState")[0]
+                        signature.append((flow, endpoint, state))
+            except OSError:
+                return None
+        return tuple(signature)
+    if sys.platform.startswith("linux"):
+        try:
+            with open("/proc/asound/cards") as file:
+                cards = file.read()
+            return (cards, tuple(sorted(os.listdir("/dev/snd"))))
+        except OSError:
+            return None
+    return None
+
+
+class DeviceMonitor:
+    """
+    Watches for audio devices being added or removed and calls `on_change`
+    from its own thread, so the GUI never waits on a stream reopen.
+
+    A change is either a different system device signature or the backend's
+    stream having stopped on its own (the usual symptom of a removed device).
+    Zones whose streams could not be opened are retried on their own through
+    `retry_failed`, without touching the running streams. While a stream
+    stays down, retries back off exponentially up to `max_backoff` seconds
+    and start over when the device signature changes.
+    """
+
+    def __init__(self, backend, on_change, interval=1.0, max_backoff=60.0):
+        self.backend = backend
+        self.on_change = on_change
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.backoff = interval  # Wait before the next retry of a stream that stays down
+        self.next_retry = 0.0
+        self.signature = None
+        self.stop_event = threading.Event()
+        self.worker = None
+
+    def start(self):
+        if self.worker is not None:
+            return
+        self.signature = system_device_signature()
+        self.stop_event.clear()
+        self.worker = threading.Thread(target=self.run, name="DeviceMonitor", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.worker is not None:
+            self.worker.join(timeout=2.0)
+            self.worker = None
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            signature = system_device_signature()
+            now = time.monotonic()
+            if signature is not None and signature != self.signature:
+                # A new device layout gets a fresh start
+                self.signature = signature
+                self.backoff = self.interval
+                self.next_retry = now + self.backoff
+                self.handle(self.on_change)
+                continue
+            active = self.backend.is_active()
+            if active and not self.backend.has_failed():
+                self.backoff = self.interval
+                continue
+            # Still down after the last attempt: retry on an exponential backoff, not every interval
+            if now < self.next_retry:
+                continue
+            self.next_retry = now + self.backoff
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self.handle(self.on_change if not active else self.backend.retry_failed)
+
+    def handle(self, action):
+        try:
+            action()
+        except Exception as e:
+            print(f"Error handling device change: {e}")
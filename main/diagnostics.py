@@ -0,0 +1,297 @@
+"""
+On-demand diagnostics for stutter hunting. Each kind starts and stops on its
+own (tray menu, DIAGNOSTICS in .env, or the daemon API) and writes a
+timestamped report into DIAGNOSTICS_DIR when stopped:
+
+- profile: samples the stacks of every Python thread (the GUI thread is
+  MainThread) and reports the hottest functions, plus a .folded file for
+  flamegraph.pl or speedscope,
+- timing: histograms of every zone's audio callback time against its deadline,
+- memory: tracemalloc snapshots at start and stop, reporting what grew.
+
+Nothing is installed while a kind is off: no sampler thread, no histogram on
+the callback stats, no tracemalloc hooks.
+
+Toggle them on a running daemon with:
+    python diagnostics.py profile on
+    python diagnostics.py timing off
+    python diagnostics.py status
+"""
+import bisect
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+KINDS = ("profile", "timing", "memory")
+
+
+def report_path(directory, kind, extension="txt"):
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.{extension}")
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler: a thread grabs every other thread's current stack
+    every `interval` seconds through sys._current_frames. Cheap enough to run
+    while reproducing a stutter, and it sees time spent blocked too.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()  # (thread name, frame, ..., innermost frame) -> samples
+        self.samples = 0
+        self.started = None
+        self.stop_event = threading.Event()
+        self.worker = None
+
+    def start(self):
+        self.started = time.time()
+        self.worker = threading.Thread(target=self.run, name="SamplingProfiler", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.worker.join(timeout=2.0)
+
+    def run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, directory):
+        path = report_path(directory, "profile")
+        own_time = Counter()
+        total_time = Counter()
+        threads = Counter()
+        for stack, count in self.stacks.items():
+            threads[stack[0]] += count
+            # Line numbers make the folded output precise; the tables group per function
+            functions = [frame.rsplit(":", 1)[0] for frame in stack[1:]]
+            if functions:
+                own_time[(stack[0], functions[-1])] += count
+            for function in set(functions):
+                total_time[(stack[0], function)] += count
+        duration = time.time() - self.started
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(f"Sampling profile, {duration:.1f} s, {self.samples} samples every "
+                       f"{self.interval * 1000:.0f} ms\n\n")
+            for title, counts in (("Own time (innermost frame)", own_time), ("Total time (on the stack)", total_time)):
+                file.write(f"{title}:\n")
+                for (thread, function), count in counts.most_common(30):
+                    file.write(f"  {count / max(threads[thread], 1) * 100:6.1f}%  {thread:<20} {function}\n")
+                file.write("\n")
+        with open(path[:-len("txt")] + "folded", "w", encoding="utf-8") as file:
+            for stack, count in self.stacks.items():
+                file.write(f"{';'.join(stack)} {count}\n")
+        return path
+
+
+class TimingHistogram:
+    """
+    Callback durations binned by load (time / deadline) on a log scale from
+    0.5% to 400%. add() runs in the audio callback: one bisect and one list
+    increment, no allocation.
+    """
+
+    EDGES = [0.005 * 1.1 ** i for i in range(71)]  # 0.5% .. ~400%
+
+    def __init__(self):
+        self.counts = [0] * (len(self.EDGES) + 1)
+        self.max_load = 0.0
+
+    def add(self, duration, deadline):
+        load = duration / deadline
+        self.counts[bisect.bisect(self.EDGES, load)] += 1
+        if load > self.max_load:
+            self.max_load = load
+
+    def percentile(self, fraction):
+        """Upper bin edge below which `fraction` of the callbacks fall."""
+        total = sum(self.counts)
+        if not total:
+            return 0.0
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= fraction * total:
+                return min(self.EDGES[i], self.max_load) if i < len(self.EDGES) else self.max_load
+        return self.max_load
+
+    def lines(self):
+        total = sum(self.counts)
+        yield (f"{total} callbacks, p50 {self.percentile(0.5) * 100:.1f}%, p90 {self.percentile(0.9) * 100:.1f}%, "
+               f"p99 {self.percentile(0.99) * 100:.1f}%, p99.9 {self.percentile(0.999) * 100:.1f}%, "
+               f"max {self.max_load * 100:.1f}% of the deadline")
+        widest = max(self.counts) or 1
+        for i, count in enumerate(self.counts):
+            if count:
+                low = self.EDGES[i - 1] if i else 0.0
+                high = f"{self.EDGES[i] * 100:6.1f}%" if i < len(self.EDGES) else "   ...  "
+                yield f"  {low * 100:6.1f}% - {high} {count:>8} {'#' * max(1, round(40 * count / widest))}"
+
+
+class CallbackTiming:
+    """Timing histograms on every zone's callback stats; the histogram follows a zone onto a resized stream."""
+
+    def __init__(self, zone_manager):
+        self.zone_manager = zone_manager
+        self.histograms = {}
+        self.started = None
+
+    def start(self):
+        self.started = time.time()
+        for zone in self.zone_manager.zones:
+            histogram = self.histograms[zone.name] = TimingHistogram()
+            zone.backend.stats.histogram = histogram
+
+    def stop(self):
+        for zone in self.zone_manager.zones:
+            zone.backend.stats.histogram = None
+
+    def write(self, directory):
+        path = report_path(directory, "timing")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(f"Audio callback timing, {time.time() - self.started:.1f} s\n")
+            for zone in self.zone_manager.zones:
+                file.write(f"\n[{zone.name}] {zone.blocksize} frames at {zone.engine.sample_rate} Hz\n")
+                for line in self.histograms[zone.name].lines():
+                    file.write(line + "\n")
+        return path
+
+
+class MemorySnapshots:
+    """tracemalloc from start to stop; reports the allocation sites that grew the most."""
+
+    def __init__(self, frames=10):
+        self.frames = frames
+        self.baseline = None
+
+    def start(self):
+        tracemalloc.start(self.frames)
+        self.baseline = tracemalloc.take_snapshot()
+
+    def stop(self):
+        self.snapshot = tracemalloc.take_snapshot()
+        self.current, self.peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    def write(self, directory):
+        path = report_path(directory, "memory")
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        differences = self.snapshot.filter_traces(filters).compare_to(self.baseline.filter_traces(filters), "lineno")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(f"Traced memory: {self.current / 1e6:.1f} MB now, {self.peak / 1e6:.1f} MB peak\n\n")
+            file.write("Largest growth since start:\n")
+            for difference in differences[:30]:
+                file.write(f"  {difference}\n")
+            file.write("\nLargest allocation sites now:\n")
+            for statistic in self.snapshot.filter_traces(filters).statistics("lineno")[:30]:
+                file.write(f"  {statistic}\n")
+        return path
+
+
+class Diagnostics:
+    """
+    Starts and stops the diagnostics kinds. With an AudioProcess as zone
+    manager, callback timing runs inside the audio process (which writes its
+    own report); profile and memory cover the calling process.
+    """
+
+    def __init__(self, zone_manager, directory="diagnostics"):
+        self.zone_manager = zone_manager
+        self.directory = directory
+        self.active = {}  # Kind -> running collector
+        self.reports = []
+        self.lock = threading.Lock()
+
+    def is_running(self, kind):
+        return kind in self.active
+
+    def start(self, kind):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown diagnostics kind '{kind}', expected one of {', '.join(KINDS)}")
+        with self.lock:
+            if kind in self.active:
+                return
+            remote = getattr(self.zone_manager, "send", None)
+            if kind == "timing" and remote is not None:
+                remote("diagnostics", (kind, True, self.directory))
+                self.active[kind] = None
+                print(f"Diagnostics: {kind} started in the audio process")
+                return
+            collector = {"profile": SamplingProfiler, "memory": MemorySnapshots}.get(kind)
+            collector = CallbackTiming(self.zone_manager) if collector is None else collector()
+            collector.start()
+            self.active[kind] = collector
+        print(f"Diagnostics: {kind} started")
+
+    def stop(self, kind):
+        """Stop a kind and write its report; returns the report path (None if remote or not running)."""
+        with self.lock:
+            if kind not in self.active:
+                return None
+            collector = self.active.pop(kind)
+            if collector is None:
+                self.zone_manager.send("diagnostics", (kind, False, self.directory))
+                return None
+            collector.stop()
+            path = collector.write(self.directory)
+            self.reports.append(path)
+        print(f"Diagnostics: {kind} report written to {path}")
+        return path
+
+    def toggle(self, kind):
+        """Start `kind` if it is off, otherwise stop it; returns whether it now runs."""
+        if self.is_running(kind):
+            self.stop(kind)
+            return False
+        self.start(kind)
+        return True
+
+    def stop_all(self):
+        for kind in list(self.active):
+            self.stop(kind)
+
+    def status(self):
+        return {"running": sorted(self.active), "reports": list(self.reports)}
+
+
+def diagnostics_from_env(zone_manager):
+    """Diagnostics writing to DIAGNOSTICS_DIR, with the kinds listed in DIAGNOSTICS already started."""
+    diagnostics = Diagnostics(zone_manager, os.getenv("DIAGNOSTICS_DIR", "diagnostics"))
+    for kind in os.getenv("DIAGNOSTICS", "").split(","):
+        if kind.strip():
+            diagnostics.start(kind.strip())
+    return diagnostics
+
+
+if __name__ == "__main__":
+    from urllib.request import Request, urlopen
+
+    url = f"http://127.0.0.1:{os.getenv('EQ_CONTROL_PORT', '8765')}/diagnostics"
+    if len(sys.argv) == 3 and sys.argv[1] in KINDS and sys.argv[2] in ("on", "off"):
+        body = json.dumps({"kind": sys.argv[1], "enabled": sys.argv[2] == "on"}).encode()
+        request = Request(url, data=body, headers={"Content-Type": "application/json"})
+    elif sys.argv[1:] == ["status"]:
+        request = Request(url)
+    else:
+        print(__doc__)
+        sys.exit(1)
+    with urlopen(request) as response:
+        print(json.dumps(json.load(response), indent=2))
@@ -0,0 +1,118 @@
+import numpy as np
+
+
+def peaking_sos(f0, Q, gain_db, sample_rate):
+    """
+    Design peaking EQ biquads (RBJ cookbook) and return them as second-order sections.
+
+    f0, Q and gain_db may be scalars or arrays; the result has one SOS row per band,
+    shape (bands, 6), so a whole band layout is designed in one vectorized pass.
+    """
+    f0, Q, gain_db = np.broadcast_arrays(
+        np.atleast_1d(np.asarray(f0, dtype=np.float64)),
+        np.atleast_1d(np.asarray(Q, dtype=np.float64)),
+        np.atleast_1d(np.asarray(gain_db, dtype=np.float64)),
+    )
+    # Convert gain from dB to linear amplitude
+    A = 10 ** (gain_db / 40)
+    # Calculate normalized frequency
+    omega = 2 * np.pi * f0 / sample_rate
+    # Bandwidth control
+    alpha = np.sin(omega) / (2 * Q)
+    cos_omega = np.cos(omega)
+
+    a0 = 1 + alpha / A
+    sos = np.empty((len(f0), 6))
+    sos[:, 0] = (1 + alpha * A) / a0
+    sos[:, 1] = -2 * cos_omega / a0
+    sos[:, 2] = (1 - alpha * A) / a0
+    sos[:, 3] = 1.0
+    sos[:, 4] = -2 * cos_omega / a0
+    sos[:, 5] = (1 - alpha / A) / a0
+    return sos
+
+
+def sos_response_db(sos, freqs, sample_rate):
+    """
+    Evaluate the magnitude response of each SOS row on a frequency grid.
+
+    Returns an array of shape (sections, len(freqs)) in dB. All sections are
+    evaluated with one broadcasted polynomial evaluation instead of a
+    per-section sosfreqz loop.
+    """
+    sos = np.atleast_2d(sos)
+    z1 = np.exp(-1j * 2 * np.pi * np.asarray(freqs) / sample_rate)  # z^-1 on the grid
+    z2 = z1 * z1
+    num = sos[:, 0:1] + sos[:, 1:2] * z1 + sos[:, 2:3] * z2
+    den = sos[:, 3:4] + sos[:, 4:5] * z1 + sos[:, 5:6] * z2
+    return 20 * np.log10(np.maximum(np.abs(num / den), 1e-12))
+
+
+class ResponseCurve:
+    """
+    Combined magnitude response of a peaking EQ band layout on a log-frequency grid.
+
+    Each band's contribution is cached as its own dB row, so changing one band
+    (e.g. while dragging a slider) only re-evaluates that row. Totals are also
+    cached per parameter snapshot, which makes switching between presets free
+    after the first time.
+    """
+
+    def __init__(self, bands, sample_rate=44100, Q=1.0, points=512, min_freq=20.0,
+                 max_freq=20000.0, snapshot_cache_size=64):
+        self.bands = np.asarray(bands, dtype=np.float64)
+        self.sample_rate = sample_rate
+        self.Q = Q
+        self.freqs = np.geomspace(min_freq, min(max_freq, sample_rate / 2 * 0.999), points)
+        self.gains = np.zeros(len(self.bands))
+        self.band_db = np.zeros((len(self.bands), points))
+        self.total_db = np.zeros(points)
+        self.snapshot_cache = {}
+        self.snapshot_cache_size = snapshot_cache_size
+
+    def set_sample_rate(self, sample_rate):
+        """Re-evaluate the curve for another rate; cached snapshots belong to the old one."""
+        self.sample_rate = sample_rate
+        self.snapshot_cache.clear()
+        self.set_gains(self.gains)
+
+    def set_gains(self, gains):
+        """Set all band gains at once, recomputing every band in one vectorized pass."""
+        gains = np.asarray(gains, dtype=np.float64)
+        key = tuple(gains)
+        cached = self.snapshot_cache.get(key)
+        if cached is not None:
+            self.gains, self.band_db, self.total_db = gains, cached[0], cached[1]
+            return self.total_db
+        self.gains = gains
+        sos = peaking_sos(self.bands, self.Q, gains, self.sample_rate)
+        self.band_db = sos_response_db(sos, self.freqs, self.sample_rate)
+        self.total_db = self.band_db.sum(axis=0)
+        self.remember(key)
+        return self.total_db
+
+    def set_gain(self, index, gain_db):
+        """Update a single band and adjust the total incrementally."""
+        if self.gains[index] == gain_db:
+            return self.total_db
+        gains = self.gains.copy()
+        gains[index] = gain_db
+        key = tuple(gains)
+        cached = self.snapshot_cache.get(key)
+        if cached is not None:
+            self.gains, self.band_db, self.total_db = gains, cached[0], cached[1]
+            return self.total_db
+        sos = peaking_sos(self.bands[index], self.Q, gain_db, self.sample_rate)
+        row = sos_response_db(sos, self.freqs, self.sample_rate)[0]
+        # Copy on write so cached snapshots stay untouched
+        band_db = self.band_db.copy()
+        total_db = self.total_db + (row - band_db[index])
+        band_db[index] = row
+        self.gains, self.band_db, self.total_db = gains, band_db, total_db
+        self.remember(key)
+        return self.total_db
+
+    def remember(self, key):
+        if len(self.snapshot_cache) >= self.snapshot_cache_size:
+            self.snapshot_cache.pop(next(iter(self.snapshot_cache)))
+        self.snapshot_cache[key] = (self.band_db, self.total_db)
@@ -0,0 +1,130 @@
+import os
+import numpy as np
+from scipy import fft as sp_fft
+from scipy.signal import sosfilt
+from dsp import peaking_sos, sos_response_db
+from eq_engine import EqualizerEngine
+
+
+class DynamicEqualizerEngine(EqualizerEngine):
+    """
+    Cascade EQ whose boosts back off while their band is loud (EQ_ENGINE=dynamic).
+
+    Once per block, the levels of all bands and channels come from one windowed
+    FFT of the newest `window` frames and a (bands x bins) weighting matmul, and
+    one vectorized attack/release step moves the per-band, per-channel
+    envelopes. Each band's boost is reduced by (envelope - threshold) *
+    (1 - 1/ratio), stereo-linked and never below flat, so a +6 dB bass preset
+    stops adding level once the track's bass is already strong. Only the
+    sections are redesigned per block (one vectorized peaking_sos call) and
+    filter state carries over. Makeup gain follows: it is relaxed by as much as
+    the response peak at the band centers drops, up to unity.
+
+    Budget: the dynamic part (detector, envelope and redesign) may add at most
+    2% of the block deadline at 1024 frames and 44.1 kHz for 10 and 31 bands;
+    benchmarks/bench_dynamic_eq.py measures it.
+    """
+
+    def __init__(self, bands, sample_rate=44100, channels=2, threshold_db=-30.0, ratio=3.0,
+                 attack_ms=10.0, release_ms=200.0, window=2048, **options):
+        count = len(bands)
+        self.threshold_db = np.broadcast_to(np.asarray(threshold_db, dtype=np.float64), (count,)).copy()
+        self.ratio = np.broadcast_to(np.asarray(ratio, dtype=np.float64), (count,)).copy()
+        self.attack_ms = np.broadcast_to(np.asarray(attack_ms, dtype=np.float64), (count,)).copy()
+        self.release_ms = np.broadcast_to(np.asarray(release_ms, dtype=np.float64), (count,)).copy()
+        self.attack = self.attack_ms[:, None] / 1000
+        self.release = self.release_ms[:, None] / 1000
+        self.window = window
+        self.taper = np.hanning(window)[:, None]
+        self.history = np.zeros((window, channels))
+        self.envelope = np.full((count, channels), 1e-12)  # Band power per channel
+        self.reduction_db = np.zeros(count)
+        self.static_settings = None  # Settings the static center peak below belongs to
+        self.static_center_peak = 0.0
+        super().__init__(bands, sample_rate=sample_rate, channels=channels, **options)
+
+    def set_sample_rate(self, sample_rate, gains=None):
+        super().set_sample_rate(sample_rate, gains)
+        # Band detectors: analog band-pass power response at the FFT bin frequencies
+        freqs = np.maximum(sp_fft.rfftfreq(self.window, 1 / sample_rate), 1e-3)
+        ratio = freqs[None, :] / self.bands[:, None]
+        self.weights = 1 / (1 + self.Q ** 2 * (ratio - 1 / ratio) ** 2)
+        # One-sided spectrum power -> mean square of the band-limited signal
+        self.power_scale = 2 / (self.window * np.sum(self.taper ** 2))
+
+    def reset(self):
+        super().reset()
+        self.history[:] = 0.0
+        self.envelope[:] = 1e-12
+        self.reduction_db[:] = 0.0
+
+    def snapshot(self):
+        return {**super().snapshot(), "history": self.history.copy(), "envelope": self.envelope.copy(),
+                "reduction_db": self.reduction_db.copy()}
+
+    def restore(self, state):
+        super().restore(state)
+        self.history[:] = state["history"]
+        self.envelope = state["envelope"].copy()
+        self.reduction_db = state["reduction_db"].copy()
+
+    def options(self):
+        return {**super().options(), "threshold_db": self.threshold_db.tolist(), "ratio": self.ratio.tolist(),
+                "attack_ms": self.attack_ms.tolist(), "release_ms": self.release_ms.tolist(),
+                "window": self.window}
+
+    def center_peak(self, sos):
+        """Peak of the combined response evaluated at the band centers only (cheap enough per block)."""
+        return float(np.max(sos_response_db(sos, self.bands, self.sample_rate).sum(axis=0)))
+
+    def detect(self, block):
+        """Update and return the band envelopes in dB, one value per band (loudest channel)."""
+        frames = len(block)
+        if frames >= self.window:
+            self.history[:] = block[-self.window:]
+        else:
+            self.history[:-frames] = self.history[frames:]
+            self.history[-frames:] = block
+        spectrum = sp_fft.rfft(self.history * self.taper, axis=0)
+        power = (self.weights @ (spectrum.real ** 2 + spectrum.imag ** 2)) * self.power_scale
+
+        # Attack while rising, release while falling, for every band and channel at once
+        seconds = frames / self.sample_rate
+        coefficient = np.where(power > self.envelope, np.exp(-seconds / self.attack),
+                               np.exp(-seconds / self.release))
+        self.envelope = power + coefficient * (self.envelope - power)
+        return 10 * np.log10(np.maximum(self.envelope.max(axis=1), 1e-12))
+
+    def process(self, block):
+        """Filter a (frames, channels) block with the boosts reduced by the band envelopes."""
+        settings = self.settings  # Read once so a concurrent update can't split the block
+        if settings.is_flat:
+            return np.asarray(block, dtype=np.float64)
+        level_db = self.detect(block)
+        self.reduction_db = np.clip((level_db - self.threshold_db) * (1 - 1 / self.ratio), 0.0,
+                                    np.maximum(settings.gains, 0.0))
+        active = settings.active
+        sos = settings.sos
+        makeup_gain = settings.makeup_gain
+        if self.reduction_db[active].max() >= 0.05:
+            if settings is not self.static_settings:
+                self.static_settings = settings
+                self.static_center_peak = self.center_peak(settings.sos)
+            sos = peaking_sos(self.bands[active], self.Q, settings.gains[active] - self.reduction_db[active],
+                              self.sample_rate)
+            makeup_gain = min(1.0, makeup_gain * 10 ** ((self.static_center_peak - self.center_peak(sos)) / 20))
+        output, self.zi[active] = sosfilt(sos, block, axis=0, zi=self.zi[active])
+        output *= makeup_gain
+        return output
+
+
+def dynamic_options_from_env():
+    """DYNAMIC_EQ_* settings; each may be one value or a comma-separated value per band."""
+    options = {}
+    for key, name in (("threshold_db", "DYNAMIC_EQ_THRESHOLD"), ("ratio", "DYNAMIC_EQ_RATIO"),
+                      ("attack_ms", "DYNAMIC_EQ_ATTACK_MS"), ("release_ms", "DYNAMIC_EQ_RELEASE_MS")):
+        value = os.getenv(name)
+        if value:
+            values = [float(part) for part in value.split(",")]
+            options[key] = values[0] if len(values) == 1 else values
+    return options
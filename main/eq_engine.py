@@ -0,0 +1,154 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from scipy.signal import sosfilt
+from dsp import peaking_sos, sos_response_db
+
+
+class EqualizerSettings:
+    """
+    Immutable snapshot of everything the audio thread needs for one parameter set.
+    Replaced as a whole when parameters change so the callback never sees a mix.
+    """
+
+    def __init__(self, gains, active, sos, makeup_gain, peak_db):
+        self.gains = gains
+        self.active = active          # Indices of bands with a non-zero gain
+        self.sos = sos                # Cascaded sections for the active bands
+        self.makeup_gain = makeup_gain  # Applied to the output, so no section's state depends on it
+        self.peak_db = peak_db        # Analytic peak of the combined response before makeup
+        self.is_flat = len(active) == 0
+
+
+class CoefficientCache:
+    """
+    LRU cache of EqualizerSettings keyed by sample rate, band layout, Q and gains.
+    Switching back to a rate or preset that was used before skips the design step.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, design):
+        with self.lock:
+            settings = self.entries.get(key)
+            if settings is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return settings
+            self.misses += 1
+        settings = design()
+        with self.lock:
+            self.entries[key] = settings
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return settings
+
+
+class EqualizerEngine:
+    """
+    Serial (cascaded) peaking EQ.
+
+    All active bands are chained into a single SOS and run in one sosfilt pass
+    per block, with filter state kept across blocks. Gain compensation is
+    computed once per parameter change from the peak of the combined response
+    and applied as one scalar, so there is no per-block normalization.
+    """
+
+    def __init__(self, bands, sample_rate=44100, channels=2, Q=1.0, peak_grid_points=2048, cache=None):
+        self.bands = np.asarray(bands, dtype=np.float64)
+        self.channels = channels
+        self.Q = Q
+        self.peak_grid_points = peak_grid_points
+        self.cache = cache if cache is not None else CoefficientCache()
+        # Per-band filter state, shape (bands, 2, channels), so toggling a band keeps the others' state
+        self.zi = np.zeros((len(self.bands), 2, channels))
+        self.set_sample_rate(sample_rate, np.zeros(len(self.bands)))
+
+    def set_sample_rate(self, sample_rate, gains=None):
+        """Switch to another device rate; coefficients come from the per-rate cache."""
+        self.sample_rate = sample_rate
+        # Dense log grid plus the band centers themselves, where peaks usually sit
+        grid = np.geomspace(10.0, sample_rate / 2 * 0.999, self.peak_grid_points)
+        self.peak_freqs = np.union1d(grid, self.bands[self.bands < sample_rate / 2])
+        self.reset()
+        self.set_gains(self.settings.gains if gains is None else gains)
+
+    def design(self, gains):
+        """Build an EqualizerSettings snapshot for the given per-band gains (dB)."""
+        gains = np.asarray(gains, dtype=np.float64)
+        active = np.flatnonzero(gains)
+        if len(active) == 0:
+            return EqualizerSettings(gains, active, None, 1.0, 0.0)
+
+        sos = peaking_sos(self.bands[active], self.Q, gains[active], self.sample_rate)
+        peak_db = float(np.max(sos_response_db(sos, self.peak_freqs, self.sample_rate).sum(axis=0)))
+        # Only pull the level down; cuts are left as they are
+        makeup_gain = 10 ** (-max(peak_db, 0.0) / 20)
+        return EqualizerSettings(gains, active, sos, makeup_gain, peak_db)
+
+    def prepare(self, gains):
+        """Return the settings for `gains` from the cache, designing them if needed, without applying them."""
+        gains = np.asarray(gains, dtype=np.float64)
+        key = (type(self).__name__, self.sample_rate, self.Q, tuple(self.bands), tuple(gains))
+        return self.cache.get(key, lambda: self.design(gains))
+
+    def set_gains(self, gains):
+        """Look up or recompute coefficients and makeup gain; safe to call from the GUI thread."""
+        self.settings = self.prepare(gains)
+
+    def is_flat(self):
+        return self.settings.is_flat
+
+    def options(self):
+        """Constructor options that rebuild this engine (see create_engine), e.g. for replay."""
+        return {"Q": self.Q}
+
+    def reset(self):
+        """Clear filter state, e.g. after a stream restart."""
+        self.zi[:] = 0.0
+
+    def snapshot(self):
+        """Copy of the processing state, for restore() (captures record it so replay starts where they did)."""
+        return {"zi": self.zi.copy()}
+
+    def restore(self, state):
+        self.zi[:] = state["zi"]
+
+    def latency(self):
+        """Processing delay in samples."""
+        return 0
+
+    def process(self, block):
+        """
+        Filter a (frames, channels) block through the cascade.
+        Returns a new float64 array; the input is left untouched.
+        """
+        settings = self.settings  # Read once so a concurrent update can't split the block
+        if settings.is_flat:
+            return np.asarray(block, dtype=np.float64)
+        active = settings.active
+        output, self.zi[active] = sosfilt(settings.sos, block, axis=0, zi=self.zi[active])
+        # Makeup stays out of the sections: folded into whichever band comes first, that
+        # band's saved state would be off by the ratio whenever the active set changes
+        output *= settings.makeup_gain
+        return output
+
+
+def create_engine(name, bands, sample_rate=44100, channels=2, **options):
+    """Instantiate an EQ engine by name ("cascade", "dynamic" or "oversampled")."""
+    if name == "cascade":
+        return EqualizerEngine(bands, sample_rate=sample_rate, channels=channels, **options)
+    if name == "dynamic":
+        from dynamic_eq import DynamicEqualizerEngine, dynamic_options_from_env
+        options = {**dynamic_options_from_env(), **options}
+        return DynamicEqualizerEngine(bands, sample_rate=sample_rate, channels=channels, **options)
+    if name == "oversampled":
+        from oversampling import OversampledEqualizerEngine, oversampling_options_from_env
+        options = {**oversampling_options_from_env(), **options}
+        return OversampledEqualizerEngine(bands, sample_rate=sample_rate, channels=channels, **options)
+    raise ValueError(f"Unknown EQ engine: {name}")
@@ -1,16 +1,26 @@
-import numpy as np
-import pyaudio
-import pickle
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QSlider, QPushButton, QHBoxLayout, QGridLayout,
-    QLineEdit, QComboBox, QMessageBox, QSystemTrayIcon, QMenu, QAction
+    QLineEdit, QComboBox, QMessageBox, QSystemTrayIcon, QMenu, QAction, QFileDialog
 )
 import os
-import sys
-from PyQt5.QtCore import Qt, QTimer
+import threading
+import time
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QIcon
-from scipy.signal import sosfilt
 from spotify_integration import SpotifyIntegration
+from now_playing import now_playing_source_from_env
+from spectrum_analyzer import SpectrumAnalyzer
+from visualization import SpectrumWidget, ResponseCurveWidget
+from dsp import ResponseCurve
+from zones import ZoneManager, zone_specs_from_env
+from audio_process import AudioProcess
+from presets import BANDS, PresetStore
+from device_monitor import DeviceMonitor
+from blocksize import blocksize_controller_from_env
+from prefetch import PresetPrefetcher
+from correction import fit_profile
+from spectral_eq import spectrum_matcher_from_env
+from diagnostics import KINDS, diagnostics_from_env
 
 STYLE_SHEET = """
 QPushButton {
@@ -27,31 +37,41 @@ QPushButton:hover {
 }
 """
 
-def get_resource_path(relative_path):
-    """
-    Get the absolute path to a resource, works for PyInstaller bundled environments.
-    """
-    if hasattr(sys, "_MEIPASS"):
-        # PyInstaller extracts resources to a temporary folder
-        return os.path.join(sys._MEIPASS, relative_path)
-    return os.path.join(os.path.abspath("."), relative_path)
-
 class EqualizerWindow(QWidget):
+    # Emitted from an event-driven now-playing source's thread, handled on the GUI thread
+    track_changed = pyqtSignal()
+    # Emitted from the prefetcher's thread with (artist, genre) once a missed lookup is resolved
+    genre_resolved = pyqtSignal(str, object)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("AutoEQ")
         self.setGeometry(100, 100, 900, 700)
-        self.equalizer_enabled = True
         self.auto_eq_enabled = True
-        self.artist_genres = self.load_artist_genres()
 
-        # Initialize presets
-        self.default_genre_presets = self.get_default_genre_presets()
-        self.genre_presets = self.get_genre_presets()
-        self.custom_presets = self.load_custom_presets()
+        # Genre and custom presets plus artist-genre assignments
+        self.presets = PresetStore()
 
         # Initialize Spotify Integration
         self.spotify = SpotifyIntegration()
+        # NOW_PLAYING=mpris: local players push track changes instead of polling the Web API
+        self.now_playing_source = now_playing_source_from_env(self.spotify)
+
+        # Spectrum analyzer fed from the audio callback, analyzed on its own thread
+        self.spectrum_analyzer = SpectrumAnalyzer(sample_rate=44100, channels=2, full_scale=1.0)
+
+        self.bands = BANDS
+        self.init_zones()
+
+        # Resolves queued tracks' genres and designs their EQ before the track change
+        self.prefetcher = PresetPrefetcher(self.spotify, self.presets, self.zone_manager)
+        self.current_track_id = None
+        self.boundary_poll_pending = False
+        self.pending_track = None  # (track, fetched_at, measure) waiting for its genre
+        self.genre_resolved.connect(self.on_genre_resolved, Qt.QueuedConnection)
+
+        # AUTO_EQ_MODE=spectrum: drift each zone's gains from its preset towards the preset's target curve
+        self.spectrum_matcher = spectrum_matcher_from_env(self.bands)
 
         self.init_ui()
         self.init_audio()
@@ -71,6 +91,9 @@ class EqualizerWindow(QWidget):
         # Spotify "Now Playing" Section
         self.add_now_playing_section()
 
+        # Spectrum Display
+        self.add_spectrum_display()
+
         # Equalizer Sliders
         self.add_sliders()
 
@@ -80,6 +103,9 @@ class EqualizerWindow(QWidget):
         # Additional Controls
         self.add_buttons()
 
+        # Zone selection and per-zone stream stats
+        self.add_zone_controls()
+
         # System Tray Integration
         self.setup_tray_icon()
 
@@ -97,17 +123,23 @@ class EqualizerWindow(QWidget):
         self.now_playing_label.setAlignment(Qt.AlignCenter)
         self.main_layout.addWidget(self.now_playing_label)
 
+        if self.now_playing_source.event_driven:
+            # Queued even when emitted on the GUI thread, so it never runs in the middle of setup
+            self.track_changed.connect(self.update_now_playing, Qt.QueuedConnection)
+            return  # Started at the end of init_audio, once every widget exists
         self.song_update_timer = QTimer(self)
         self.song_update_timer.timeout.connect(self.update_now_playing)
         self.song_update_timer.start(1000)
 
+    def add_spectrum_display(self):
+        self.spectrum_widget = SpectrumWidget(self.spectrum_analyzer)
+        self.main_layout.addWidget(self.spectrum_widget)
+
     def add_sliders(self):
         self.sliders_layout = QGridLayout()
         self.sliders = []
         self.slider_labels = []
-        
 
-        self.bands = [60, 170, 310, 600, 1000, 3000, 6000, 12000, 14000, 16000]
         for i, band in enumerate(self.bands):
             band_label = QLabel(f"{band} Hz")
             band_label.setAlignment(Qt.AlignCenter)
@@ -129,6 +161,27 @@ class EqualizerWindow(QWidget):
 
         self.main_layout.addLayout(self.sliders_layout)
 
+        # Sliders push gains into the selected zone's EQ engine
+        for slider in self.sliders:
+            slider.valueChanged.connect(self.update_engine_gains)
+
+        # Combined response of all bands, updated one band at a time
+        self.response_curve = ResponseCurve(self.bands, sample_rate=44100)
+        self.response_curve_widget = ResponseCurveWidget(self.response_curve)
+        for i, slider in enumerate(self.sliders):
+            slider.valueChanged.connect(lambda value, index=i: self.update_response_curve(index, value))
+        self.main_layout.addWidget(self.response_curve_widget)
+        self.zone.attach_display(self.spectrum_analyzer, self.response_curve)
+
+    def update_engine_gains(self):
+        """Redesign the selected zone's filter cascade for the current slider values."""
+        self.zone.set_gains([slider.value() for slider in self.sliders])
+
+    def update_response_curve(self, index, value):
+        """Recompute the changed band's response and repaint the curve."""
+        self.response_curve.set_gain(index, value)
+        self.response_curve_widget.update()
+
     def add_preset_controls(self):
         self.preset_layout = QHBoxLayout()
 
@@ -158,7 +211,7 @@ class EqualizerWindow(QWidget):
     def add_buttons(self):
         buttons_layout = QHBoxLayout()
 
-        self.bypass_button = QPushButton("Equalizer: Enabled" if self.equalizer_enabled else "Equalizer: Bypassed")
+        self.bypass_button = QPushButton("Equalizer: Enabled" if self.zone.enabled else "Equalizer: Bypassed")
         self.bypass_button.clicked.connect(self.toggle_bypass)
         buttons_layout.addWidget(self.bypass_button)
 
@@ -167,9 +220,14 @@ class EqualizerWindow(QWidget):
         buttons_layout.addWidget(self.auto_eq_button)
 
         # Add a button to refresh output device
-        refresh_app_button = QPushButton("Refresh App")
-        refresh_app_button.clicked.connect(self.confirm_restart)
-        buttons_layout.addWidget(refresh_app_button)
+        refresh_devices_button = QPushButton("Refresh Devices")
+        refresh_devices_button.clicked.connect(self.refresh_devices)
+        buttons_layout.addWidget(refresh_devices_button)
+
+        # Headphone/speaker measurement to correct the selected zone with
+        correction_button = QPushButton("Load Correction")
+        correction_button.clicked.connect(self.load_correction)
+        buttons_layout.addWidget(correction_button)
 
         # # Add a button to refresh Spotify login
         # refresh_login_button = QPushButton("Refresh Spotify Login")
@@ -178,6 +236,54 @@ class EqualizerWindow(QWidget):
 
         self.main_layout.addLayout(buttons_layout)
 
+    def add_zone_controls(self):
+        layout = QHBoxLayout()
+
+        # Only worth a selector when AUDIO_ZONES defines more than one zone
+        self.zone_dropdown = QComboBox()
+        self.zone_dropdown.addItems([zone.name for zone in self.zone_manager.zones])
+        self.zone_dropdown.currentIndexChanged.connect(self.select_zone)
+        self.zone_dropdown.setVisible(len(self.zone_manager.zones) > 1)
+        layout.addWidget(self.zone_dropdown)
+
+        self.zone_stats_label = QLabel()
+        layout.addWidget(self.zone_stats_label, 1)
+
+        self.zone_stats_timer = QTimer(self)
+        self.zone_stats_timer.timeout.connect(self.update_zone_stats)
+        self.zone_stats_timer.start(1000)
+
+        self.main_layout.addLayout(layout)
+
+    def select_zone(self, index):
+        """Show and edit another zone: sliders, bypass state, preset name and displays follow it."""
+        self.zone.attach_display(None, None)
+        self.zone = self.zone_manager.zones[index]
+        self.zone.attach_display(self.spectrum_analyzer, self.response_curve)
+
+        self.show_gains(self.zone.gains())
+
+        self.bypass_button.setText("Equalizer: Enabled" if self.zone.enabled else "Equalizer: Bypassed")
+        self.preset_dropdown.blockSignals(True)
+        self.preset_dropdown.setCurrentText(self.zone.preset)
+        self.preset_dropdown.blockSignals(False)
+        self.update_zone_stats()
+
+    def update_zone_stats(self):
+        """Show the selected zone's processing load and deadline misses."""
+        stats = self.zone.stats()
+        text = (
+            f"{stats['zone']}: {stats['sample_rate']} Hz, load {stats['mean_load'] * 100:.1f}% "
+            f"(max {stats['max_ms']:.1f} ms), {stats['blocksize']} frames, "
+            f"{stats['overruns']} overruns, {stats['xruns']} xruns"
+        )
+        loudness = stats["loudness"]
+        if loudness["eq_short_term"] is not None:
+            text += f", {loudness['eq_short_term']:.1f} LUFS ({loudness['compensation_db']:+.1f} dB)"
+        if stats["correction"]:
+            text += f", correction {stats['correction']}"
+        self.zone_stats_label.setText(text)
+
     def setup_tray_icon(self):
         self.tray_icon = QSystemTrayIcon(QIcon("icon.png"), self)
         self.tray_icon.setToolTip("Adaptive Audio Equalizer")
@@ -187,6 +293,15 @@ class EqualizerWindow(QWidget):
         toggle_action.triggered.connect(self.toggle_bypass)
         tray_menu.addAction(toggle_action)
 
+        # Diagnostics for stutters: each writes a report into DIAGNOSTICS_DIR when unticked
+        diagnostics_menu = tray_menu.addMenu("Diagnostics")
+        self.diagnostics_actions = {}
+        for kind, label in zip(KINDS, ("Profile Threads", "Audio Callback Timing", "Memory Snapshots")):
+            action = QAction(label, self, checkable=True)
+            action.triggered.connect(lambda checked, kind=kind: self.toggle_diagnostics(kind))
+            diagnostics_menu.addAction(action)
+            self.diagnostics_actions[kind] = action
+
         quit_action = QAction("Quit", self)
         quit_action.triggered.connect(self.close)
         tray_menu.addAction(quit_action)
@@ -194,20 +309,59 @@ class EqualizerWindow(QWidget):
         self.tray_icon.setContextMenu(tray_menu)
         self.tray_icon.show()
 
+    def init_zones(self):
+        """
+        Create the audio zones. Without AUDIO_ZONES there is a single zone on
+        AUDIO_INPUT_DEVICE / AUDIO_OUTPUT_DEVICE.
+        """
+        # AUDIO_PROCESS=1 runs the zones in a separate process so GUI work cannot stall the audio
+        self.audio_process = os.getenv("AUDIO_PROCESS", "0") == "1"
+        manager_class = AudioProcess if self.audio_process else ZoneManager
+        self.zone_manager = manager_class(
+            self.bands,
+            zone_specs_from_env(),
+            backend_name=os.getenv("AUDIO_BACKEND", "pyaudio"),
+            engine_name=os.getenv("EQ_ENGINE", "cascade"),
+        )
+        self.zone = self.zone_manager.zones[0]
+
     def init_audio(self):
-        """Initialize the audio stream."""
-        self.p = pyaudio.PyAudio()
-        print("Available Audio Devices:")
-        for i in range(self.p.get_device_count()):
-            device_info = self.p.get_device_info_by_index(i)
-            print(f"Index {i}: {device_info['name']}")
-        self.start_stream()
+        """Initialize the audio streams."""
+        if not self.audio_process:  # The audio process lists them itself
+            print("Available Audio Devices:")
+            for device in self.zone_manager.backend.list_devices():
+                print(f"Index {device['index']}: {device['name']}")
+        self.zone_manager.start()
+        self.spectrum_analyzer.start()
+        self.prefetcher.start()
+
+        # AUDIO_CAPTURE records callback traffic for offline replay
+        if os.getenv("AUDIO_CAPTURE"):
+            self.zone_manager.start_capture(os.getenv("AUDIO_CAPTURE"))
+
+        # Reopen the streams in-process when devices come and go
+        self.device_monitor = DeviceMonitor(self.zone_manager, self.zone_manager.reopen)
+        self.device_monitor.start()
+        # AUDIO_BLOCKSIZE=auto sizes each zone's blocks from its deadline misses (inside the audio process if any)
+        self.blocksize_controller = None if self.audio_process else blocksize_controller_from_env(self.zone_manager)
+        # DIAGNOSTICS=profile,timing,memory starts diagnostics right away (after the streams, so timing sees them)
+        self.diagnostics = diagnostics_from_env(self.zone_manager)
+        for kind, action in self.diagnostics_actions.items():
+            action.setChecked(self.diagnostics.is_running(kind))
+
+        if self.spectrum_matcher is not None:
+            self.spectral_eq_timer = QTimer(self)
+            self.spectral_eq_timer.timeout.connect(self.update_spectral_eq)
+            self.spectral_eq_timer.start(int(self.spectrum_matcher.interval * 1000))
+
+        if self.now_playing_source.event_driven:
+            self.now_playing_source.start(self.track_changed.emit)
+            self.track_changed.emit()  # Show whatever already plays
 
     def update_preset_dropdown(self):
         """Update the dropdown menu with genre and custom presets."""
         self.preset_dropdown.clear()
-        self.preset_dropdown.addItem("Flat")  # Default Flat EQ
-        self.preset_dropdown.addItems(list(self.genre_presets.keys()) + list(self.custom_presets.keys()))
+        self.preset_dropdown.addItems(self.presets.names())  # Flat, then genre and custom presets
 
     def add_artist_genre_controls(self):
         layout = QHBoxLayout()
@@ -240,17 +394,23 @@ class EqualizerWindow(QWidget):
     def apply_preset(self):
         """Apply the selected preset to the sliders."""
         preset_name = self.preset_dropdown.currentText()
-        if preset_name == "Flat":
-            values = [0] * len(self.bands)  # Flat preset
-        elif preset_name in self.genre_presets:
-            values = self.genre_presets[preset_name]
-        elif preset_name in self.custom_presets:
-            values = self.custom_presets[preset_name]
-        else:
+        values = self.presets.get(preset_name)
+        if values is None:
             return  # No valid preset selected
 
-        for slider, value in zip(self.sliders, values):
+        self.zone.preset = preset_name
+        self.zone.set_gains(values)
+        self.show_gains(values)
+
+    def show_gains(self, gains):
+        """Move the sliders to `gains` without pushing every intermediate state into the engine."""
+        for slider, value in zip(self.sliders, gains):
+            slider.blockSignals(True)
             slider.setValue(value)
+            slider.blockSignals(False)
+        self.update_slider_label()
+        self.response_curve.set_gains(gains)
+        self.response_curve_widget.update()
 
     def reset_sliders(self):
         """Reset all sliders to 0 dB."""
@@ -259,40 +419,97 @@ class EqualizerWindow(QWidget):
 
     def update_now_playing(self):
         """Fetch and update the 'Now Playing' label with genre detection."""
-        song_info = self.spotify.get_current_song()
-        if song_info:
-            artist_name = song_info.split(" by ")[1]
+        self.boundary_poll_pending = False
+        track = self.now_playing_source.get_current_track()
+        fetched_at = time.perf_counter()
+        if track:
+            song_info = f"{track['name']} by {track['artist']}"
+            artist_name = track["artist"]
 
             # Autofill the artist input field
             self.artist_input.setText(artist_name)
 
-            # Check if the artist has an assigned genre
-            if artist_name in self.artist_genres:
-                assigned_genre = self.artist_genres[artist_name]
-                self.now_playing_label.setText(f"Currently streaming: {song_info} ({assigned_genre})")
-                if self.auto_eq_enabled:
-                    self.apply_preset_by_name(assigned_genre)
+            track_changed = track["id"] != self.current_track_id
+            # The first track seen after startup has no boundary worth measuring
+            measure = track_changed and self.current_track_id is not None
+            # Assigned or prefetched genre first; a miss is predicted from Spotify's sub-genres on the
+            # prefetcher's thread, so the network calls never block the GUI, and applied once it arrives
+            self.pending_track = None
+            genre, prefetched = self.prefetcher.genre_for(artist_name, self.genre_resolved.emit)
+            if prefetched:
+                self.show_genre(track, genre, track_changed, measure, fetched_at, prefetched)
             else:
-                sub_genres = self.spotify.get_genres_for_song(artist_name)
-                if sub_genres:
-                    broad_genre = self.spotify.predict_broad_genre(sub_genres)
-                    self.now_playing_label.setText(f"Currently streaming: {song_info} ({broad_genre})")
-                    if self.auto_eq_enabled:
-                        self.apply_preset_by_name(broad_genre)
-                else:
-                    self.now_playing_label.setText(f"Currently streaming: {song_info} (Genre: Unknown)")
-                    self.genre_input.clear()  # Clear the genre field for a new assignment
+                self.pending_track = (track, fetched_at, measure)
+                if track_changed:  # Later polls keep the label until the lookup is back
+                    self.now_playing_label.setText(f"Currently streaming: {song_info} (Genre: resolving...)")
+
+            if track_changed:
+                self.current_track_id = track["id"]
+                self.prefetcher.wake()  # The queue has moved on
+
+            # Poll again just after the track should end instead of up to a second later
+            remaining = track["duration_ms"] - track["progress_ms"]
+            if 0 < remaining < 1000 and not self.boundary_poll_pending and not self.now_playing_source.event_driven:
+                self.boundary_poll_pending = True
+                QTimer.singleShot(remaining + 50, self.update_now_playing)
         else:
+            self.pending_track = None
             self.now_playing_label.setText("Currently streaming: Not Available")
             self.artist_input.clear()
             self.genre_input.clear()
 
 
 
+    def show_genre(self, track, genre, track_changed, measure, fetched_at, prefetched):
+        """Show the playing track's genre and apply its preset."""
+        song_info = f"{track['name']} by {track['artist']}"
+        if genre:
+            self.now_playing_label.setText(f"Currently streaming: {song_info} ({genre})")
+            # Spectrum matching moves the gains away from the preset, so only apply it on a genre change
+            # (or a track change while blending, as each artist has its own blend)
+            if self.auto_eq_enabled and (self.spectrum_matcher is None or self.zone.preset != genre
+                                         or (self.prefetcher.blend and track_changed)):
+                self.apply_preset_by_name(genre, self.prefetcher.gains_for(track["artist"], genre))
+                if measure:
+                    latency = self.prefetcher.record_switch(track, fetched_at, prefetched)
+                    print(f"EQ '{genre}' applied {latency * 1000:.0f} ms after track start "
+                          f"({'prefetched' if prefetched else 'resolved on change'})")
+        else:
+            self.now_playing_label.setText(f"Currently streaming: {song_info} (Genre: Unknown)")
+            self.genre_input.clear()  # Clear the genre field for a new assignment
+
+    def on_genre_resolved(self, artist_name, genre):
+        """Apply a genre the prefetcher resolved after a miss, unless the track has moved on since."""
+        pending = self.pending_track
+        if pending is None or pending[0]["artist"] != artist_name:
+            return
+        self.pending_track = None
+        track, fetched_at, measure = pending
+        # Treated as a track change, as the preset for this track has not been applied yet
+        self.show_genre(track, genre, True, measure, fetched_at, False)
+
+    def update_spectral_eq(self):
+        """Move every zone's gains a step towards its preset's target curve; sliders follow the shown zone."""
+        if not self.auto_eq_enabled:
+            return
+        for zone in self.zone_manager.zones:
+            gains = self.spectrum_matcher.update(zone, self.presets.get(zone.preset))
+            if gains is None:
+                continue
+            zone.set_gains(gains)
+            if zone is self.zone:
+                self.show_gains(gains)
+
+    def toggle_diagnostics(self, kind):
+        """Start or stop one diagnostics kind from the tray menu."""
+        self.diagnostics_actions[kind].setChecked(self.diagnostics.toggle(kind))
+
     def toggle_auto_eq(self):
         """Toggle the Auto EQ feature."""
         self.auto_eq_enabled = not self.auto_eq_enabled
         self.auto_eq_button.setText("Auto EQ: Enabled" if self.auto_eq_enabled else "Auto EQ: Disabled")
+        if self.auto_eq_enabled and self.now_playing_source.event_driven:
+            self.update_now_playing()  # Nothing polls, so apply the current track's preset now
 
     def save_custom_preset(self):
         """
@@ -306,7 +523,7 @@ class EqualizerWindow(QWidget):
         values = [slider.value() for slider in self.sliders]
 
         # Check if the selected preset is a predefined genre
-        if preset_name in self.genre_presets:
+        if preset_name in self.presets.genre_presets:
             # Ask the user if they want to overwrite the genre preset
             reply = QMessageBox.question(
                 self,
@@ -315,69 +532,26 @@ class EqualizerWindow(QWidget):
                 QMessageBox.Yes | QMessageBox.No,
             )
             if reply == QMessageBox.Yes:
-                self.genre_presets[preset_name] = values
+                self.presets.genre_presets[preset_name] = values
                 QMessageBox.information(self, "Success", f"Genre preset '{preset_name}' updated!")
             else:
                 return
 
         # Otherwise, save as a custom preset
         else:
-            self.custom_presets[preset_name] = values
-            self.save_custom_presets()
+            self.presets.custom_presets[preset_name] = values
+            self.presets.save_custom_presets()
             QMessageBox.information(self, "Success", f"Custom preset '{preset_name}' saved!")
 
         self.update_preset_dropdown()
 
-    def save_genre_presets(self):
-        """
-        Save updated genre presets to a file.
-        """
-        with open(get_resource_path("presets/genre_presets.pkl"), "wb") as file:
-            pickle.dump(self.genre_presets, file)
-
-    def get_genre_presets(self):
-        """
-        Return a dictionary of pre-defined genre presets or load from file if available.
-        """
-        try:
-            with open(get_resource_path("presets/genre_presets.pkl"), "rb") as file:
-                return pickle.load(file)
-        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
-            return {
-                "Pop": [2, 1, 0, 0, 2, 3, 2, 3, 2, 1],
-                "Rock": [4, 3, 2, 1, 0, 1, 0, -1, -2, -2],
-                "Classical": [0, 0, 1, 1, 2, 3, 2, 3, 2, 1],
-                "Jazz": [2, 3, 2, 1, 1, 2, 1, 1, 1, 0],
-                "Hip-Hop": [6, 4, 2, 1, 0, 2, 3, 4, 2, 1],
-                "Electronic": [6, 4, 3, 2, 0, 2, 4, 6, 5, 3],
-                "Acoustic": [1, 1, 2, 2, 3, 3, 2, 2, 1, 0],
-                "Metal": [5, 4, 3, 1, 1, 1, 0, -1, -2, -3],
-                "Dance": [5, 3, 2, 1, 0, 2, 4, 5, 3, 2],
-                "R&B": [4, 3, 2, 1, 1, 1, 2, 2, 1, 0],
-            }
-        
-    def get_default_genre_presets(self):
-        """Return the original default genre presets."""
-        return {
-            "Pop": [2, 1, 0, 0, 2, 3, 2, 3, 2, 1],
-            "Rock": [4, 3, 2, 1, 0, 1, 0, -1, -2, -2],
-            "Classical": [0, 0, 1, 1, 2, 3, 2, 3, 2, 1],
-            "Jazz": [2, 3, 2, 1, 1, 2, 1, 1, 1, 0],
-            "Hip-Hop": [6, 4, 2, 1, 0, 2, 3, 4, 2, 1],
-            "Electronic": [6, 4, 3, 2, 0, 2, 4, 6, 5, 3],
-            "Acoustic": [1, 1, 2, 2, 3, 3, 2, 2, 1, 0],
-            "Metal": [5, 4, 3, 1, 1, 1, 0, -1, -2, -3],
-            "Dance": [5, 3, 2, 1, 0, 2, 4, 5, 3, 2],
-            "R&B": [4, 3, 2, 1, 1, 1, 2, 2, 1, 0],
-        }
-
     def reset_selected_genre_preset(self):
         """
         Reset the selected genre preset to its original default value.
         """
         selected_preset = self.preset_dropdown.currentText()
 
-        if selected_preset not in self.default_genre_presets:
+        if selected_preset not in self.presets.default_genre_presets:
             QMessageBox.warning(
                 self, 
                 "Error", 
@@ -386,8 +560,8 @@ class EqualizerWindow(QWidget):
             return
 
         # Reset the selected preset
-        self.genre_presets[selected_preset] = self.default_genre_presets[selected_preset]
-        self.save_genre_presets()  # Save updated presets
+        self.presets.genre_presets[selected_preset] = self.presets.default_genre_presets[selected_preset]
+        self.presets.save_genre_presets()  # Save updated presets
         self.apply_preset_by_name(selected_preset)  # Apply the reset preset to sliders
         QMessageBox.information(
             self, 
@@ -408,29 +582,29 @@ class EqualizerWindow(QWidget):
         )
 
         if reply == QMessageBox.Yes:
-            self.save_genre_presets()  # Save presets before exiting
+            self.presets.save_genre_presets()  # Save presets before exiting
+            self.device_monitor.stop()
+            if self.blocksize_controller is not None:
+                self.blocksize_controller.stop()
+            self.prefetcher.stop()
+            self.now_playing_source.stop()
+            self.spotify.close()
+            self.diagnostics.stop_all()  # Write the reports of whatever still runs
+            self.zone_manager.close()
+            self.spectrum_analyzer.stop()
             event.accept()  # Accept the event to close the application
         else:
             event.ignore()  # Ignore the event to keep the application open
 
-    def save_custom_presets(self):
-        """Save custom presets to a file."""
-        with open(get_resource_path("presets/custom_presets.pkl"), "wb") as file:
-            pickle.dump(self.custom_presets, file)
-
-    def load_custom_presets(self):
-        with open(get_resource_path("presets/custom_presets.pkl"), "rb") as file:
-            return pickle.load(file)
-
     def delete_custom_preset(self):
         """Delete the selected custom preset."""
         preset_name = self.preset_dropdown.currentText()
-        if not preset_name or preset_name in self.genre_presets:
+        if not preset_name or preset_name in self.presets.genre_presets:
             QMessageBox.warning(self, "Error", "Cannot delete a genre preset or an invalid preset.")
             return
-        if preset_name in self.custom_presets:
-            del self.custom_presets[preset_name]
-            self.save_custom_presets()
+        if preset_name in self.presets.custom_presets:
+            del self.presets.custom_presets[preset_name]
+            self.presets.save_custom_presets()
             self.update_preset_dropdown()
             QMessageBox.information(self, "Success", f"Custom preset '{preset_name}' deleted!")
 
@@ -440,23 +614,25 @@ class EqualizerWindow(QWidget):
             self.slider_labels[i].setText(f"{slider.value()} dB")
 
     def toggle_bypass(self):
-        """Toggle the equalizer bypass mode."""
-        self.equalizer_enabled = not self.equalizer_enabled
-        self.bypass_button.setText("Equalizer: Enabled" if self.equalizer_enabled else "Equalizer: Bypassed")
-
-    def apply_preset_by_name(self, preset_name):
-        """Apply a preset by its name and update sliders."""
-        if preset_name not in self.genre_presets and preset_name not in self.custom_presets:
-            QMessageBox.warning(self, "Error", f"No preset found for: {preset_name}")
-            return
-
-        if preset_name in self.genre_presets:
-            values = self.genre_presets[preset_name]
-        else:
-            values = self.custom_presets[preset_name]
+        """Toggle bypass mode for the selected zone."""
+        self.zone.enabled = not self.zone.enabled
+        self.bypass_button.setText("Equalizer: Enabled" if self.zone.enabled else "Equalizer: Bypassed")
+
+    def apply_preset_by_name(self, preset_name, values=None):
+        """Apply a preset by its name (or `values` blended around it) and update sliders."""
+        if values is None:
+            if preset_name not in self.presets.genre_presets and preset_name not in self.presets.custom_presets:
+                QMessageBox.warning(self, "Error", f"No preset found for: {preset_name}")
+                return
+            if preset_name in self.presets.genre_presets:
+                values = self.presets.genre_presets[preset_name]
+            else:
+                values = self.presets.custom_presets[preset_name]
 
-        for slider, value in zip(self.sliders, values):
-            slider.setValue(value)
+        # One engine update with the (usually prefetched) settings, then the sliders follow
+        self.zone.preset = preset_name
+        self.zone.set_gains(values)
+        self.show_gains(values)
 
         self.preset_dropdown.blockSignals(True)
         self.preset_dropdown.setCurrentText(preset_name)
@@ -464,203 +640,32 @@ class EqualizerWindow(QWidget):
 
 
 
-    def audio_callback(self, in_data, frame_count, time_info, status):
-        """Process audio data in real-time."""
-        # Convert audio data to numpy array and reshape for stereo
-        audio_data = np.frombuffer(in_data, dtype=np.int16).reshape(-1, 2)  # Stereo
-
-        # Check if all gains are zero or if bypass mode is enabled
-        if not self.equalizer_enabled or all(slider.value() == 0 for slider in self.sliders):
-            return (in_data, pyaudio.paContinue)  # Bypass the processing
-
-        # Split into left and right channels
-        left_channel = audio_data[:, 0]
-        right_channel = audio_data[:, 1]
-
-        # Process each channel independently
-        processed_left = self.apply_equalizer_to_audio(left_channel)
-        processed_right = self.apply_equalizer_to_audio(right_channel)
-
-        # Combine back into stereo
-        processed_data = np.column_stack((processed_left, processed_right)).flatten()
-
-        # Convert processed data back to bytes and return
-        return (processed_data.tobytes(), pyaudio.paContinue)
-
-    def start_stream(self):
-        """Initialize audio stream with dynamic output device detection."""
-        p = pyaudio.PyAudio()
-
-        # Fixed input device index
-        input_device_index = None  # Ensure this is correct for your setup
-        input_keywords = ["CABLE Output - TEST"]
-
-        for i in range(p.get_device_count()):
-            device_info = p.get_device_info_by_index(i)
-            device_name = device_info['name']
-            for keyword in input_keywords:
-                if keyword.lower() in device_name.lower():
-                    input_device_index = i
-                    print(f"Selected Input Device: Index {i}: {device_name}")
-                    break
-            if input_device_index is not None:
-                break
-
-        # Automatically detect output device
-        output_device_index = None
-        output_keywords = ["Headphones", "Speakers"]  # Add keywords for preferred devices
-
-        for i in range(p.get_device_count()):
-            device_info = p.get_device_info_by_index(i)
-            device_name = device_info['name']
-            for keyword in output_keywords:
-                if keyword.lower() in device_name.lower():
-                    output_device_index = i
-                    print(f"Selected Output Device: Index {i}: {device_name}")
-                    break
-            if output_device_index is not None:
-                break
-
-        if output_device_index is None:
-            raise ValueError("No suitable output device found.")
-
-        # Open the audio stream
-        self.stream = p.open(
-            format=pyaudio.paInt16,
-            channels=2,  # Stereo audio
-            rate=44100,  # Common sample rate for audio
-            input=True,
-            output=True,
-            input_device_index=input_device_index,  # Fixed input device
-            output_device_index=output_device_index,  # Detected output device
-            frames_per_buffer=1024,
-            stream_callback=self.audio_callback
-        )
-
-    def confirm_restart(self):
-        """
-        Show a confirmation dialog to restart the application.
-        """
-        reply = QMessageBox.question(
-            self,
-            "Confirm Restart",
-            "Are you sure you want to restart the application? This will refresh the device list.",
-            QMessageBox.Yes | QMessageBox.No,
-            QMessageBox.No  # Default to No
-        )
-
-        if reply == QMessageBox.Yes:
-            self.restart_script()  # Restart the application
-
-    def restart_script(self):
-        """
-        Restart the script to force reinitialization of PyAudio.
-        """
-        python = sys.executable  # Path to the Python interpreter
-        os.execv(python, [python] + sys.argv)  # Restart the script with the same arguments
+    def refresh_devices(self):
+        """Rescan devices and reopen the streams without blocking the GUI."""
+        threading.Thread(target=self.zone_manager.reopen, daemon=True).start()
 
-    def peaking_eq(self, f0, Q, gain_db, sample_rate):
-        """
-        Design a peaking equalizer biquad filter and return as second-order sections (SOS).
-        """
-        # Convert gain from dB to linear amplitude
-        A = 10 ** (gain_db / 40)
-        # Calculate normalized frequency
-        omega = 2 * np.pi * f0 / sample_rate
-        # Bandwidth control
-        alpha = np.sin(omega) / (2 * Q)
-
-        # Filter coefficients
-        b0 = 1 + alpha * A
-        b1 = -2 * np.cos(omega)
-        b2 = 1 - alpha * A
-        a0 = 1 + alpha / A
-        a1 = -2 * np.cos(omega)
-        a2 = 1 - alpha / A
-
-        # Normalize coefficients
-        b = [b0 / a0, b1 / a0, b2 / a0]
-        a = [1.0, a1 / a0, a2 / a0]
-
-        # Combine into second-order sections (SOS) format
-        sos = np.hstack([b, a])
-        return np.array([sos])
-
-    def apply_equalizer_to_audio(self, audio_data):
-        """
-        Spotify-style equalizer using peaking EQ filters in SOS format, with gain compensation.
-        """
-        # Sanitize and validate input
-        audio_data = np.nan_to_num(audio_data, nan=0.0, posinf=0.0, neginf=0.0)
-        if len(audio_data) == 0 or np.max(np.abs(audio_data)) == 0:
-            return np.zeros_like(audio_data).astype(np.int16)
-
-        # Calculate RMS and handle silence
-        rms = np.sqrt(np.mean(audio_data**2))
-        if rms < 0.01:  # Treat near-silent signals as silence
-            return audio_data.astype(np.int16)
-
-        # Initialize parameters
-        bands = self.bands  # Center frequencies for bands
-        gains = [slider.value() for slider in self.sliders]  # Gains in dB
-        sample_rate = 44100
-        processed_audio = np.zeros_like(audio_data, dtype=np.float32)
-
-        # Accumulate energy normalization factor
-        total_gain = 0.0
-        gain_factors = []
-
-        for i, gain in enumerate(gains):
-            if gain == 0:  # Skip bands with no adjustment
-                continue
+    def load_correction(self):
+        """Fit a measured response file (against CORRECTION_TARGET) and apply it to the selected zone."""
+        path, _ = QFileDialog.getOpenFileName(self, "Load Frequency Response", "",
+                                              "Frequency response (*.csv *.txt);;All files (*)")
+        if not path:
+            return
+        zone = self.zone
 
+        def fit():
             try:
-                # Use peaking EQ filter
-                f0 = bands[i]
-                Q = 1.0  # Standard Q for smooth filtering
-                sos = self.peaking_eq(f0, Q, gain, sample_rate)  # Get SOS array
-
-                # Apply the filter
-                band_audio = sosfilt(sos, audio_data)
-
-                # Convert gain from dB to linear scale and track total gain
-                gain_factor = 10 ** (gain / 20)
-                processed_audio += band_audio * gain_factor
-                gain_factors.append(gain_factor)
-                total_gain += gain_factor
-            except ValueError as e:
-                print(f"Filter design failed for band {bands[i]} Hz: {e}")
-
-        # Normalize by the total applied gain to prevent overall volume increase
-        if total_gain > 0:
-            processed_audio /= total_gain
-
-        # Normalize processed audio to prevent clipping
-        max_val = np.max(np.abs(processed_audio))
-        if max_val > 32767:
-            processed_audio = (processed_audio / max_val) * 32767
-
-        # Clip the final output to the int16 range
-        return np.clip(processed_audio, -32768, 32767).astype(np.int16)
+                zone.set_correction(fit_profile(path, os.getenv("CORRECTION_TARGET") or None,
+                                                int(os.getenv("CORRECTION_BANDS", "10"))))
+            except (OSError, ValueError) as e:
+                print(f"Error loading correction {path}: {e}")
+
+        threading.Thread(target=fit, daemon=True).start()
 
     # def refresh_spotify_login(self):
     #     """Refresh the Spotify login."""
     #     self.spotify.refresh_login()
     #     QMessageBox.information(self, "Refresh Login", "Spotify login refreshed successfully.")
 
-    def load_artist_genres(self):
-        """Load the artist-genre mapping from a file."""
-        try:
-            with open(get_resource_path("artist_genres.pkl"), "rb") as file:
-                return pickle.load(file)
-        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
-            return {}
-
-    def save_artist_genres(self):
-        """Save the artist-genre mapping to a file."""
-        with open(get_resource_path("artist_genres.pkl"), "wb") as file:
-            pickle.dump(self.artist_genres, file)
-    
     def assign_genre_to_artist(self):
         """Assign a genre to an artist and validate before proceeding."""
         artist = self.artist_input.text().strip()
@@ -671,13 +676,15 @@ class EqualizerWindow(QWidget):
             return  # Exit early if inputs are invalid
 
         # Check if the genre preset exists before assigning
-        if genre not in self.genre_presets and genre not in self.custom_presets:
+        if genre not in self.presets.genre_presets and genre not in self.presets.custom_presets:
             QMessageBox.warning(self, "Error", f"Preset '{genre}' does not exist.")
             return  # Exit early if the genre preset is invalid
 
         # Assign the genre to the artist
-        self.artist_genres[artist] = genre
-        self.save_artist_genres()
+        self.presets.artist_genres[artist] = genre
+        self.presets.save_artist_genres()
+        # Let the classifier learn from it in the background
+        self.spotify.learn_genre(artist, genre)
 
         # Clear fields after assigning
         self.artist_input.clear()
@@ -695,9 +702,9 @@ class EqualizerWindow(QWidget):
             QMessageBox.warning(self, "Error", "No artist selected to reset.")
             return
 
-        if artist in self.artist_genres:
-            del self.artist_genres[artist]
-            self.save_artist_genres()
+        if artist in self.presets.artist_genres:
+            del self.presets.artist_genres[artist]
+            self.presets.save_artist_genres()
             QMessageBox.information(self, "Success", f"Reset genre assignment for artist '{artist}'.")
         else:
             QMessageBox.warning(self, "Error", f"No genre assignment found for artist '{artist}'.")
@@ -0,0 +1,152 @@
+import numpy as np
+from scipy.ndimage import maximum_filter1d
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import firwin
+
+
+class Limiter:
+    """
+    Streaming look-ahead peak limiter.
+
+    The audio is delayed by the look-ahead time so gain reduction can start
+    before a peak arrives. Per block, the envelope is computed without a
+    Python-level sample loop:
+
+    1. required reduction per sample (optionally from a 4x oversampled
+       true-peak detector),
+    2. a sliding maximum over the look-ahead window,
+    3. exponential release via a cumulative maximum in the log domain,
+    4. a moving-average attack ramp that never undershoots the window minimum.
+
+    All history needed by those steps is carried across calls.
+    """
+
+    OVERSAMPLING = 4
+    TAPS_PER_PHASE = 12
+
+    def __init__(self, sample_rate=44100, channels=2, ceiling_db=-1.0, lookahead_ms=5.0,
+                 attack_ms=2.0, release_ms=100.0, true_peak=True, full_scale=32767.0):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.full_scale = full_scale
+        self.ceiling = full_scale * 10 ** (ceiling_db / 20)
+        self.true_peak = true_peak
+        self.configure(lookahead_ms, attack_ms, release_ms)
+
+    def set_sample_rate(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.configure(self.lookahead_ms, self.attack_ms, self.release_ms)
+
+    def configure(self, lookahead_ms, attack_ms, release_ms):
+        """Set timing parameters and reset the internal state."""
+        self.lookahead_ms = lookahead_ms
+        self.attack_ms = attack_ms
+        self.release_ms = release_ms
+        self.lookahead = max(1, int(round(lookahead_ms * self.sample_rate / 1000)))
+        # The attack ramp must fit inside the look-ahead window to stay ahead of the peak
+        self.attack = min(max(1, int(round(attack_ms * self.sample_rate / 1000))), self.lookahead + 1)
+        self.release_coeff_log = -1.0 / max(release_ms * self.sample_rate / 1000, 1.0)
+
+        if self.true_peak:
+            ratio = self.OVERSAMPLING
+            taps = firwin(ratio * self.TAPS_PER_PHASE, 1.0 / ratio) * ratio
+            # Polyphase interpolator, one row per phase, reversed for use on sliding windows
+            self.phases = np.stack([taps[p::ratio] for p in range(ratio)])[:, ::-1].T.copy()
+            # Interpolator group delay in input samples, rounded up
+            self.detector_delay = int(np.ceil((len(taps) - 1) / (2 * ratio)))
+        else:
+            self.detector_delay = 0
+
+        self.window = self.lookahead + 1 + self.detector_delay
+        self.delay = self.lookahead + self.detector_delay
+        self.reset()
+
+    def reset(self):
+        self.delay_buffer = np.zeros((self.delay, self.channels))
+        self.reduction_history = np.zeros(self.window - 1)
+        self.gain_history = np.ones(self.attack - 1)
+        self.release_db = 0.0
+        if self.true_peak:
+            self.detector_history = np.zeros((self.TAPS_PER_PHASE - 1, self.channels))
+
+    def snapshot(self):
+        state = {"delay_buffer": self.delay_buffer.copy(), "reduction_history": self.reduction_history.copy(),
+                 "gain_history": self.gain_history.copy(), "release_db": self.release_db}
+        if self.true_peak:
+            state["detector_history"] = self.detector_history.copy()
+        return state
+
+    def restore(self, state):
+        for name, value in state.items():
+            setattr(self, name, value.copy() if isinstance(value, np.ndarray) else value)
+
+    def detect(self, block):
+        """Per-sample peak across channels, including inter-sample peaks when enabled."""
+        peak = np.max(np.abs(block), axis=1)
+        if self.true_peak:
+            extended = np.concatenate((self.detector_history, block))
+            self.detector_history = extended[len(block):]
+            # (frames, channels, taps) @ (taps, phases): all interpolated phases in one product
+            interpolated = sliding_window_view(extended, self.TAPS_PER_PHASE, axis=0) @ self.phases
+            np.maximum(peak, np.max(np.abs(interpolated), axis=(1, 2)), out=peak)
+        return peak
+
+    def required_db(self, peak):
+        """Gain reduction in dB needed to bring each sample down to the ceiling."""
+        required = 20 * np.log10(np.maximum(peak, 1e-12) / self.ceiling)
+        return np.maximum(required, 0.0, out=required)
+
+    def gain_curve(self, peak):
+        """Turn a detector signal into the smoothed per-sample gain."""
+        frames = len(peak)
+        required = self.required_db(peak)
+
+        # Hold each requirement across the look-ahead window
+        extended = np.concatenate((self.reduction_history, required))
+        held = maximum_filter1d(extended, self.window, origin=(self.window - 1) // 2)[self.window - 1:]
+        self.reduction_history = extended[-(self.window - 1):]
+
+        # Release: r[n] = max(held[n], r[n-1] * c), solved as a cumulative max of logs
+        k = np.arange(frames)
+        log_held = np.log(np.maximum(held, 1e-9)) - k * self.release_coeff_log
+        start = np.log(max(self.release_db, 1e-9)) + self.release_coeff_log
+        released = np.exp(np.maximum(np.maximum.accumulate(log_held), start) + k * self.release_coeff_log)
+        released[released < 1e-6] = 0.0
+        self.release_db = released[-1]
+
+        gain = 10 ** (-released / 20)
+
+        # Attack: moving average over the last `attack` gains
+        if self.attack > 1:
+            extended = np.concatenate((self.gain_history, gain))
+            sums = np.cumsum(np.concatenate(([0.0], extended)))
+            self.gain_history = extended[-(self.attack - 1):]
+            gain = (sums[self.attack:] - sums[:-self.attack]) / self.attack
+        return gain
+
+    def process(self, block):
+        """Limit a (frames, channels) block; output is delayed by the look-ahead time."""
+        frames = len(block)
+        gain = self.gain_curve(self.detect(block))
+        delayed = np.concatenate((self.delay_buffer, block))
+        self.delay_buffer = delayed[frames:]
+        return delayed[:frames] * gain[:, None]
+
+    def bypass(self, block):
+        """
+        Pass a block through the look-ahead delay at unity gain. The delay stays
+        what it is while limiting and the detector keeps up, so limiting can
+        resume on the next process() call without a jump or stale audio.
+        """
+        frames = len(block)
+        extended = np.concatenate((self.reduction_history, self.required_db(self.detect(block))))
+        self.reduction_history = extended[-(self.window - 1):]
+        self.gain_history[:] = 1.0  # Resume from unity, ramping into any reduction ahead
+        self.release_db = 0.0
+        delayed = np.concatenate((self.delay_buffer, block))
+        self.delay_buffer = delayed[frames:]
+        return delayed[:frames]
+
+    def latency(self):
+        """Processing delay in samples."""
+        return self.delay
@@ -0,0 +1,266 @@
+"""
+EBU R128 / ITU-R BS.1770 loudness metering as a streaming stage, plus
+automatic loudness matching between EQ settings.
+
+Measure a WAV file offline with:
+    python loudness.py song.wav
+"""
+import sys
+from collections import OrderedDict
+import numpy as np
+from scipy.signal import sosfilt
+
+
+def k_weighting_sos(sample_rate):
+    """BS.1770 K-weighting (high shelf + RLB high-pass) as two SOS rows for any sample rate."""
+    # Shelf: matches the BS.1770 48 kHz coefficients exactly and stays correct at other rates
+    f0, gain_db, Q = 1681.974450955533, 3.999843853973347, 0.7071752369554196
+    K = np.tan(np.pi * f0 / sample_rate)
+    Vh = 10 ** (gain_db / 20)
+    Vb = Vh ** 0.4996667741545416
+    a0 = 1 + K / Q + K * K
+    shelf = [(Vh + Vb * K / Q + K * K) / a0, 2 * (K * K - Vh) / a0, (Vh - Vb * K / Q + K * K) / a0,
+             1.0, 2 * (K * K - 1) / a0, (1 - K / Q + K * K) / a0]
+    # Revised low-frequency B-curve high-pass
+    f0, Q = 38.13547087602444, 0.5003270373238773
+    K = np.tan(np.pi * f0 / sample_rate)
+    a0 = 1 + K / Q + K * K
+    highpass = [1.0, -2.0, 1.0, 1.0, 2 * (K * K - 1) / a0, (1 - K / Q + K * K) / a0]
+    return np.array([shelf, highpass])
+
+
+def energy_to_lufs(energy):
+    return -0.691 + 10 * np.log10(np.maximum(energy, 1e-20))
+
+
+class LoudnessMeter:
+    """
+    Streaming momentary, short-term and integrated loudness.
+
+    Each block is K-weighted with filter state carried across calls and
+    reduced to 100 ms sub-block energies with one cumulative sum. Gating
+    blocks (400 ms, 75% overlap) are formed from four sub-blocks and added
+    to a 0.1 LU histogram of counts and energy sums, so the two-stage gated
+    integrated loudness is a fixed-size histogram query, independent of how
+    long the meter has been running.
+    """
+
+    HISTOGRAM_MIN = -70.0   # Absolute gate
+    HISTOGRAM_MAX = 10.0
+    HISTOGRAM_STEP = 0.1
+    RELATIVE_GATE = -10.0
+
+    def __init__(self, sample_rate=44100, channels=2):
+        self.channels = channels
+        # Surround channels would weigh 1.41; plain stereo/mono weigh 1.0
+        self.channel_weights = np.ones(channels)
+        bins = int(round((self.HISTOGRAM_MAX - self.HISTOGRAM_MIN) / self.HISTOGRAM_STEP))
+        self.histogram_counts = np.zeros(bins)
+        self.histogram_energy = np.zeros(bins)
+        self.set_sample_rate(sample_rate)
+
+    def set_sample_rate(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.sos = k_weighting_sos(sample_rate)
+        self.hop = int(round(sample_rate / 10))  # 100 ms sub-blocks
+        self.reset()
+
+    def reset(self):
+        self.zi = np.zeros((len(self.sos), 2, self.channels))
+        self.partial = 0.0   # Energy sum of the unfinished sub-block
+        self.fill = 0        # Samples in the unfinished sub-block
+        self.sub_blocks = np.zeros(30)  # Last 3 s of sub-block mean energies, oldest first
+        self.sub_block_count = 0
+        self.block_count = 0
+        self.histogram_counts[:] = 0.0
+        self.histogram_energy[:] = 0.0
+
+    def snapshot(self):
+        return {"zi": self.zi.copy(), "partial": self.partial, "fill": self.fill,
+                "sub_blocks": self.sub_blocks.copy(), "sub_block_count": self.sub_block_count,
+                "block_count": self.block_count, "histogram_counts": self.histogram_counts.copy(),
+                "histogram_energy": self.histogram_energy.copy()}
+
+    def restore(self, state):
+        for name, value in state.items():
+            setattr(self, name, value.copy() if isinstance(value, np.ndarray) else value)
+
+    def process(self, block):
+        """Meter a (frames, channels) block. Returns the number of new 400 ms gating blocks."""
+        weighted, self.zi = sosfilt(self.sos, block, axis=0, zi=self.zi)
+        if self.fill + len(weighted) < self.hop:
+            # Most callback blocks are shorter than a sub-block: just accumulate
+            self.partial += float((np.square(weighted) @ self.channel_weights).sum())
+            self.fill += len(weighted)
+            return 0
+        power = np.square(weighted) @ self.channel_weights
+        cumulative = np.cumsum(power)
+
+        # Indices of the last sample of each sub-block completed in this block
+        ends = np.arange(self.hop - self.fill - 1, len(power), self.hop)
+        sums = np.diff(cumulative[ends], prepend=0.0)
+        sums[0] += self.partial
+        self.partial = cumulative[-1] - cumulative[ends[-1]]
+        self.fill = len(power) - ends[-1] - 1
+        self.add_sub_blocks(sums / self.hop)
+        return self.new_blocks
+
+    def add_sub_blocks(self, energies):
+        count = len(energies)
+        history = np.concatenate((self.sub_blocks, energies))
+        self.sub_blocks = history[-30:]
+        self.sub_block_count += count
+
+        # Every sub-block from the fourth on completes a 400 ms gating block
+        first = max(0, 4 - (self.sub_block_count - count))
+        self.new_blocks = max(0, count - first)
+        if self.new_blocks == 0:
+            return
+        windows = np.lib.stride_tricks.sliding_window_view(history[-(self.new_blocks + 3):], 4)
+        block_energy = windows.mean(axis=1)
+        loudness = energy_to_lufs(block_energy)
+        gated = loudness >= self.HISTOGRAM_MIN
+        bins = np.minimum(((loudness[gated] - self.HISTOGRAM_MIN) / self.HISTOGRAM_STEP).astype(np.intp),
+                          len(self.histogram_counts) - 1)
+        np.add.at(self.histogram_counts, bins, 1.0)
+        np.add.at(self.histogram_energy, bins, block_energy[gated])
+        self.block_count += self.new_blocks
+
+    def momentary(self):
+        """Loudness of the last 400 ms in LUFS."""
+        available = min(self.sub_block_count, 4)
+        if available == 0:
+            return -np.inf
+        return float(energy_to_lufs(self.sub_blocks[-available:].mean()))
+
+    def short_term(self):
+        """Loudness of the last 3 s in LUFS."""
+        available = min(self.sub_block_count, 30)
+        if available == 0:
+            return -np.inf
+        return float(energy_to_lufs(self.sub_blocks[-available:].mean()))
+
+    def integrated(self):
+        """Gated integrated loudness since the last reset, in LUFS (-inf while everything is gated)."""
+        total = self.histogram_counts.sum()
+        if total == 0:
+            return -np.inf
+        relative = energy_to_lufs(self.histogram_energy.sum() / total) + self.RELATIVE_GATE
+        first = int(np.clip(np.ceil((relative - self.HISTOGRAM_MIN) / self.HISTOGRAM_STEP), 0,
+                            len(self.histogram_counts)))
+        counts = self.histogram_counts[first:].sum()
+        if counts == 0:
+            return -np.inf
+        return float(energy_to_lufs(self.histogram_energy[first:].sum() / counts))
+
+
+class LoudnessMatcher:
+    """
+    Keeps perceived loudness steady across EQ settings.
+
+    Meters the signal before and after the EQ, learns per EQ setting how much
+    the EQ changes loudness on the music actually playing (a running average
+    of the momentary difference over non-silent gating blocks), and applies
+    the opposite gain with a per-block ramp so changes never click. Only the
+    `max_settings` most recently used settings are remembered, since smooth
+    presets and spectrum matching produce a new setting on nearly every change.
+    """
+
+    def __init__(self, sample_rate=44100, channels=2, enabled=True, max_cut_db=12.0, max_boost_db=6.0,
+                 adapt=0.1, silence_lufs=-50.0, max_settings=256):
+        self.enabled = enabled  # When off, only meters
+        self.input_meter = LoudnessMeter(sample_rate, channels)
+        self.output_meter = LoudnessMeter(sample_rate, channels)
+        self.max_cut_db = max_cut_db
+        self.max_boost_db = max_boost_db
+        self.adapt = adapt
+        self.silence_lufs = silence_lufs
+        self.max_settings = max_settings
+        self.offsets = OrderedDict()  # EQ setting key (gains bytes) -> learned loudness change in LU, LRU order
+        self.gain = 1.0
+
+    def set_sample_rate(self, sample_rate):
+        self.input_meter.set_sample_rate(sample_rate)
+        self.output_meter.set_sample_rate(sample_rate)
+
+    def reset(self):
+        """Forget the meters' history and every learned setting, back at unity gain."""
+        self.input_meter.reset()
+        self.output_meter.reset()
+        self.offsets.clear()
+        self.gain = 1.0
+
+    def snapshot(self):
+        return {"input_meter": self.input_meter.snapshot(), "output_meter": self.output_meter.snapshot(),
+                "offsets": list(self.offsets.items()), "gain": self.gain}
+
+    def restore(self, state):
+        self.input_meter.restore(state["input_meter"])
+        self.output_meter.restore(state["output_meter"])
+        self.offsets = OrderedDict(state["offsets"])
+        self.gain = state["gain"]
+
+    def compensation_db(self, key):
+        offset = self.offsets.get(key, 0.0)
+        return float(np.clip(-offset, -self.max_cut_db, self.max_boost_db))
+
+    def process(self, dry, wet, key):
+        """Meter dry (pre-EQ) and wet (post-EQ) blocks and scale `wet` in place for setting `key`."""
+        self.input_meter.process(dry)
+        if self.output_meter.process(wet):
+            loudness_in = self.input_meter.momentary()
+            if loudness_in > self.silence_lufs:
+                difference = self.output_meter.momentary() - loudness_in
+                offset = self.offsets.get(key)
+                self.offsets[key] = difference if offset is None else offset + self.adapt * (difference - offset)
+                self.offsets.move_to_end(key)
+                if len(self.offsets) > self.max_settings:
+                    self.offsets.popitem(last=False)
+
+        if not self.enabled:
+            return wet
+        target = 10 ** (self.compensation_db(key) / 20)
+        if target == self.gain:
+            wet *= target
+        else:
+            wet *= np.linspace(self.gain, target, len(wet), endpoint=False)[:, None]
+            self.gain = target
+        return wet
+
+    def summary(self):
+        """Current readings in LUFS, with None while a meter has nothing above the gate (JSON-safe)."""
+        readings = {
+            "input_momentary": self.input_meter.momentary(),
+            "input_integrated": self.input_meter.integrated(),
+            "eq_momentary": self.output_meter.momentary(),
+            "eq_short_term": self.output_meter.short_term(),
+            "eq_integrated": self.output_meter.integrated(),
+        }
+        summary = {key: round(value, 1) if np.isfinite(value) else None for key, value in readings.items()}
+        summary["compensation_db"] = round(20 * float(np.log10(self.gain)), 1)
+        return summary
+
+
+def measure(signal, sample_rate):
+    """Integrated, maximum momentary and maximum short-term loudness of a whole (frames, channels) signal."""
+    meter = LoudnessMeter(sample_rate, signal.shape[1])
+    max_momentary = max_short_term = -np.inf
+    hop = meter.hop
+    for start in range(0, len(signal), hop):
+        meter.process(signal[start:start + hop])
+        max_momentary = max(max_momentary, meter.momentary())
+        if meter.sub_block_count >= 30:
+            max_short_term = max(max_short_term, meter.short_term())
+    return meter.integrated(), max_momentary, max_short_term
+
+
+if __name__ == "__main__":
+    from scipy.io import wavfile
+    for path in sys.argv[1:]:
+        rate, data = wavfile.read(path)
+        if data.dtype.kind in "iu":
+            data = data / float(np.iinfo(data.dtype).max)
+        data = np.asarray(data, dtype=np.float64).reshape(len(data), -1)
+        integrated, momentary, short_term = measure(data, rate)
+        print(f"{path}: integrated {integrated:.1f} LUFS, max momentary {momentary:.1f} LUFS, "
+              f"max short-term {short_term:.1f} LUFS")
@@ -1,5 +1,6 @@
 import sys
 import os
+import multiprocessing
 from PyQt5.QtWidgets import QApplication, QSplashScreen
 from PyQt5.QtGui import QPixmap
 from PyQt5.QtCore import Qt
@@ -26,6 +27,7 @@ class AnimatedSplashScreen(QSplashScreen):
         self.setPixmap(splash_pix)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Lets a frozen build start the AUDIO_PROCESS child
     app = QApplication(sys.argv)
 
     # Show splash screen with the image
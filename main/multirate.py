@@ -0,0 +1,110 @@
+"""
+Streaming polyphase half-band resampling stages (2:1 and 1:2) and an integer
+delay line, as used by the oversampled EQ engine (oversampling.py).
+"""
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from scipy.signal import firwin
+
+
+def halfband_taps(taps=31, beta=8.0):
+    """Kaiser-windowed half-band lowpass; every other tap around the center is zero."""
+    if taps % 4 != 3:
+        raise ValueError("Half-band filters need a length of the form 4m + 3.")
+    return firwin(taps, 0.5, window=("kaiser", beta))
+
+
+def fir_block(history, block, reversed_taps):
+    """
+    Stateful FIR on a (frames, channels) block as one matrix product over sliding windows.
+    Taps are given reversed (correlation order); returns (output, new_history).
+    """
+    extended = np.concatenate((history, block))
+    frames = len(block)
+    stride_frames, stride_channels = extended.strides
+    windows = as_strided(extended, shape=(frames, extended.shape[1], len(reversed_taps)),
+                         strides=(stride_frames, stride_channels, stride_frames), writeable=False)
+    return windows @ reversed_taps, extended[frames:]
+
+
+class DelayLine:
+    """Integer sample delay with state carried across blocks."""
+
+    def __init__(self, samples, channels):
+        self.buffer = np.zeros((samples, channels))
+
+    def process(self, block):
+        if len(self.buffer) == 0:
+            return block
+        extended = np.concatenate((self.buffer, block))
+        self.buffer = extended[len(block):]
+        return extended[:len(block)]
+
+    def reset(self):
+        self.buffer[:] = 0.0
+
+    def snapshot(self):
+        return self.buffer.copy()
+
+    def restore(self, state):
+        self.buffer = state.copy()
+
+
+class HalfbandDecimator:
+    """
+    Stateful 2:1 polyphase decimator; both branches run at the output rate.
+    In a half-band filter one polyphase branch is a single center tap, so it
+    reduces to a scaled delay.
+    """
+
+    def __init__(self, taps, channels):
+        center = len(taps) // 2
+        self.even = taps[0::2][::-1].copy()
+        self.even_history = np.zeros((len(self.even) - 1, channels))
+        self.center_gain = taps[center]
+        # The odd branch sees x[2j - 1], one extra sample of delay on the odd stream
+        self.odd_delay = DelayLine(center // 2 + 1, channels)
+
+    def process(self, block):
+        even, self.even_history = fir_block(self.even_history, block[0::2], self.even)
+        return even + self.odd_delay.process(block[1::2]) * self.center_gain
+
+    def reset(self):
+        self.even_history[:] = 0.0
+        self.odd_delay.reset()
+
+    def snapshot(self):
+        return {"even_history": self.even_history.copy(), "odd_delay": self.odd_delay.snapshot()}
+
+    def restore(self, state):
+        self.even_history = state["even_history"].copy()
+        self.odd_delay.restore(state["odd_delay"])
+
+
+class HalfbandInterpolator:
+    """Stateful 1:2 polyphase interpolator; both output phases are computed at the input rate."""
+
+    def __init__(self, taps, channels):
+        center = len(taps) // 2
+        self.even = 2 * taps[0::2][::-1]
+        self.even_history = np.zeros((len(self.even) - 1, channels))
+        self.center_gain = 2 * taps[center]
+        self.odd_delay = DelayLine(center // 2, channels)
+
+    def process(self, block):
+        even, self.even_history = fir_block(self.even_history, block, self.even)
+        output = np.empty((2 * len(block), block.shape[1]))
+        output[0::2] = even
+        output[1::2] = self.odd_delay.process(block) * self.center_gain
+        return output
+
+    def reset(self):
+        self.even_history[:] = 0.0
+        self.odd_delay.reset()
+
+    def snapshot(self):
+        return {"even_history": self.even_history.copy(), "odd_delay": self.odd_delay.snapshot()}
+
+    def restore(self, state):
+        self.even_history = state["even_history"].copy()
+        self.odd_delay.restore(state["odd_delay"])
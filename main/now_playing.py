@@ -0,0 +1,372 @@
+"""
+Now-playing sources: where the current track comes from.
+
+- spotify: the Spotify Web API, polled once a second (and again just after
+  the current track should end). Needs network access and a login.
+- mpris: local players on the Linux session bus (the Spotify desktop app,
+  VLC, browsers, ...). Track changes arrive as PropertiesChanged signals on a
+  thread that sleeps on the D-Bus socket, so it costs no CPU while nothing
+  plays and the EQ follows a track change within milliseconds. Needs jeepney.
+
+NOW_PLAYING in .env selects the source; MPRIS_PLAYER limits mpris to players
+whose bus name contains it (e.g. spotify). Genres are still looked up through
+the Spotify API either way.
+
+See what the mpris source sees, or publish a fake player to try it with:
+    python now_playing.py
+    python now_playing.py --fake-player
+"""
+import os
+import socket
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+MPRIS_PATH = "/org/mpris/MediaPlayer2"
+MPRIS_PREFIX = "org.mpris.MediaPlayer2."
+PLAYER_INTERFACE = "org.mpris.MediaPlayer2.Player"
+PROPERTIES_INTERFACE = "org.freedesktop.DBus.Properties"
+NO_TRACK = "/org/mpris/MediaPlayer2/TrackList/NoTrack"
+
+
+class NowPlayingSource(ABC):
+    """
+    Base class for now-playing sources. Tracks are dicts with id, name,
+    artist, progress_ms and duration_ms.
+
+    Event-driven sources call `on_change` (from their own thread) whenever
+    the track or playback state changes, so callers only ask for the track
+    then, plus once after start(); the others have to be polled. start()
+    never calls `on_change` itself.
+    """
+
+    name = None
+    event_driven = False
+
+    def start(self, on_change=None):
+        pass
+
+    def stop(self):
+        pass
+
+    @abstractmethod
+    def get_current_track(self):
+        """The current track, or None if nothing is playing."""
+
+
+def unwrap(value):
+    """Strip jeepney's (signature, value) variant wrappers, recursively."""
+    if isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], str):
+        value = value[1]
+    if isinstance(value, dict):
+        return {key: unwrap(item) for key, item in value.items()}
+    return value
+
+
+def track_from_metadata(metadata, position_us=0):
+    """Track dict from MPRIS metadata, or None without a title and artist."""
+    title = metadata.get("xesam:title")
+    artists = metadata.get("xesam:artist") or []
+    if isinstance(artists, str):
+        artists = [artists]
+    if not title or not artists:
+        return None
+    track_id = metadata.get("mpris:trackid")
+    if not track_id or track_id == NO_TRACK:
+        track_id = f"{artists[0]} - {title}"
+    return {
+        "id": str(track_id),
+        "name": title,
+        "artist": artists[0],
+        "progress_ms": max(int(position_us), 0) // 1000,
+        "duration_ms": int(metadata.get("mpris:length") or 0) // 1000,
+    }
+
+
+class MprisPlayer:
+    """What is known about one MPRIS player, kept up to date from its signals."""
+
+    def __init__(self, bus_name):
+        self.bus_name = bus_name
+        self.status = "Stopped"
+        self.metadata = {}
+        self.position_us = 0
+        self.position_at = time.perf_counter()  # When position_us was read
+        self.changed_at = 0.0  # Last status or track change, to pick the most recent player
+
+    def update(self, properties):
+        if "PlaybackStatus" in properties:
+            self.set_position(self.position(), properties["PlaybackStatus"])
+            self.changed_at = time.perf_counter()
+        if "Metadata" in properties:
+            if properties["Metadata"].get("mpris:trackid") != self.metadata.get("mpris:trackid"):
+                self.set_position(0)
+                self.changed_at = time.perf_counter()
+            self.metadata = properties["Metadata"]
+        if "Position" in properties:
+            self.set_position(properties["Position"])
+
+    def set_position(self, position_us, status=None):
+        self.position_us = position_us
+        self.position_at = time.perf_counter()
+        if status is not None:
+            self.status = status
+
+    def position(self):
+        """Position in microseconds, extrapolated while playing (MPRIS doesn't signal it)."""
+        if self.status != "Playing":
+            return self.position_us
+        return self.position_us + (time.perf_counter() - self.position_at) * 1e6
+
+    def track(self):
+        return track_from_metadata(self.metadata, self.position())
+
+
+class MprisSource(NowPlayingSource):
+    """
+    Now-playing from MPRIS players on the session bus.
+
+    One connection is owned by a worker thread that blocks on the socket
+    waiting for PropertiesChanged, Seeked and player (dis)appearance signals;
+    get_current_track only reads what the signals left behind, so it never
+    touches the bus. The playing player that changed last wins, then the
+    paused one that changed last.
+    """
+
+    name = "mpris"
+    event_driven = True
+
+    def __init__(self, player=None, bus="SESSION"):
+        from jeepney import MatchRule
+        from jeepney.io.blocking import open_dbus_connection
+        self.player_filter = player.lower() if player else None
+        self.connection = open_dbus_connection(bus=bus)
+        self.players = {}  # Unique bus name -> MprisPlayer
+        self.lock = threading.Lock()
+        self.on_change = None
+        self.running = False
+        self.worker = None
+        self.rules = [
+            MatchRule(type="signal", interface=PROPERTIES_INTERFACE, member="PropertiesChanged", path=MPRIS_PATH),
+            MatchRule(type="signal", interface=PLAYER_INTERFACE, member="Seeked", path=MPRIS_PATH),
+            MatchRule(type="signal", sender="org.freedesktop.DBus", interface="org.freedesktop.DBus",
+                      member="NameOwnerChanged"),
+        ]
+        self.rules[0].add_arg_condition(0, PLAYER_INTERFACE)
+        self.rules[2].add_arg_condition(0, MPRIS_PREFIX[:-1], "namespace")
+
+    def start(self, on_change=None):
+        if self.running:
+            return
+        self.on_change = on_change
+        self.running = True
+        self.messages = deque()
+        self.filters = [self.connection.filter(rule, queue=self.messages) for rule in self.rules]
+        for rule in self.rules:
+            self.connection.bus_proxy.AddMatch(rule)
+        for bus_name in self.connection.bus_proxy.ListNames()[0]:
+            if self.wanted(bus_name):
+                self.add_player(bus_name)
+        self.worker = threading.Thread(target=self.run, name="MprisSource", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        self.running = False
+        try:
+            # Wakes the worker from its blocking receive
+            self.connection.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        if self.worker is not None:
+            self.worker.join(timeout=2.0)
+            self.worker = None
+        self.connection.close()
+
+    def wanted(self, bus_name):
+        return bus_name.startswith(MPRIS_PREFIX) and (
+            self.player_filter is None or self.player_filter in bus_name[len(MPRIS_PREFIX):].lower())
+
+    def call(self, message):
+        """Method call from the worker thread (or before it starts); returns the reply body."""
+        from jeepney.wrappers import unwrap_msg
+        return unwrap_msg(self.connection.send_and_get_reply(message, timeout=1.0))
+
+    def add_player(self, bus_name, owner=None):
+        from jeepney import DBusAddress, Properties
+        try:
+            owner = owner or self.connection.bus_proxy.GetNameOwner(bus_name)[0]
+            address = DBusAddress(MPRIS_PATH, bus_name=bus_name, interface=PLAYER_INTERFACE)
+            properties = unwrap(self.call(Properties(address).get_all())[0])
+        except Exception as e:
+            print(f"Error reading MPRIS player {bus_name}: {e}")
+            return
+        player = MprisPlayer(bus_name)
+        player.update(properties)
+        player.changed_at = time.perf_counter() if player.status == "Playing" else 0.0
+        with self.lock:
+            self.players[owner] = player
+
+    def run(self):
+        from jeepney import HeaderFields
+        while self.running:
+            try:
+                message = self.connection.recv_until_filtered(self.messages)
+            except (OSError, ValueError, ConnectionError):
+                break  # Connection closed by stop() or the bus went away
+            try:
+                sender = message.header.fields.get(HeaderFields.sender)
+                member = message.header.fields.get(HeaderFields.member)
+                if member == "NameOwnerChanged":
+                    bus_name, old_owner, new_owner = message.body
+                    if not self.wanted(bus_name):
+                        continue
+                    with self.lock:
+                        self.players.pop(old_owner, None)
+                    if new_owner:
+                        self.add_player(bus_name, new_owner)
+                elif member == "Seeked":
+                    with self.lock:
+                        player = self.players.get(sender)
+                    if player is None:
+                        continue
+                    player.set_position(message.body[0])
+                else:
+                    with self.lock:
+                        player = self.players.get(sender)
+                    if player is None:
+                        continue
+                    player.update(unwrap(message.body[1]))
+                self.changed()
+            except Exception as e:
+                print(f"Error handling MPRIS signal: {e}")
+
+    def changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def current_player(self):
+        with self.lock:
+            players = list(self.players.values())
+        for status in ("Playing", "Paused"):
+            candidates = [player for player in players if player.status == status and player.track()]
+            if candidates:
+                return max(candidates, key=lambda player: player.changed_at)
+        return None
+
+    def get_current_track(self):
+        player = self.current_player()
+        return player.track() if player is not None else None
+
+
+class FakePlayer:
+    """
+    Minimal MPRIS player on its own bus connection, for trying and measuring
+    the mpris source without a real player. Serves the Player properties and
+    announces every play() with PropertiesChanged like a real player.
+    """
+
+    def __init__(self, name="autoeq_fake", bus="SESSION"):
+        from jeepney import MatchRule
+        from jeepney.io.blocking import open_dbus_connection
+        self.bus_name = MPRIS_PREFIX + name
+        self.connection = open_dbus_connection(bus=bus)
+        self.send_lock = threading.Lock()  # Replies come from the worker, signals from the caller
+        self.properties = {
+            "PlaybackStatus": ("s", "Stopped"),
+            "Metadata": ("a{sv}", {}),
+            "Position": ("x", 0),
+            "Rate": ("d", 1.0),
+            "CanControl": ("b", False),
+        }
+        self.requests = deque()
+        self.filter = self.connection.filter(MatchRule(type="method_call", path=MPRIS_PATH), queue=self.requests)
+        self.connection.bus_proxy.RequestName(self.bus_name)
+        self.running = True
+        self.worker = threading.Thread(target=self.run, name="FakePlayer", daemon=True)
+        self.worker.start()
+
+    def run(self):
+        from jeepney import HeaderFields, new_error, new_method_return
+        while self.running:
+            try:
+                message = self.connection.recv_until_filtered(self.requests)
+            except (OSError, ValueError, ConnectionError):
+                break
+            member = message.header.fields.get(HeaderFields.member)
+            if member == "GetAll":
+                reply = new_method_return(message, "a{sv}", (self.properties,))
+            elif member == "Get" and message.body[1] in self.properties:
+                reply = new_method_return(message, "v", (self.properties[message.body[1]],))
+            else:
+                reply = new_error(message, "org.freedesktop.DBus.Error.UnknownMethod")
+            with self.send_lock:
+                self.connection.send(reply)
+
+    def play(self, track_id, title, artist, length_s=180.0, status="Playing"):
+        """Switch to a track and announce it; returns the perf_counter time the signal was sent."""
+        from jeepney import DBusAddress, new_signal
+        metadata = {
+            "mpris:trackid": ("o", f"/org/autoeq/fake/{track_id}"),
+            "xesam:title": ("s", title),
+            "xesam:artist": ("as", [artist]),
+            "mpris:length": ("x", int(length_s * 1e6)),
+        }
+        self.properties.update(Metadata=("a{sv}", metadata), PlaybackStatus=("s", status), Position=("x", 0))
+        changed = {"Metadata": self.properties["Metadata"], "PlaybackStatus": self.properties["PlaybackStatus"]}
+        signal = new_signal(DBusAddress(MPRIS_PATH, interface=PROPERTIES_INTERFACE), "PropertiesChanged",
+                            "sa{sv}as", (PLAYER_INTERFACE, changed, []))
+        with self.send_lock:
+            sent_at = time.perf_counter()
+            self.connection.send(signal)
+        return sent_at
+
+    def close(self):
+        self.running = False
+        try:
+            self.connection.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.worker.join(timeout=2.0)
+        self.connection.close()
+
+
+def now_playing_source_from_env(spotify):
+    """The NOW_PLAYING source (spotify or mpris); falls back to `spotify` if MPRIS is unavailable."""
+    name = os.getenv("NOW_PLAYING", "spotify")
+    if name == "spotify":
+        return spotify
+    if name != "mpris":
+        raise ValueError(f"Unknown now-playing source: {name}")
+    try:
+        return MprisSource(os.getenv("MPRIS_PLAYER") or None)
+    except Exception as e:
+        print(f"MPRIS unavailable, polling Spotify instead: {e}")
+        return spotify
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--fake-player"]:
+        player = FakePlayer()
+        print(f"Publishing {player.bus_name}; switching tracks every 5 s (Ctrl+C to stop)")
+        tracks = [("Daft Punk", "One More Time"), ("Miles Davis", "So What"), ("Metallica", "One")]
+        try:
+            for i in range(sys.maxsize):
+                artist, title = tracks[i % len(tracks)]
+                player.play(i, title, artist)
+                print(f"Now playing {title} by {artist}")
+                time.sleep(5)
+        except KeyboardInterrupt:
+            player.close()
+    elif not sys.argv[1:]:
+        source = MprisSource(os.getenv("MPRIS_PLAYER") or None)
+        source.start(lambda: print(f"{time.strftime('%H:%M:%S')} {source.get_current_track()}"))
+        print(f"{time.strftime('%H:%M:%S')} {source.get_current_track()}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            source.stop()
+    else:
+        print(__doc__)
+        sys.exit(1)
@@ -0,0 +1,164 @@
+import gzip
+import json
+import os
+import pickle
+import queue
+import threading
+import time
+from collections import Counter
+import numpy as np
+
+
+class OnlineGenreModel:
+    """
+    Broad-genre classifier that keeps learning from manual genre assignments.
+
+    Sub-genre text is turned into hashed word n-gram features, so there is no
+    vocabulary to refit, and an SGD logistic model is updated with partial_fit
+    on a background thread: one update takes a few milliseconds instead of a
+    full retrain. The model starts from genre/dataset.json and is checkpointed
+    as a gzipped pickle after changes (at most every `checkpoint_interval`
+    seconds, and on stop) so it survives restarts.
+
+    Each taught sub-genre is also remembered with its label, so an assignment
+    takes effect at once for those sub-genres (see taught_genre) instead of
+    waiting for the classifier to be outvoted by the dataset.
+    """
+
+    ASSIGNMENT_WEIGHT = 5.0  # A user's explicit choice outweighs one dataset example
+    BOOTSTRAP_EPOCHS = 10
+
+    def __init__(self, dataset_path, checkpoint_path, n_features=2 ** 14, checkpoint_interval=60.0):
+        self.dataset_path = dataset_path
+        self.checkpoint_path = checkpoint_path
+        self.n_features = n_features
+        self.checkpoint_interval = checkpoint_interval
+        self.vectorizer = None
+        self.classifier = None
+        self.examples = []  # Learned (text, label) pairs, kept to rebuild when a new label appears
+        self.taught = {}  # Sub-genre -> label of its latest manual assignment
+        self.updates = 0
+        self.lock = threading.Lock()  # Guards the classifier between the worker and predict()
+        self.pending = queue.Queue()
+        self.dirty = False
+        self.last_checkpoint = time.monotonic()
+        self.worker = None
+
+    def load(self):
+        """Restore the last checkpoint, or train the starting model from the dataset."""
+        from sklearn.feature_extraction.text import HashingVectorizer
+        self.vectorizer = HashingVectorizer(n_features=self.n_features, ngram_range=(1, 2),
+                                            alternate_sign=False)
+        try:
+            with gzip.open(self.checkpoint_path, "rb") as file:
+                state = pickle.load(file)
+            self.classifier, self.examples, self.updates = state["classifier"], state["examples"], state["updates"]
+            self.taught = state.get("taught", {})  # Older checkpoints predate it
+        except (FileNotFoundError, EOFError, OSError, pickle.UnpicklingError, KeyError):
+            self.classifier = self.bootstrap(self.examples)
+
+    def bootstrap(self, extra_examples):
+        """Fit a new classifier on the dataset plus previously learned examples."""
+        from sklearn.linear_model import SGDClassifier
+        with open(self.dataset_path, "r") as file:
+            dataset = json.load(file)
+        texts = [sub_genre for sub_genres in dataset.values() for sub_genre in sub_genres]
+        labels = [genre for genre, sub_genres in dataset.items() for _ in sub_genres]
+        weights = [1.0] * len(texts)
+        for text, label in extra_examples:
+            texts.append(text)
+            labels.append(label)
+            weights.append(self.ASSIGNMENT_WEIGHT)
+        classes = np.array(sorted(set(labels)))
+        features = self.vectorizer.transform(texts)
+        labels = np.array(labels)
+        weights = np.array(weights)
+        classifier = SGDClassifier(loss="log_loss", alpha=1e-4, random_state=0)
+        order = np.random.default_rng(0)
+        for _ in range(self.BOOTSTRAP_EPOCHS):
+            shuffle = order.permutation(len(texts))
+            classifier.partial_fit(features[shuffle], labels[shuffle], classes=classes,
+                                   sample_weight=weights[shuffle])
+        return classifier
+
+    def start(self):
+        if self.worker is not None:
+            return
+        self.worker = threading.Thread(target=self.run, name="OnlineGenreModel", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        if self.worker is not None:
+            self.pending.put(None)
+            self.worker.join(timeout=5.0)
+            self.worker = None
+        if self.dirty:
+            self.checkpoint()
+
+    def learn(self, sub_genres, label):
+        """Queue one example; returns immediately."""
+        self.pending.put((list(sub_genres), label))
+
+    def run(self):
+        while True:
+            try:
+                item = self.pending.get(timeout=self.checkpoint_interval)
+            except queue.Empty:
+                item = False
+            if item is None:
+                return
+            if item:
+                try:
+                    self.update(*item)
+                except Exception as e:
+                    print(f"Error updating genre model: {e}")
+            if self.dirty and time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+                self.checkpoint()
+
+    def update(self, sub_genres, label):
+        start = time.perf_counter()
+        text = " ".join(sub_genres)
+        features = self.vectorizer.transform([text])
+        with self.lock:
+            self.examples.append((text, label))
+            self.taught.update((sub_genre, label) for sub_genre in sub_genres)
+            if label in self.classifier.classes_:
+                self.classifier.partial_fit(features, [label], sample_weight=[self.ASSIGNMENT_WEIGHT])
+            else:
+                # SGD cannot grow its class set in place; refit once with the new label
+                self.classifier = self.bootstrap(self.examples)
+            self.updates += 1
+            self.dirty = True
+        print(f"Genre model learned '{text}' -> {label} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def taught_genre(self, sub_genres):
+        """Majority label of the sub-genres that were taught directly, or None if none were."""
+        with self.lock:
+            votes = Counter(self.taught[sub_genre] for sub_genre in sub_genres if sub_genre in self.taught)
+        if not votes:
+            return None
+        return votes.most_common(1)[0][0]
+
+    def predict(self, sub_genres):
+        text = " ".join(sub_genres)
+        features = self.vectorizer.transform([text])
+        with self.lock:
+            return self.classifier.predict(features)[0]
+
+    def predict_proba(self, sub_genres):
+        """{broad genre: probability} for the sub-genres."""
+        features = self.vectorizer.transform([" ".join(sub_genres)])
+        with self.lock:
+            probabilities = self.classifier.predict_proba(features)[0]
+            return dict(zip(map(str, self.classifier.classes_), probabilities.tolist()))
+
+    def checkpoint(self):
+        """Write a compact gzipped checkpoint, replacing the previous one atomically."""
+        with self.lock:
+            data = pickle.dumps({"classifier": self.classifier, "examples": self.examples, "updates": self.updates,
+                                 "taught": self.taught})
+            self.dirty = False
+        with gzip.open(self.checkpoint_path + ".tmp", "wb") as file:
+            file.write(data)
+        os.replace(self.checkpoint_path + ".tmp", self.checkpoint_path)
+        self.last_checkpoint = time.monotonic()
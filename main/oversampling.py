@@ -0,0 +1,136 @@
+import os
+import numpy as np
+from scipy.signal import sosfilt
+from dsp import peaking_sos, sos_response_db
+from eq_engine import EqualizerEngine, EqualizerSettings
+from multirate import DelayLine, HalfbandDecimator, HalfbandInterpolator, halfband_taps
+
+
+class OversampledEqualizerEngine(EqualizerEngine):
+    """
+    Cascaded peaking EQ that runs the bands close to Nyquist oversampled
+    (EQ_ENGINE=oversampled).
+
+    Bilinear-transform peaking filters get cramped near Nyquist: at 44.1 kHz
+    the 12k-16k bands are squeezed towards 22 kHz and lose their upper skirt.
+    Bands at or above `high_ratio` of the sample rate therefore run at
+    `factor` (2 or 4) times the rate, where they match the analog prototype
+    closely. Everything else stays a plain cascade at the device rate.
+
+    Only the high bands' modification goes through the oversampler: the
+    signal is interpolated by a chain of polyphase half-band stages, the high
+    sections run on it, and their output minus the interpolated input is
+    decimated back and added to the delayed signal. The dry path is never
+    band-limited by the half-band filters; only the high bands' boost or cut
+    rolls off near Nyquist. While the layout has high bands the signal
+    always goes through the dry delay, even with every gain flat, so the
+    latency (see latency()) stays fixed as the gains change; the interpolator
+    keeps running too so its state is current when the high bands come back.
+    """
+
+    def __init__(self, bands, sample_rate=44100, channels=2, Q=1.0, factor=2, high_ratio=0.25,
+                 taps=47, beta=5.7, inner_taps=19, peak_grid_points=2048, cache=None):
+        if factor not in (2, 4):
+            raise ValueError("Oversampling factor must be 2 or 4.")
+        self.factor = factor
+        self.high_ratio = high_ratio
+        # The first stage does the real work; later stages only see content below
+        # the original Nyquist frequency, so a short filter is enough there
+        self.stage_taps = [halfband_taps(taps, beta)] + [halfband_taps(inner_taps)] * (factor // 4)
+        super().__init__(bands, sample_rate, channels, Q, peak_grid_points, cache)
+
+    def set_sample_rate(self, sample_rate, gains=None):
+        """Split the layout at the new rate and rebuild the resampling stages."""
+        channels = self.channels
+        self.is_high = self.bands >= self.high_ratio * sample_rate
+        self.interpolators = [HalfbandInterpolator(taps, channels) for taps in self.stage_taps]
+        self.decimators = [HalfbandDecimator(taps, channels) for taps in reversed(self.stage_taps)]
+        # Stage k runs at 2^(k+1) times the rate and delays by (taps - 1) / 2 samples each way
+        delay = sum((len(taps) - 1) * self.factor // 2 ** (k + 1) for k, taps in enumerate(self.stage_taps))
+        # Pad at the oversampled rate so the round trip is a whole number of input samples
+        padding = -delay % self.factor
+        self.padding = DelayLine(padding, channels)
+        self.oversampled_latency = (delay + padding) // self.factor
+        self.dry_delay = DelayLine(self.oversampled_latency, channels)
+        super().set_sample_rate(sample_rate, gains)
+
+    def design(self, gains):
+        """Build an EqualizerSettings snapshot; `sos` holds ((low indices, sos), (high indices, sos))."""
+        gains = np.asarray(gains, dtype=np.float64)
+        active = np.flatnonzero(gains)
+        if len(active) == 0:
+            return EqualizerSettings(gains, active, None, 1.0, 0.0)
+
+        sections = []
+        total_db = np.zeros(len(self.peak_freqs))
+        for indices, rate in ((active[~self.is_high[active]], self.sample_rate),
+                              (active[self.is_high[active]], self.sample_rate * self.factor)):
+            if len(indices) == 0:
+                sections.append((indices, None))
+                continue
+            sos = peaking_sos(self.bands[indices], self.Q, gains[indices], rate)
+            total_db += sos_response_db(sos, self.peak_freqs, rate).sum(axis=0)
+            sections.append((indices, sos))
+
+        peak_db = float(np.max(total_db))
+        makeup_gain = 10 ** (-max(peak_db, 0.0) / 20)
+        return EqualizerSettings(gains, active, sections, makeup_gain, peak_db)
+
+    def options(self):
+        return {**super().options(), "factor": self.factor, "high_ratio": self.high_ratio}
+
+    def latency(self):
+        """Processing delay in samples; zero when no band is high enough to be oversampled."""
+        return self.oversampled_latency if self.is_high.any() else 0
+
+    def stages(self):
+        return self.interpolators + self.decimators + [self.padding, self.dry_delay]
+
+    def reset(self):
+        self.zi[:] = 0.0
+        for stage in self.stages():
+            stage.reset()
+
+    def snapshot(self):
+        return {**super().snapshot(), "stages": [stage.snapshot() for stage in self.stages()]}
+
+    def restore(self, state):
+        super().restore(state)
+        for stage, stage_state in zip(self.stages(), state["stages"]):
+            stage.restore(stage_state)
+
+    def process(self, block):
+        settings = self.settings  # Read once so a concurrent update can't split the block
+        signal = np.asarray(block, dtype=np.float64)
+        if not self.is_high.any() and settings.is_flat:
+            return signal
+        # Flat gains still take the delayed path so the latency doesn't jump when they change
+        (low, low_sos), (high, high_sos) = settings.sos if not settings.is_flat else ((None, None), (None, None))
+        if low_sos is not None:
+            signal, self.zi[low] = sosfilt(low_sos, signal, axis=0, zi=self.zi[low])
+        if not self.is_high.any():
+            return signal * settings.makeup_gain
+
+        upsampled = signal
+        for interpolator in self.interpolators:
+            upsampled = interpolator.process(upsampled)
+        output = self.dry_delay.process(signal)
+        if high_sos is None:
+            # Nothing to add; the decimators' input is silence, which a cleared history already
+            # holds, and the high sections restart from rest like them when a high band comes back
+            for stage in self.decimators + [self.padding]:
+                stage.reset()
+            self.zi[self.is_high] = 0.0
+            return output * settings.makeup_gain
+
+        filtered, self.zi[high] = sosfilt(high_sos, upsampled, axis=0, zi=self.zi[high])
+        modification = self.padding.process(filtered - upsampled)
+        for decimator in self.decimators:
+            modification = decimator.process(modification)
+        output += modification
+        return output * settings.makeup_gain
+
+
+def oversampling_options_from_env():
+    """EQ_OVERSAMPLING: oversampling factor for the high bands, 2 or 4."""
+    return {"factor": int(os.getenv("EQ_OVERSAMPLING", "2"))}
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class PresetPrefetcher:
+    """
+    Resolves the genres of upcoming tracks from the Spotify queue on a
+    background thread and designs their EQ coefficients ahead of time, so a
+    track change only has to look up a genre and swap in cached settings.
+
+    With AUTO_EQ_BLEND=1, artists without an assignment get a blend of the
+    AUTO_EQ_BLEND_TOP_K likeliest genre presets, weighted by the classifier's
+    confidence, instead of only the top genre's preset.
+
+    Also records how long after each track change its EQ was applied.
+    """
+
+    def __init__(self, spotify, presets, zone_manager, depth=2, interval=5.0, max_artists=512):
+        self.spotify = spotify
+        self.presets = presets
+        self.zone_manager = zone_manager
+        self.depth = depth
+        self.interval = interval
+        self.max_artists = max_artists
+        self.blend = os.getenv("AUTO_EQ_BLEND", "0") == "1"
+        self.top_k = int(os.getenv("AUTO_EQ_BLEND_TOP_K", "3"))
+        self.genres = OrderedDict()  # Artist -> (resolved genre, blended gains or None)
+        self.requests = OrderedDict()  # Artist -> callback, missed lookups waiting for the worker
+        self.lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.running = False
+        self.worker = None
+        self.hits = 0
+        self.misses = 0
+        self.latencies = deque(maxlen=100)  # (seconds from track start to applied EQ, prefetched)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.worker = threading.Thread(target=self.run, name="PresetPrefetcher", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        self.running = False
+        self.wake_event.set()
+        if self.worker is not None:
+            self.worker.join(timeout=2.0)
+            self.worker = None
+
+    def wake(self):
+        """Prefetch now, e.g. right after a track change shifted the queue."""
+        self.wake_event.set()
+
+    def run(self):
+        while self.running:
+            self.wake_event.wait(self.interval)
+            self.wake_event.clear()
+            if not self.running:
+                break
+            try:
+                self.resolve_requests()
+                self.prefetch()
+            except Exception as e:
+                print(f"Error prefetching presets: {e}")
+
+    def resolve_requests(self):
+        """Resolve the artists genre_for() missed and hand each result to its callback."""
+        while True:
+            with self.lock:
+                if not self.requests:
+                    return
+                artist_name, callback = self.requests.popitem(last=False)
+            try:
+                genre = self.resolve(artist_name)
+            except Exception as e:
+                print(f"Error resolving the genre of {artist_name}: {e}")
+                genre = None
+            callback(artist_name, genre)
+
+    def prefetch(self):
+        """Resolve the queued tracks' genres and warm every zone's coefficient cache for them."""
+        for track in self.spotify.get_queue(self.depth):
+            self.resolve_requests()  # A track that is already playing goes first
+            found, genre = self.lookup(track["artist"])
+            if not found:
+                genre = self.resolve(track["artist"])
+            gains = self.gains_for(track["artist"], genre)
+            if gains is None:
+                continue
+            for zone in self.zone_manager.zones:
+                zone.prepare(gains)
+
+    def resolve(self, artist_name):
+        if self.blend:
+            genre, gains = self.presets.resolve_artist(self.spotify, artist_name, self.top_k)
+        else:
+            genre, gains = self.presets.genre_for_artist(self.spotify, artist_name), None
+        if genre is None:
+            return None  # Failed or empty lookups are retried next time, not cached
+        with self.lock:
+            self.genres[artist_name] = (genre, gains)
+            if len(self.genres) > self.max_artists:
+                self.genres.popitem(last=False)
+        return genre
+
+    def lookup(self, artist_name):
+        """(found, genre) from the artist's assignment or an earlier resolution, without any network call."""
+        if artist_name in self.presets.artist_genres:
+            return True, self.presets.artist_genres[artist_name]
+        with self.lock:
+            if artist_name in self.genres:
+                return True, self.genres[artist_name][0]
+        return False, None
+
+    def gains_for(self, artist_name, genre):
+        """Gains to apply for the artist: its blend if one was resolved, else the genre's preset (or None)."""
+        if artist_name not in self.presets.artist_genres:
+            with self.lock:
+                _, gains = self.genres.get(artist_name, (None, None))
+            if gains is not None:
+                return gains
+        return self.presets.get(genre) if genre else None
+
+    def genre_for(self, artist_name, callback=None):
+        """
+        Return (genre, prefetched) for the artist: an assignment or a
+        prefetched result if there is one, otherwise resolved now. With
+        `callback`, a miss is resolved on the worker thread instead, which
+        calls callback(artist_name, genre) when done, and (None, False) is
+        returned straight away.
+        """
+        found, genre = self.lookup(artist_name)
+        if found:
+            self.hits += 1
+            return genre, True
+        if callback is None:
+            self.misses += 1
+            return self.resolve(artist_name), False
+        with self.lock:
+            if artist_name not in self.requests:  # Polls while it is pending are the same miss
+                self.misses += 1
+            self.requests[artist_name] = callback
+        self.wake_event.set()
+        return None, False
+
+    def record_switch(self, track, fetched_at, prefetched):
+        """
+        Record the delay from the start of `track` to now, when its EQ has been
+        applied. `fetched_at` is the perf_counter time its progress was read.
+        """
+        started_at = fetched_at - track["progress_ms"] / 1000
+        latency = time.perf_counter() - started_at
+        self.latencies.append((latency, prefetched))
+        return latency
+
+    def summary(self):
+        summary = {"prefetch_hits": self.hits, "prefetch_misses": self.misses}
+        for label, prefetched in (("prefetched", True), ("resolved", False)):
+            latencies = [latency for latency, hit in self.latencies if hit == prefetched]
+            summary[f"{label}_switches"] = len(latencies)
+            summary[f"{label}_mean_s"] = sum(latencies) / len(latencies) if latencies else 0.0
+            summary[f"{label}_max_s"] = max(latencies) if latencies else 0.0
+        return summary
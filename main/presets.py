@@ -0,0 +1,178 @@
+import os
+import pickle
+import sys
+import numpy as np
+
+# Band layout the presets are defined for
+BANDS = [60, 170, 310, 600, 1000, 3000, 6000, 12000, 14000, 16000]
+
+DEFAULT_GENRE_PRESETS = {
+    "Pop": [2, 1, 0, 0, 2, 3, 2, 3, 2, 1],
+    "Rock": [4, 3, 2, 1, 0, 1, 0, -1, -2, -2],
+    "Classical": [0, 0, 1, 1, 2, 3, 2, 3, 2, 1],
+    "Jazz": [2, 3, 2, 1, 1, 2, 1, 1, 1, 0],
+    "Hip-Hop": [6, 4, 2, 1, 0, 2, 3, 4, 2, 1],
+    "Electronic": [6, 4, 3, 2, 0, 2, 4, 6, 5, 3],
+    "Acoustic": [1, 1, 2, 2, 3, 3, 2, 2, 1, 0],
+    "Metal": [5, 4, 3, 1, 1, 1, 0, -1, -2, -3],
+    "Dance": [5, 3, 2, 1, 0, 2, 4, 5, 3, 2],
+    "R&B": [4, 3, 2, 1, 1, 1, 2, 2, 1, 0],
+}
+
+
+def get_resource_path(relative_path):
+    """
+    Get the absolute path to a resource, works for PyInstaller bundled environments.
+    """
+    if hasattr(sys, "_MEIPASS"):
+        # PyInstaller extracts resources to a temporary folder
+        return os.path.join(sys._MEIPASS, relative_path)
+    return os.path.join(os.path.abspath("."), relative_path)
+
+
+def load_pickle(relative_path, default):
+    try:
+        with open(get_resource_path(relative_path), "rb") as file:
+            return pickle.load(file)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return default
+
+
+def save_pickle(relative_path, value):
+    with open(get_resource_path(relative_path), "wb") as file:
+        pickle.dump(value, file)
+
+
+class PresetMatrix:
+    """
+    Presets as one contiguous (presets x bands) float64 matrix with a name ->
+    row index, so blending, nearest-preset search and morphing are single
+    vectorized operations instead of loops over lists.
+    """
+
+    def __init__(self, names, gains):
+        self.names = list(names)
+        self.index = {name: row for row, name in enumerate(self.names)}
+        self.matrix = np.ascontiguousarray(np.asarray(gains, dtype=np.float64).reshape(len(self.names), -1))
+
+    def row(self, name):
+        return self.matrix[self.index[name]]
+
+    def weights(self, probabilities, top_k=None):
+        """
+        Row weights from {name: probability}: names without a preset are dropped,
+        only the `top_k` most likely rows are kept, and the rest renormalized.
+        """
+        weights = np.zeros(len(self.names))
+        for name, probability in probabilities.items():
+            row = self.index.get(name)
+            if row is not None:
+                weights[row] = probability
+        if top_k is not None and top_k < len(weights):
+            weights[np.argpartition(weights, -top_k)[:-top_k]] = 0.0
+        total = weights.sum()
+        return weights / total if total > 0 else weights
+
+    def blend(self, probabilities, top_k=None):
+        """Confidence-weighted blend of the presets as one matrix-vector product, or None."""
+        weights = self.weights(probabilities, top_k)
+        if not weights.any():
+            return None
+        return weights @ self.matrix
+
+    def nearest(self, gains, k=1):
+        """Names of the `k` presets closest to `gains` (RMS distance over the bands), closest first."""
+        distances = np.sqrt(np.mean((self.matrix - np.asarray(gains, dtype=np.float64)) ** 2, axis=1))
+        order = np.argsort(distances)[:k]
+        return [(self.names[row], float(distances[row])) for row in order]
+
+    def morph(self, source, target, amount):
+        """Gains `amount` (0..1, or an array of steps) of the way from preset `source` to `target`."""
+        amount = np.asarray(amount, dtype=np.float64)[..., None]
+        start = self.row(source)
+        return start + amount * (self.row(target) - start)
+
+
+class PresetStore:
+    """
+    Genre and custom presets plus artist-genre assignments, stored as pickles.
+    Has no Qt dependency so the GUI and the headless daemon share it.
+    """
+
+    def __init__(self):
+        self.default_genre_presets = {name: list(values) for name, values in DEFAULT_GENRE_PRESETS.items()}
+        self.genre_presets = load_pickle("presets/genre_presets.pkl", self.get_default_genre_presets())
+        self.custom_presets = load_pickle("presets/custom_presets.pkl", {})
+        self.artist_genres = load_pickle("artist_genres.pkl", {})
+        self.preset_matrix = None
+        self.preset_matrix_key = None
+
+    def get_default_genre_presets(self):
+        """Return a copy of the original default genre presets."""
+        return {name: list(values) for name, values in self.default_genre_presets.items()}
+
+    def names(self):
+        return ["Flat"] + list(self.genre_presets.keys()) + list(self.custom_presets.keys())
+
+    def get(self, name):
+        """Gains for a preset name, or None if there is no such preset."""
+        if name == "Flat":
+            return [0] * len(BANDS)
+        if name in self.genre_presets:
+            return self.genre_presets[name]
+        return self.custom_presets.get(name)
+
+    def matrix(self):
+        """
+        Every preset (Flat, genre, custom) as a PresetMatrix. The dicts stay the
+        editable, pickled form; the matrix is rebuilt when their contents change.
+        """
+        key = (tuple((name, tuple(values)) for name, values in self.genre_presets.items()),
+               tuple((name, tuple(values)) for name, values in self.custom_presets.items()))
+        if key != self.preset_matrix_key:
+            names = self.names()
+            self.preset_matrix = PresetMatrix(names, [self.get(name) for name in names])
+            self.preset_matrix_key = key
+        return self.preset_matrix
+
+    def blended_gains(self, probabilities, top_k=None):
+        """Integer gains blended from {genre: probability}, or None if no genre has a preset."""
+        gains = self.matrix().blend(probabilities, top_k)
+        return None if gains is None else [int(gain) for gain in np.rint(gains)]
+
+    def resolve_artist(self, spotify, artist_name, top_k=None):
+        """
+        (genre, gains) for the artist. An assignment is certain, so it maps to its
+        preset (gains None); otherwise the classifier's probabilities give the
+        most likely genre and a blend of the `top_k` likeliest presets. (None, None)
+        if the lookup failed or found no sub-genres.
+        """
+        if artist_name in self.artist_genres:
+            return self.artist_genres[artist_name], None
+        sub_genres = spotify.get_genres_for_song(artist_name)
+        # Anything but a list is an error message from the lookup
+        if not sub_genres or not isinstance(sub_genres, list):
+            return None, None
+        probabilities = spotify.genre_probabilities(sub_genres)
+        if not probabilities:
+            return spotify.predict_broad_genre(sub_genres), None
+        genre = max(probabilities, key=probabilities.get)
+        return genre, self.blended_gains(probabilities, top_k)
+
+    def genre_for_artist(self, spotify, artist_name):
+        """Genre assigned to the artist, else one predicted from Spotify's sub-genres, else None."""
+        if artist_name in self.artist_genres:
+            return self.artist_genres[artist_name]
+        sub_genres = spotify.get_genres_for_song(artist_name)
+        if sub_genres and isinstance(sub_genres, list):
+            return spotify.predict_broad_genre(sub_genres)
+        return None
+
+    def save_genre_presets(self):
+        save_pickle("presets/genre_presets.pkl", self.genre_presets)
+
+    def save_custom_presets(self):
+        save_pickle("presets/custom_presets.pkl", self.custom_presets)
+
+    def save_artist_genres(self):
+        save_pickle("artist_genres.pkl", self.artist_genres)
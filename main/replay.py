@@ -0,0 +1,119 @@
+"""
+Replay a capture written with AUDIO_CAPTURE through the DSP pipeline.
+
+Blocks and parameter changes are fed to a fresh zone pipeline in recorded
+order, so the same capture always produces the same output. A capture also
+holds the filter, limiter and loudness state from when it started, which the
+new zone restores, so replaying with the recorded engine and loudness
+matching reproduces what was played sample for sample. Run at full speed for
+profiling, or paced to the recorded timestamps. Several engines
+can be given to A/B them on identical traffic:
+
+    python replay.py captures/Main-20250101-120000.aeqcap
+    python replay.py capture.aeqcap --engine cascade --engine oversampled
+    python replay.py capture.aeqcap --engine cascade --engine dynamic
+    python replay.py capture.aeqcap --realtime --output replay.wav
+    python replay.py capture.aeqcap --loudness --no-match-loudness
+"""
+import argparse
+import time
+import numpy as np
+from audio_backend import CallbackStats
+from capture import BLOCK, STATE, CaptureReader
+from eq_engine import CoefficientCache
+from loudness import measure
+from zones import Zone
+
+ENGINE_NAMES = {"EqualizerEngine": "cascade",
+                "DynamicEqualizerEngine": "dynamic", "OversampledEqualizerEngine": "oversampled"}
+
+
+def replay(path, engine_name=None, realtime=False, match_loudness=None):
+    """
+    Run a capture through a new zone pipeline. Returns (output, stats, zone, recorded_engine)
+    with the processed blocks concatenated into one (frames, channels) array.
+    Loudness matching follows the capture unless `match_loudness` is given.
+    """
+    reader = CaptureReader(path)
+    zone = None
+    recorded_engine = None
+    stats = CallbackStats()
+    outputs = []
+    start = time.perf_counter()
+    for kind, timestamp, status, payload in reader.records():
+        if realtime:
+            delay = start + timestamp - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        if kind == STATE:
+            zone.restore(payload)
+            continue
+        if kind != BLOCK:
+            recorded_engine = payload["engine"]
+            if zone is None:
+                name = engine_name or ENGINE_NAMES.get(recorded_engine, "cascade")
+                # The recorded engine is rebuilt with its recorded options rather than today's
+                # environment; another engine only shares the Q (older captures have no options)
+                options = {"Q": payload["Q"]}
+                if name == ENGINE_NAMES.get(recorded_engine):
+                    options = payload.get("engine_options", options)
+                zone = Zone("replay", None, payload["bands"], [], [], CoefficientCache(), name, options)
+                recorded_match = payload.get("loudness_match", False)  # Not recorded by older captures
+                zone.loudness.enabled = recorded_match if match_loudness is None else match_loudness
+            zone.set_sample_rate(payload["sample_rate"])
+            zone.set_gains(payload["gains"])
+            zone.enabled = payload["enabled"]
+            if payload.get("correction") != zone.correction.profile:
+                zone.set_correction(payload.get("correction"))
+            continue
+        outdata = np.empty_like(payload)
+        block_start = time.perf_counter()
+        zone.audio_callback(payload, outdata, status)
+        stats.record(time.perf_counter() - block_start, len(payload), zone.engine.sample_rate, status)
+        outputs.append(outdata)
+    if zone is None:
+        raise ValueError(f"{path} contains no audio")
+    output = np.concatenate(outputs) if outputs else np.zeros((0, reader.channels), dtype=np.float32)
+    return output, stats, zone, recorded_engine
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay captured audio callback traffic.")
+    parser.add_argument("capture")
+    parser.add_argument("--engine", action="append", choices=sorted(set(ENGINE_NAMES.values())),
+                        help="engine to replay with (repeat to compare); default: the recorded one")
+    parser.add_argument("--realtime", action="store_true", help="pace blocks to their recorded timestamps")
+    parser.add_argument("--output", help="write the first run's output to this WAV file")
+    parser.add_argument("--loudness", action="store_true", help="report input and output loudness (LUFS)")
+    parser.add_argument("--match-loudness", action=argparse.BooleanOptionalAction,
+                        help="force per-setting loudness matching (LOUDNESS_MATCH) on or off; default: as recorded")
+    args = parser.parse_args()
+
+    reference = None
+    for engine_name in args.engine or [None]:
+        output, stats, zone, recorded_engine = replay(args.capture, engine_name, args.realtime,
+                                                      args.match_loudness)
+        summary = stats.summary()
+        line = (f"{engine_name or recorded_engine}: {summary['callbacks']} blocks, "
+                f"mean {summary['mean_ms']:.3f} ms, max {summary['max_ms']:.3f} ms, "
+                f"load {summary['mean_load'] * 100:.2f}%, {summary['overruns']} overruns")
+        if args.loudness:
+            loudness_in = zone.loudness.input_meter.integrated()
+            loudness_out = measure(output, zone.engine.sample_rate)[0]
+            line += f", loudness {loudness_in:.1f} -> {loudness_out:.1f} LUFS"
+        if reference is None:
+            reference, reference_latency = output, zone.engine.latency()
+            if args.output:
+                from scipy.io import wavfile
+                wavfile.write(args.output, zone.engine.sample_rate, output)
+        else:
+            # Line the outputs up by the engines' latencies before comparing. Flat and
+            # bypassed stretches are passed through undelayed, so engines with different
+            # latencies only line up exactly while the EQ is active.
+            shift = zone.engine.latency() - reference_latency
+            aligned = output[shift:] if shift >= 0 else np.concatenate((np.zeros((-shift, output.shape[1]), output.dtype), output))
+            frames = min(len(reference), len(aligned))
+            error = np.sqrt(np.mean((aligned[:frames] - reference[:frames]) ** 2)) if frames else 0.0
+            level = np.sqrt(np.mean(reference[:frames] ** 2)) if frames else 1.0
+            line += f", difference from first {20 * np.log10(max(error, 1e-12) / max(level, 1e-12)):.1f} dB"
+        print(line)
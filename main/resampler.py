@@ -0,0 +1,85 @@
+from fractions import Fraction
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import firwin
+from ring_buffer import FifoBuffer
+
+
+class StreamingResampler:
+    """
+    Rational polyphase resampler with state carried across blocks.
+
+    For an up/down ratio L/M, output sample m sits at input position m*M/L.
+    Each block gathers the needed input windows and the matching polyphase
+    rows with fancy indexing and evaluates all outputs in one batched matmul, so
+    there is no per-sample Python loop. Blocks of any size may be fed; the
+    number of output frames varies by at most one between calls.
+    """
+
+    def __init__(self, input_rate, output_rate, channels=2, taps_per_phase=16, beta=8.0):
+        ratio = Fraction(int(output_rate), int(input_rate))
+        self.up = ratio.numerator
+        self.down = ratio.denominator
+        self.channels = channels
+        self.taps = taps_per_phase
+
+        # Prototype lowpass at the upsampled rate, cut below the lower Nyquist
+        cutoff = 0.9 / max(self.up, self.down)
+        prototype = firwin(self.up * taps_per_phase, cutoff, window=("kaiser", beta)) * self.up
+        # bank[p, j] = prototype[p + j * up], reversed along j so it lines up with history windows
+        self.bank = prototype.reshape(taps_per_phase, self.up).T[:, ::-1].copy()
+
+        self.history = np.zeros((taps_per_phase - 1, channels))
+        # Position of the next output, in 1/up input samples, relative to the current block start
+        self.position = 0
+
+    def process(self, block):
+        """Resample a (frames, channels) block and return the output frames produced so far."""
+        frames = len(block)
+        extended = np.concatenate((self.history, block))
+        self.history = extended[frames:]
+
+        last = frames * self.up - 1
+        count = max(0, (last - self.position) // self.down + 1)
+        positions = self.position + np.arange(count) * self.down
+        base = positions // self.up          # Newest input sample used by each output
+        phase = positions % self.up
+        self.position += count * self.down - frames * self.up
+
+        # Window of `taps` inputs ending at `base` (window start index `base` in `extended`)
+        windows = sliding_window_view(extended, self.taps, axis=0)[base]
+        return (windows @ self.bank[phase][:, :, None])[:, :, 0]
+
+    def latency(self):
+        """Approximate group delay in input samples."""
+        return self.taps / 2
+
+
+class ResamplingBridge:
+    """
+    Connects an input stream at one rate to an output stream at another: the
+    input callback pushes resampled frames into a FIFO, the output callback
+    pulls exactly the number of frames it needs. The output side waits for
+    one block of cushion before it starts (and again after an underrun) so
+    the two clocks can jitter against each other without dropouts.
+    """
+
+    def __init__(self, input_rate, output_rate, channels=2, blocksize=1024):
+        self.resampler = StreamingResampler(input_rate, output_rate, channels)
+        self.fifo = FifoBuffer(blocksize * 8, channels)
+        self.cushion = blocksize
+        self.primed = False
+
+    def push_input(self, block):
+        self.fifo.push(self.resampler.process(block))
+
+    def pull_input(self, out):
+        if not self.primed:
+            if self.fifo.available < len(out) + self.cushion:
+                out[:] = 0
+                return 0
+            self.primed = True
+        frames = self.fifo.pull(out)
+        if frames < len(out):
+            self.primed = False
+        return frames
@@ -0,0 +1,130 @@
+import threading
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Preallocated single-producer ring buffer for multichannel audio blocks.
+
+    The audio thread calls write() and never blocks or allocates; readers on
+    other threads copy out the most recent frames with read_latest().
+    """
+
+    def __init__(self, capacity, channels=2, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self.buffer = np.zeros((self.capacity, channels), dtype=dtype)
+        self.write_index = 0
+        self.total_written = 0  # Monotonic frame counter, lets readers detect new data
+
+    def write(self, block):
+        """Copy a (frames, channels) block into the ring, overwriting the oldest frames."""
+        frames = len(block)
+        if frames >= self.capacity:
+            # Only the tail of an oversized block fits
+            np.copyto(self.buffer, block[-self.capacity:], casting="unsafe")
+            self.write_index = 0
+        else:
+            end = self.write_index + frames
+            if end <= self.capacity:
+                np.copyto(self.buffer[self.write_index:end], block, casting="unsafe")
+            else:
+                split = self.capacity - self.write_index
+                np.copyto(self.buffer[self.write_index:], block[:split], casting="unsafe")
+                np.copyto(self.buffer[:frames - split], block[split:], casting="unsafe")
+            self.write_index = end % self.capacity
+        self.total_written += frames
+
+    def read_latest(self, out):
+        """
+        Copy the newest len(out) frames into the preallocated array `out`.
+        Returns the total_written counter at the time of the read.
+        """
+        frames = len(out)
+        total = self.total_written
+        start = (self.write_index - frames) % self.capacity
+        end = start + frames
+        if end <= self.capacity:
+            out[:] = self.buffer[start:end]
+        else:
+            split = self.capacity - start
+            out[:split] = self.buffer[start:]
+            out[split:] = self.buffer[:frames - split]
+        return total
+
+
+
+class FifoBuffer:
+    """
+    Bounded frame FIFO between two threads, e.g. an input stream callback and an
+    output stream callback running on different clocks.
+    """
+
+    def __init__(self, capacity, channels=2, dtype=np.float32):
+        self.ring = RingBuffer(capacity, channels, dtype)
+        self.available = 0
+        self.read_index = 0
+        self.lock = threading.Lock()
+
+    def push(self, block):
+        """Append frames, dropping the oldest ones if the FIFO overflows."""
+        with self.lock:
+            self.ring.write(block)
+            self.available = min(self.available + len(block), self.ring.capacity)
+            self.read_index = (self.ring.write_index - self.available) % self.ring.capacity
+
+    def pull(self, out):
+        """
+        Fill `out` with the oldest frames, zero-filling whatever is missing.
+        Returns the number of real frames delivered.
+        """
+        with self.lock:
+            frames = min(len(out), self.available)
+            capacity = self.ring.capacity
+            end = self.read_index + frames
+            if end <= capacity:
+                out[:frames] = self.ring.buffer[self.read_index:end]
+            else:
+                split = capacity - self.read_index
+                out[:split] = self.ring.buffer[self.read_index:]
+                out[split:frames] = self.ring.buffer[:frames - split]
+            self.read_index = end % capacity
+            self.available -= frames
+        out[frames:] = 0
+        return frames
+
+
+class SharedRingBuffer(RingBuffer):
+    """
+    RingBuffer whose frames and counters live in a caller-provided buffer, e.g.
+    a multiprocessing.shared_memory block, so the writer and the reader can be
+    in different processes. Still single-producer and lock-free.
+    """
+
+    COUNTERS = 16  # write_index and total_written as int64 ahead of the frames
+
+    def __init__(self, buffer, capacity, channels=2, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.channels = channels
+        self.counters = np.ndarray((2,), dtype=np.int64, buffer=buffer)
+        self.buffer = np.ndarray((self.capacity, channels), dtype=dtype, buffer=buffer, offset=self.COUNTERS)
+
+    @classmethod
+    def nbytes(cls, capacity, channels=2, dtype=np.float32):
+        return cls.COUNTERS + int(capacity) * channels * np.dtype(dtype).itemsize
+
+    @property
+    def write_index(self):
+        return int(self.counters[0])
+
+    @write_index.setter
+    def write_index(self, value):
+        self.counters[0] = value
+
+    @property
+    def total_written(self):
+        return int(self.counters[1])
+
+    @total_written.setter
+    def total_written(self, value):
+        self.counters[1] = value
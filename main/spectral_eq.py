@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+import numpy as np
+from scipy import fft as sp_fft
+from ring_buffer import RingBuffer
+
+
+class LongTermSpectrum:
+    """
+    Long-term average spectrum (LTAS) of a zone's input, in dB per EQ band.
+
+    The audio thread only copies each block into a ring buffer (push). A
+    worker thread wakes every `interval` seconds, cuts the frames that arrived
+    since into Hann-windowed Welch segments (50% overlap), transforms them in
+    one batched FFT on preallocated buffers and folds their mean power into an
+    exponential average with a `time_constant` time constant. The number of
+    segments per wake is capped so the worker stays within `duty` of one core;
+    segments over the cap are skipped, which only thins out the average.
+    Near-silent stretches (paused playback) are left out.
+    """
+
+    def __init__(self, bands, sample_rate=44100, channels=2, fft_size=4096, time_constant=30.0,
+                 interval=0.5, duty=0.01, Q=1.0, silence_db=-70.0, min_seconds=5.0):
+        self.bands = np.asarray(bands, dtype=np.float64)
+        self.Q = Q
+        self.channels = channels
+        self.fft_size = fft_size
+        self.hop = fft_size // 2
+        self.time_constant = time_constant
+        self.interval = interval
+        self.duty = duty
+        self.silence_power = 10 ** (silence_db / 10)
+        self.min_seconds = min_seconds
+        # Room for a few intervals of input at 192 kHz
+        self.ring = RingBuffer(1 << 18, channels)
+
+        # Worker-side buffers, allocated once
+        self.chunk = np.zeros((self.ring.capacity, channels), dtype=np.float32)
+        self.mono = np.zeros(self.ring.capacity, dtype=np.float32)
+        self.max_segments = 8  # Adjusted from measured cost to stay within the duty cycle
+        self.segments = np.zeros((self.ring.capacity // self.hop, fft_size), dtype=np.float32)
+        self.window = np.hanning(fft_size).astype(np.float32)
+        # One-sided power spectrum -> mean square of the signal
+        self.power_scale = 2 / (fft_size * np.sum(self.window.astype(np.float64) ** 2))
+
+        self.position = 0  # ring.total_written value the next segment starts at
+        self.running = False
+        self.worker = None
+        self.set_sample_rate(sample_rate)
+
+    def set_sample_rate(self, sample_rate):
+        """Retune the band weights; the average starts over since bins moved."""
+        self.sample_rate = sample_rate
+        freqs = np.maximum(sp_fft.rfftfreq(self.fft_size, 1 / sample_rate), 1e-3)
+        ratio = freqs[None, :] / self.bands[:, None]
+        # Analog band-pass power response of each band, like the dynamic EQ's detectors
+        self.weights = 1 / (1 + self.Q ** 2 * (ratio - 1 / ratio) ** 2)
+        self.reset()
+
+    def reset(self):
+        self.average = None  # Mean power per FFT bin
+        self.seconds = 0.0  # Audio time folded into the average
+        self.position = self.ring.total_written
+
+    def push(self, block):
+        """Called from the audio callback with a (frames, channels) block. Never blocks."""
+        self.ring.write(block)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.worker = threading.Thread(target=self.run, name="LongTermSpectrum", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        self.running = False
+        if self.worker is not None:
+            self.worker.join(timeout=2.0)
+            self.worker = None
+
+    def run(self):
+        while self.running:
+            time.sleep(self.interval)
+            try:
+                self.update()
+            except Exception as e:
+                print(f"Error updating long-term spectrum: {e}")
+
+    def update(self):
+        """Fold the frames that arrived since the last call into the average. Returns segments used."""
+        total = self.ring.total_written
+        pending = total - self.position
+        if pending > self.ring.capacity - self.hop:
+            # Fell behind (or the rate jumped): keep the newest half of the ring
+            pending = self.ring.capacity // 2
+        count = (pending - self.fft_size) // self.hop + 1 if pending >= self.fft_size else 0
+        if count <= 0:
+            return 0
+        used = min(count, self.max_segments)
+        start = time.perf_counter()
+
+        chunk = self.chunk[:pending]
+        self.ring.read_latest(chunk)
+        mono = self.mono[:pending]
+        np.sum(chunk, axis=1, out=mono)
+        mono *= 1 / self.channels
+        # Evenly spread the segments that fit in the budget over the pending audio
+        starts = np.linspace(0, (count - 1) * self.hop, used).astype(np.intp)
+        segments = self.segments[:used]
+        for i, offset in enumerate(starts):
+            np.multiply(mono[offset:offset + self.fft_size], self.window, out=segments[i])
+        spectrum = sp_fft.rfft(segments, axis=1, overwrite_x=True)
+        power = (spectrum.real ** 2 + spectrum.imag ** 2).mean(axis=0) * self.power_scale
+
+        self.position = total - (pending - count * self.hop)  # Keep the overlap for next time
+        if power.sum() >= self.silence_power:
+            seconds = pending / self.sample_rate
+            if self.average is None:
+                self.average = power
+            else:
+                # Weighted by the audio time the segments stand for, skipped ones included
+                alpha = 1 - np.exp(-seconds / self.time_constant)
+                self.average += alpha * (power - self.average)
+            self.seconds += seconds
+
+        cost = (time.perf_counter() - start) / used
+        self.max_segments = int(np.clip(self.duty * self.interval / max(cost, 1e-7), 1, len(self.segments)))
+        return used
+
+    def band_levels(self):
+        """Mean power per band in dB, or None until `min_seconds` of audio were averaged."""
+        average = self.average
+        if average is None or self.seconds < self.min_seconds:
+            return None
+        return 10 * np.log10(np.maximum(self.weights @ average, 1e-20))
+
+
+class SpectrumMatcher:
+    """
+    Turns a zone's long-term spectrum into band gains that pull it towards the
+    selected preset's target curve.
+
+    The target curve is a reference tonal balance (`tilt_db` per octave around
+    1 kHz, measured per constant-Q band, so pink noise reads flat and average
+    mastered music about -1.5 dB/oct) shaped by the preset's gains. Where the
+    input already has more of a band than the target, the preset's gain there
+    is lowered, and raised where it has less, by at most `max_offset_db` from
+    the preset. Gains move by at most `step_db` per update and only once the
+    target is a whole dB away, so the sliders drift slowly instead of
+    following every change in the music.
+    """
+
+    def __init__(self, bands, tilt_db=-1.5, max_offset_db=6.0, step_db=1, limit_db=12, interval=2.0):
+        self.octaves = np.log2(np.asarray(bands, dtype=np.float64) / 1000)
+        self.tilt_db = tilt_db
+        self.max_offset_db = max_offset_db
+        self.step_db = step_db
+        self.limit_db = limit_db
+        self.interval = interval
+
+    def target_gains(self, levels_db, preset_gains):
+        """Float gains that would bring `levels_db` onto the preset's target curve."""
+        deviation = np.asarray(levels_db) - self.tilt_db * self.octaves
+        deviation -= deviation.mean()  # Only the balance between bands counts, not the level
+        offset = np.clip(-deviation, -self.max_offset_db, self.max_offset_db)
+        return np.clip(np.asarray(preset_gains, dtype=np.float64) + offset, -self.limit_db, self.limit_db)
+
+    def update(self, zone, preset_gains):
+        """Next gains for `zone` (a list of ints), or None if there is nothing to change yet."""
+        levels = zone.spectrum_levels()
+        if levels is None or preset_gains is None:
+            return None
+        current = np.asarray(zone.gains(), dtype=np.float64)
+        move = np.clip(np.trunc(self.target_gains(levels, preset_gains) - current), -self.step_db, self.step_db)
+        if not move.any():
+            return None
+        return [int(gain) for gain in current + move]
+
+
+def spectral_eq_enabled():
+    return os.getenv("AUTO_EQ_MODE", "preset") == "spectrum"
+
+
+def spectrum_matcher_from_env(bands):
+    """A SpectrumMatcher if AUTO_EQ_MODE=spectrum, else None."""
+    if not spectral_eq_enabled():
+        return None
+    return SpectrumMatcher(
+        bands,
+        tilt_db=float(os.getenv("AUTO_EQ_TILT", "-1.5")),
+        max_offset_db=float(os.getenv("AUTO_EQ_RANGE", "6")),
+    )
@@ -0,0 +1,120 @@
+import threading
+import time
+import numpy as np
+from scipy import fft as sp_fft
+from ring_buffer import RingBuffer
+
+
+class SpectrumAnalyzer:
+    """
+    Spectrum and level analyzer fed from the audio callback.
+
+    The audio thread only copies each block into a preallocated ring buffer
+    (push). A worker thread computes windowed FFTs at a capped frame rate and
+    publishes log-binned magnitudes, so the GUI thread only has to paint.
+    """
+
+    def __init__(self, sample_rate=44100, channels=2, fft_size=4096, num_bins=64,
+                 max_fps=30, min_freq=20.0, full_scale=32768.0, decay_db=1.5):
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.fft_size = fft_size
+        self.num_bins = num_bins
+        self.max_fps = max_fps
+        self.min_freq = min_freq
+        self.full_scale = full_scale
+        self.decay_db = decay_db  # Per-frame fall-off so bars drop smoothly
+
+        self.ring = RingBuffer(fft_size * 2, channels)
+
+        # Worker-side buffers, allocated once
+        self.frame = np.zeros((fft_size, channels), dtype=np.float32)
+        self.mono = np.zeros(fft_size, dtype=np.float32)
+        self.window = np.hanning(fft_size).astype(np.float32)
+        # Normalize so a full-scale sine reads 0 dBFS
+        self.window_gain = 2.0 / np.sum(self.window)
+        self.bin_edges, self.bin_starts = self.make_log_bins()
+        self.bin_centers = np.sqrt(self.bin_edges[:-1] * self.bin_edges[1:])
+
+        # Published results, replaced (not mutated) so readers never see partial updates
+        self.spectrum_db = np.full(num_bins, -120.0, dtype=np.float32)
+        self.levels_db = np.full(channels, -120.0, dtype=np.float32)
+        self.peaks_db = np.full(channels, -120.0, dtype=np.float32)
+
+        self.last_seen = 0
+        self.running = False
+        self.worker = None
+
+    def set_sample_rate(self, sample_rate):
+        """Recompute the bin layout for a new stream rate."""
+        self.sample_rate = sample_rate
+        self.bin_edges, self.bin_starts = self.make_log_bins()
+        self.bin_centers = np.sqrt(self.bin_edges[:-1] * self.bin_edges[1:])
+
+    def make_log_bins(self):
+        """Return log-spaced band edges and the first FFT bin index of each band."""
+        nyquist = self.sample_rate / 2
+        edges = np.geomspace(self.min_freq, nyquist, self.num_bins + 1)
+        bin_hz = self.sample_rate / self.fft_size
+        # Narrow low bands that map onto the same FFT bin simply repeat that bin's value
+        starts = np.clip(np.round(edges[:-1] / bin_hz).astype(np.intp), 1, self.fft_size // 2 - 1)
+        return edges, starts
+
+    def push(self, block):
+        """Called from the audio callback with a (frames, channels) block. Never blocks."""
+        self.ring.write(block)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.worker = threading.Thread(target=self.run, name="SpectrumAnalyzer", daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        self.running = False
+        if self.worker is not None:
+            self.worker.join(timeout=1.0)
+            self.worker = None
+
+    def run(self):
+        """Worker loop: analyze at most max_fps times per second, and only when new audio arrived."""
+        interval = 1.0 / self.max_fps
+        next_frame = time.perf_counter()
+        while self.running:
+            now = time.perf_counter()
+            if now < next_frame:
+                time.sleep(next_frame - now)
+            next_frame += interval
+            if next_frame < time.perf_counter():
+                next_frame = time.perf_counter() + interval  # Skip frames instead of catching up
+            if self.ring.total_written == self.last_seen:
+                continue
+            self.analyze()
+
+    def analyze(self):
+        """Compute one spectrum frame from the newest fft_size frames."""
+        self.last_seen = self.ring.read_latest(self.frame)
+        frame = self.frame
+        scale = 1.0 / self.full_scale
+
+        peaks = np.max(np.abs(frame), axis=0) * scale
+        rms = np.sqrt(np.mean(np.square(frame), axis=0)) * scale
+        self.levels_db = (20 * np.log10(np.maximum(rms, 1e-6))).astype(np.float32)
+        self.peaks_db = (20 * np.log10(np.maximum(peaks, 1e-6))).astype(np.float32)
+
+        np.mean(frame, axis=1, out=self.mono)
+        self.mono *= self.window
+        # scipy.fft keeps its plan cache across calls for a fixed size
+        power = np.abs(sp_fft.rfft(self.mono, overwrite_x=True)) * (self.window_gain * scale)
+        np.square(power, out=power)
+
+        # Peak bin per log band, one vectorized reduction
+        band_power = np.maximum.reduceat(power[:self.fft_size // 2], self.bin_starts)
+        band_db = 10 * np.log10(np.maximum(band_power, 1e-12))
+        # Let bars fall at decay_db per frame rather than jumping down
+        self.spectrum_db = np.maximum(band_db, self.spectrum_db - self.decay_db).astype(np.float32)
+
+    def latest(self):
+        """Return (bin_centers, spectrum_db, levels_db, peaks_db) for painting."""
+        return self.bin_centers, self.spectrum_db, self.levels_db, self.peaks_db
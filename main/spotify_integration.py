@@ -3,7 +3,10 @@ from spotipy.oauth2 import SpotifyOAuth, SpotifyClientCredentials
 import os
 import pickle
 import sys
+import threading
+from collections import Counter
 from dotenv import load_dotenv
+from now_playing import NowPlayingSource
 
 load_dotenv()
 
@@ -16,21 +19,32 @@ def get_resource_path(relative_path):
         return os.path.join(sys._MEIPASS, relative_path)
     return os.path.join(os.path.abspath("."), relative_path)
 
-class SpotifyIntegration:
+class SpotifyIntegration(NowPlayingSource):
+    """Spotify Web API client: the polled now-playing source, plus genre lookups for every source."""
+
+    name = "spotify"
+
     def __init__(self):
         self.spotify_oauth = SpotifyOAuth(
             client_id=os.getenv("SPOTIFY_CLIENT_ID"),
             client_secret=os.getenv("SPOTIFY_CLIENT_SECRET"),
             redirect_uri=os.getenv("SPOTIFY_REDIRECT_URI"),
-            scope="user-read-currently-playing"
+            # Playback state is needed to read the queue for prefetching
+            scope="user-read-currently-playing user-read-playback-state"
         )
         self.token = None
         self.spotify = None
         self.auth_manager = SpotifyClientCredentials(os.getenv("SPOTIFY_CLIENT_ID"), os.getenv("SPOTIFY_CLIENT_SECRET"))
         self.sp = spotipy.Spotify(auth_manager=self.auth_manager)
 
-        # Initialize genre model as None
+        # Initialize genre model and sub-genre index as None; both load on first use
         self.genre_model = None
+        self.taxonomy = None
+        self.taxonomy_lock = threading.Lock()  # The prefetcher resolves genres on its own thread
+        # Classifier that keeps learning from manual assignments, loaded in the background on first use
+        self.online_model = None
+        self.online_model_loader = None
+        self.online_model_lock = threading.Lock()
 
         # Automatically log in
         self.auto_log_in()
@@ -49,6 +63,96 @@ class SpotifyIntegration:
             with open(get_resource_path("./genre/genre_model.pkl"), "rb") as file:
                 self.genre_model = pickle.load(file)
 
+    def load_online_model(self, wait=False):
+        """
+        Start loading the online genre model on a worker thread; bootstrapping
+        it takes over a second, so callers don't wait unless `wait` is set.
+        Until it is ready, predictions fall back to the static model.
+        """
+        with self.online_model_lock:
+            if self.online_model_loader is None:
+                self.online_model_loader = threading.Thread(target=self.build_online_model,
+                                                            name="LoadGenreModel", daemon=True)
+                self.online_model_loader.start()
+            loader = self.online_model_loader
+        if wait:
+            loader.join()
+
+    def build_online_model(self):
+        """Load (or bootstrap) the online genre model and start its update thread."""
+        from online_model import OnlineGenreModel
+        model = OnlineGenreModel(get_resource_path("./genre/dataset.json"),
+                                 get_resource_path("./genre/online_model.pkl.gz"))
+        try:
+            model.load()
+        except Exception as e:
+            print(f"Error loading online genre model: {e}")
+            self.online_model = False  # Fall back to the static model
+            return
+        model.start()
+        self.online_model = model
+
+    def learn_genre(self, artist_name, genre):
+        """
+        Teach the online model a manual assignment. The Spotify lookup and the
+        model update both happen off the calling thread.
+        """
+        def learn():
+            sub_genres = self.get_genres_for_song(artist_name)
+            if not sub_genres or not isinstance(sub_genres, list):
+                return
+            self.load_online_model(wait=True)
+            if self.online_model:
+                self.online_model.learn(sub_genres, genre)
+        threading.Thread(target=learn, name="LearnGenre", daemon=True).start()
+
+    def close(self):
+        """Stop the online model, writing a final checkpoint if it learned anything."""
+        if self.online_model_loader is not None:
+            self.online_model_loader.join()
+        if self.online_model:
+            self.online_model.stop()
+
+    def load_taxonomy(self):
+        """Open the sub-genre index only when needed, building it from the genre list if required."""
+        with self.taxonomy_lock:
+            if self.taxonomy is not None:
+                return
+            from taxonomy import load_index
+            # GENRE_TAXONOMY can point at a larger {broad genre: [sub-genres]} list
+            dataset_path = get_resource_path(os.getenv("GENRE_TAXONOMY", "./genre/dataset.json"))
+            try:
+                self.taxonomy = load_index(dataset_path, os.path.splitext(dataset_path)[0] + ".idx")
+            except Exception as e:
+                print(f"Error loading genre taxonomy: {e}")
+                self.taxonomy = False  # Don't retry; the classifier still works
+
+    def taxonomy_votes(self, sub_genres):
+        """Counter of the broad genres of the sub-genres found (exactly or fuzzily) in the index."""
+        self.load_taxonomy()
+        votes = Counter()
+        if not self.taxonomy or not isinstance(sub_genres, list):
+            return votes
+        for sub_genre in sub_genres:
+            broad_genre = self.taxonomy.lookup(sub_genre)
+            if broad_genre is not None:
+                votes[broad_genre] += 1
+        return votes
+
+    def taught_genre(self, sub_genres):
+        """Broad genre the user assigned to these sub-genres through the online model, or None."""
+        self.load_online_model()
+        if not self.online_model or not isinstance(sub_genres, list):
+            return None
+        return self.online_model.taught_genre(sub_genres)
+
+    def match_taxonomy(self, sub_genres):
+        """Majority broad genre of the sub-genres found (exactly or fuzzily) in the index, or None."""
+        votes = self.taxonomy_votes(sub_genres)
+        if not votes:
+            return None
+        return votes.most_common(1)[0][0]
+
     def refresh_login(self):
         """Refresh the Spotify login token."""
         try:
@@ -59,19 +163,46 @@ class SpotifyIntegration:
 
     def get_current_song(self):
         """Fetch the current song title and artist."""
+        track = self.get_current_track()
+        if track:
+            return f"{track['name']} by {track['artist']}"
+        return None
+
+    def get_current_track(self):
+        """Fetch the current track as a dict with id, name, artist, progress_ms and duration_ms."""
         self.refresh_login()
         if not self.spotify:
             return None
         try:
             current_playback = self.spotify.currently_playing()
             if current_playback and current_playback.get("item"):
-                song_name = current_playback["item"]["name"]
-                artist_name = current_playback["item"]["artists"][0]["name"]
-                return f"{song_name} by {artist_name}"
+                return self.track_info(current_playback["item"], current_playback.get("progress_ms") or 0)
             return None
         except Exception as e:
             print(f"Error fetching current song: {e}")
             return None
+
+    def get_queue(self, limit=2):
+        """Fetch up to `limit` upcoming tracks from the playback queue."""
+        if not self.spotify:
+            return []
+        try:
+            queue = self.spotify.queue() or {}
+        except Exception as e:
+            print(f"Error fetching playback queue: {e}")
+            return []
+        # Podcast episodes in the queue have no artists
+        items = [item for item in queue.get("queue", []) if item and item.get("artists")]
+        return [self.track_info(item) for item in items[:limit]]
+
+    def track_info(self, item, progress_ms=0):
+        return {
+            "id": item["id"],
+            "name": item["name"],
+            "artist": item["artists"][0]["name"],
+            "progress_ms": progress_ms,
+            "duration_ms": item.get("duration_ms") or 0,
+        }
         
     def get_genres_for_song(self, artist_name):
         """
@@ -92,13 +223,57 @@ class SpotifyIntegration:
         except Exception as e:
             return f"An error occurred: {str(e)}"
 
+    def genre_probabilities(self, sub_genres):
+        """
+        {broad genre: probability} for the sub-genres, from the same sources as
+        predict_broad_genre in the same order: a taught assignment (certain),
+        the taxonomy's vote shares, the online model, then the static model.
+        None if none of them can tell.
+        """
+        if not sub_genres or not isinstance(sub_genres, list):
+            return None
+        taught = self.taught_genre(sub_genres)
+        if taught is not None:
+            return {taught: 1.0}
+        votes = self.taxonomy_votes(sub_genres)
+        if votes:
+            total = sum(votes.values())
+            return {genre: count / total for genre, count in votes.items()}
+        self.load_online_model()
+        if self.online_model:
+            try:
+                return self.online_model.predict_proba(sub_genres)
+            except Exception as e:
+                print(f"Error predicting with online genre model: {e}")
+        self.load_genre_model()
+        try:
+            probabilities = self.genre_model.predict_proba([" ".join(sub_genres)])[0]
+            return dict(zip(map(str, self.genre_model.classes_), probabilities.tolist()))
+        except Exception as e:
+            print(f"Error predicting broad genre: {e}")
+            return None
+
     def predict_broad_genre(self, sub_genres):
         """
-        Predict the broad genre using the trained model based on sub-genres.
+        Predict the broad genre from sub-genres: a manual assignment taught for
+        any of them first, then the taxonomy index, then the online model that
+        learns from assignments, then the static trained model.
         """
-        self.load_genre_model()  # Load the model only when needed
         if not sub_genres:
             return "Unknown"
+        broad_genre = self.taught_genre(sub_genres)
+        if broad_genre is not None:
+            return broad_genre
+        broad_genre = self.match_taxonomy(sub_genres)
+        if broad_genre is not None:
+            return broad_genre
+        self.load_online_model()
+        if self.online_model and isinstance(sub_genres, list):
+            try:
+                return self.online_model.predict(sub_genres)
+            except Exception as e:
+                print(f"Error predicting with online genre model: {e}")
+        self.load_genre_model()  # Load the model only when needed
         try:
             combined_text = " ".join(sub_genres)
             return self.genre_model.predict([combined_text])[0]
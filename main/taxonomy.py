@@ -0,0 +1,206 @@
+"""
+Sub-genre taxonomy index: maps Spotify sub-genres to broad genres by exact or
+fuzzy lookup, so most songs never reach the TF-IDF classifier.
+
+The index is built once from a JSON file shaped like genre/dataset.json
+({"Broad": ["sub-genre", ...], ...}) and stored as a single file of flat
+arrays that is memory-mapped on load:
+
+- names: sorted, normalized sub-genres as fixed-width bytes (binary search),
+- labels: broad genre id per name,
+- trigram keys, offsets and postings: an inverted index of character
+  trigrams used to find fuzzy candidates, ranked by trigram overlap (Dice)
+  and then by edit distance.
+
+The index lives next to the dataset with an .idx extension (genre/dataset.idx),
+where SpotifyIntegration looks for it. Rebuild explicitly with:
+    python taxonomy.py genre/dataset.json
+"""
+import json
+import os
+import struct
+import sys
+import numpy as np
+
+MAGIC = b"AEQTAX01"
+
+
+def normalize(name):
+    return " ".join(name.lower().replace("-", " ").replace("&", " and ").split())
+
+
+def trigrams(name):
+    """Integer codes of the byte trigrams of a normalized name, padded so short names still have some."""
+    data = b"  " + name.encode() + b" "
+    codes = {(data[i] << 16) | (data[i + 1] << 8) | data[i + 2] for i in range(len(data) - 2)}
+    return np.array(sorted(codes), dtype=np.uint32)
+
+
+def edit_distance(a, b):
+    """Levenshtein distance, bit-parallel over the characters of `a` (Myers/Hyyro)."""
+    if not a or not b:
+        return len(a) + len(b)
+    masks = {}
+    for i, char in enumerate(a):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    positive, negative, score = full, 0, len(a)
+    for char in b:
+        match = masks.get(char, 0)
+        vertical = match | negative
+        horizontal = (((match & positive) + positive) ^ positive) | match
+        horizontal_positive = negative | ~(horizontal | positive)
+        horizontal_negative = positive & horizontal
+        if horizontal_positive & last:
+            score += 1
+        elif horizontal_negative & last:
+            score -= 1
+        horizontal_positive = (horizontal_positive << 1) | 1
+        horizontal_negative <<= 1
+        positive = (horizontal_negative | ~(vertical | horizontal_positive)) & full
+        negative = horizontal_positive & vertical & full
+    return score
+
+
+def build_index(dataset_path, index_path):
+    """Build an index file from a {broad genre: [sub-genres]} JSON file."""
+    with open(dataset_path, "r") as file:
+        dataset = json.load(file)
+    genres = list(dataset.keys())
+    entries = {}
+    for label, broad_genre in enumerate(genres):
+        for sub_genre in dataset[broad_genre]:
+            entries.setdefault(normalize(sub_genre), label)  # First broad genre wins on duplicates
+    names = sorted(entries)
+    width = max(len(name.encode()) for name in names)
+    name_array = np.array([name.encode() for name in names], dtype=f"S{width}")
+    labels = np.array([entries[name] for name in names], dtype=np.uint16)
+    trigram_counts = np.array([len(trigrams(name)) for name in names], dtype=np.uint16)
+
+    # Inverted trigram index in CSR form: keys -> postings[offsets[i]:offsets[i + 1]]
+    pairs = [(code, i) for i, name in enumerate(names) for code in trigrams(name)]
+    pairs.sort()
+    keys, starts = np.unique(np.array([code for code, _ in pairs], dtype=np.uint32), return_index=True)
+    offsets = np.append(starts, len(pairs)).astype(np.int64)
+    postings = np.array([i for _, i in pairs], dtype=np.int32)
+
+    arrays = {"names": name_array, "labels": labels, "trigram_counts": trigram_counts,
+              "keys": keys, "offsets": offsets, "postings": postings}
+    header = {"genres": genres, "arrays": {}}
+    position = 0
+    for key, array in arrays.items():
+        header["arrays"][key] = {"dtype": array.dtype.str, "shape": array.shape, "offset": position}
+        position += (array.nbytes + 7) // 8 * 8
+    header_bytes = json.dumps(header).encode()
+    data_start = (len(MAGIC) + 4 + len(header_bytes) + 7) // 8 * 8
+
+    # Write beside the target and rename, so readers never map a half-written index
+    with open(index_path + ".tmp", "wb") as file:
+        file.write(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes)
+        for key, array in arrays.items():
+            file.seek(data_start + header["arrays"][key]["offset"])
+            file.write(array.tobytes())
+        file.truncate(data_start + position)
+    os.replace(index_path + ".tmp", index_path)
+
+
+class TaxonomyIndex:
+    """Memory-mapped sub-genre index; see the module docstring for the layout."""
+
+    def __init__(self, index_path):
+        with open(index_path, "rb") as file:
+            prefix = file.read(len(MAGIC) + 4)
+            if prefix[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{index_path} is not a taxonomy index")
+            header_size = struct.unpack("<I", prefix[len(MAGIC):])[0]
+            header = json.loads(file.read(header_size))
+        data_start = (len(MAGIC) + 4 + header_size + 7) // 8 * 8
+        self.genres = header["genres"]
+        for key, spec in header["arrays"].items():
+            array = np.memmap(index_path, dtype=np.dtype(spec["dtype"]), mode="r",
+                              offset=data_start + spec["offset"], shape=tuple(spec["shape"]))
+            # Plain ndarray views of the mapping; indexing a memmap subclass is much slower
+            setattr(self, key, np.asarray(array))
+        self.width = self.names.dtype.itemsize
+        self.cache = {}  # Recent lookups; Spotify repeats the same sub-genres constantly
+
+    def __len__(self):
+        return len(self.names)
+
+    def exact(self, sub_genre):
+        """Broad genre of an exactly matching (normalized) sub-genre, or None."""
+        key = normalize(sub_genre).encode()
+        if len(key) > self.width:
+            return None
+        i = np.searchsorted(self.names, key)
+        if i < len(self.names) and self.names[i] == key:
+            return self.genres[self.labels[i]]
+        return None
+
+    def fuzzy(self, sub_genre, min_similarity=0.75, candidates=4):
+        """
+        (broad genre, matched name, similarity) for the closest sub-genre, or None.
+
+        Candidates are the names with the highest trigram Dice score against the
+        query; the best is chosen by edit distance, with similarity
+        1 - distance / length.
+        """
+        name = normalize(sub_genre)
+        codes = trigrams(name)
+        slots = np.searchsorted(self.keys, codes)
+        found = slots < len(self.keys)
+        slots = slots[found]
+        slots = slots[self.keys[slots] == codes[found]]
+        if len(slots) == 0:
+            return None
+        # Gather all posting lists in one vectorized step
+        starts = self.offsets[slots]
+        lengths = self.offsets[slots + 1] - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        ids, shared = np.unique(self.postings[positions], return_counts=True)
+        dice = 2 * shared / (len(codes) + self.trigram_counts[ids])
+        top = ids[np.argsort(-dice, kind="stable")[:candidates]]
+
+        best = None
+        for i in top:
+            candidate = self.names[i].decode()
+            longest = max(len(name), len(candidate))
+            # The length difference alone bounds the distance from below
+            if best is not None and 1 - abs(len(name) - len(candidate)) / longest <= best[2]:
+                continue
+            similarity = 1 - edit_distance(name, candidate) / longest
+            if best is None or similarity > best[2]:
+                best = (self.genres[self.labels[i]], candidate, similarity)
+        if best[2] < min_similarity:
+            return None
+        return best
+
+    def lookup(self, sub_genre, min_similarity=0.75):
+        """Broad genre for a sub-genre, exact first, then fuzzy; None if nothing is close enough."""
+        key = (sub_genre, min_similarity)
+        if key in self.cache:
+            return self.cache[key]
+        genre = self.exact(sub_genre)
+        if genre is None:
+            match = self.fuzzy(sub_genre, min_similarity)
+            genre = match[0] if match else None
+        if len(self.cache) >= 4096:
+            self.cache.pop(next(iter(self.cache)), None)
+        self.cache[key] = genre
+        return genre
+
+
+def load_index(dataset_path, index_path):
+    """Open the index, (re)building it first if it is missing or older than the dataset."""
+    if not os.path.exists(index_path) or os.path.getmtime(index_path) < os.path.getmtime(dataset_path):
+        build_index(dataset_path, index_path)
+    return TaxonomyIndex(index_path)
+
+
+if __name__ == "__main__":
+    dataset_path = sys.argv[1] if len(sys.argv) > 1 else "genre/dataset.json"
+    index_path = sys.argv[2] if len(sys.argv) > 2 else os.path.splitext(dataset_path)[0] + ".idx"
+    build_index(dataset_path, index_path)
+    index = TaxonomyIndex(index_path)
+    print(f"Indexed {len(index)} sub-genres in {len(index.genres)} broad genres to {index_path}")
@@ -0,0 +1,110 @@
+"""
+MprisSource against FakePlayer on a real session bus. Skipped without jeepney
+or a session bus; for a private bus, run from the main/ directory with:
+    dbus-run-session -- python -m unittest tests.test_now_playing
+"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from now_playing import FakePlayer, MprisSource
+
+try:
+    import jeepney  # noqa: F401
+except ImportError:
+    jeepney = None
+
+TIMEOUT = 5.0
+
+
+@unittest.skipUnless(jeepney is not None and os.getenv("DBUS_SESSION_BUS_ADDRESS"),
+                     "needs jeepney and a D-Bus session bus")
+class MprisSourceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.players = []
+        self.sources = []
+
+    def tearDown(self):
+        for source in self.sources:
+            source.stop()
+        for player in self.players:
+            player.close()
+
+    def start_source(self, player=None):
+        source = MprisSource(player)
+        changed = threading.Event()
+        source.start(changed.set)
+        self.sources.append(source)
+        return source, changed
+
+    def fake_player(self, name):
+        player = FakePlayer(name)
+        self.players.append(player)
+        return player
+
+    def wait_for(self, changed, condition):
+        """Wait for `condition` to hold, re-checking after every change the source reports."""
+        deadline = time.perf_counter() + TIMEOUT
+        while not condition():
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                self.fail("timed out waiting for the MPRIS source")
+            changed.wait(remaining)
+            changed.clear()
+
+    def test_track_change(self):
+        source, changed = self.start_source()
+        player = self.fake_player("autoeq_test_change")
+        player.play(1, "One More Time", "Daft Punk")
+        self.wait_for(changed, lambda: source.get_current_track() is not None)
+        self.assertEqual(source.get_current_track()["name"], "One More Time")
+
+        player.play(2, "So What", "Miles Davis", length_s=60.0)
+        self.wait_for(changed, lambda: source.get_current_track()["name"] == "So What")
+        track = source.get_current_track()
+        self.assertEqual(track["artist"], "Miles Davis")
+        self.assertEqual(track["id"], "/org/autoeq/fake/2")
+        self.assertEqual(track["duration_ms"], 60000)
+        self.assertLess(track["progress_ms"], 60000)
+
+    def test_player_removed(self):
+        source, changed = self.start_source()
+        player = self.fake_player("autoeq_test_removed")
+        player.play(1, "One", "Metallica")
+        self.wait_for(changed, lambda: source.get_current_track() is not None)
+
+        player.close()
+        self.players.remove(player)
+        # NameOwnerChanged with an empty new owner drops the player
+        self.wait_for(changed, lambda: source.get_current_track() is None)
+        self.assertEqual(source.players, {})
+
+    def test_player_filter(self):
+        source, changed = self.start_source("Wanted")
+        other = self.fake_player("autoeq_test_other")
+        wanted = self.fake_player("autoeq_test_wanted")
+        other.play(1, "One", "Metallica")
+        wanted.play(2, "So What", "Miles Davis")
+        self.wait_for(changed, lambda: source.get_current_track() is not None)
+        # The other player's signal went out first, so it has been seen (and ignored) by now
+        self.assertEqual(source.get_current_track()["artist"], "Miles Davis")
+        self.assertEqual([player.bus_name for player in source.players.values()], [wanted.bus_name])
+
+    def test_stop_unblocks_worker(self):
+        source, _ = self.start_source()
+        self.sources.remove(source)
+        worker = source.worker
+        self.assertTrue(worker.is_alive())
+        start = time.perf_counter()
+        source.stop()
+        self.assertFalse(worker.is_alive())
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
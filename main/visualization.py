@@ -0,0 +1,97 @@
+import numpy as np
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtCore import Qt, QTimer, QRectF
+from PyQt5.QtGui import QPainter, QPainterPath, QColor, QPen
+
+
+class SpectrumWidget(QWidget):
+    """
+    Paints the arrays published by a SpectrumAnalyzer. No DSP happens here:
+    the timer only fetches the latest precomputed frame and repaints.
+    """
+
+    def __init__(self, analyzer, fps=30, floor_db=-90.0, parent=None):
+        super().__init__(parent)
+        self.analyzer = analyzer
+        self.floor_db = floor_db
+        self.setMinimumHeight(120)
+        self.spectrum_db = None
+        self.levels_db = None
+        self.peaks_db = None
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.refresh_timer.start(int(1000 / fps))
+
+    def refresh(self):
+        _, self.spectrum_db, self.levels_db, self.peaks_db = self.analyzer.latest()
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#1e1e1e"))
+        if self.spectrum_db is None:
+            return
+
+        meter_width = 12 * len(self.levels_db)
+        width = self.width() - meter_width - 8
+        height = self.height()
+
+        # Spectrum bars
+        count = len(self.spectrum_db)
+        bar_width = width / count
+        heights = np.clip(1.0 - self.spectrum_db / self.floor_db, 0.0, 1.0) * height
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor("#3498db"))
+        for i, bar_height in enumerate(heights):
+            painter.drawRect(QRectF(i * bar_width, height - bar_height, bar_width - 1, bar_height))
+
+        # Per-channel RMS level with a peak marker
+        levels = np.clip(1.0 - self.levels_db / self.floor_db, 0.0, 1.0) * height
+        peaks = np.clip(1.0 - self.peaks_db / self.floor_db, 0.0, 1.0) * height
+        x = width + 8
+        for level, peak in zip(levels, peaks):
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(QColor("#2ecc71"))
+            painter.drawRect(QRectF(x, height - level, 10, level))
+            painter.setPen(QPen(QColor("#e74c3c"), 2))
+            painter.drawLine(int(x), int(height - peak), int(x + 10), int(height - peak))
+            x += 12
+
+
+class ResponseCurveWidget(QWidget):
+    """
+    Paints the combined EQ magnitude response held by a ResponseCurve.
+    Repaints are requested by the owner whenever a band changes.
+    """
+
+    def __init__(self, response_curve, range_db=15.0, parent=None):
+        super().__init__(parent)
+        self.response_curve = response_curve
+        self.range_db = range_db
+        self.setMinimumHeight(120)
+        freqs = response_curve.freqs
+        # x positions on a log axis only depend on the grid, so compute them once
+        log_freqs = np.log10(freqs)
+        self.x_norm = (log_freqs - log_freqs[0]) / (log_freqs[-1] - log_freqs[0])
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), QColor("#1e1e1e"))
+        width = self.width()
+        height = self.height()
+
+        # 0 dB reference line
+        painter.setPen(QPen(QColor("#555555"), 1))
+        painter.drawLine(0, height // 2, width, height // 2)
+
+        xs = self.x_norm * width
+        ys = (0.5 - np.clip(self.response_curve.total_db, -self.range_db, self.range_db)
+              / (2 * self.range_db)) * height
+        path = QPainterPath()
+        path.moveTo(xs[0], ys[0])
+        for x, y in zip(xs[1:], ys[1:]):
+            path.lineTo(x, y)
+        painter.setPen(QPen(QColor("#3498db"), 2))
+        painter.drawPath(path)
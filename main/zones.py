@@ -0,0 +1,429 @@
+import os
+import threading
+import time
+from functools import partial
+import numpy as np
+from eq_engine import CoefficientCache, create_engine
+from limiter import Limiter
+from audio_backend import create_backend
+from capture import CaptureWriter, capture_path
+from loudness import LoudnessMatcher
+from correction import CorrectionStage, apply_corrections_from_env
+from spectral_eq import LongTermSpectrum, spectral_eq_enabled
+
+
+def parse_zones(text):
+    """
+    Parse an AUDIO_ZONES value such as "Desk=CABLE Output A>Headphones;Patio=CABLE Output B>Speakers"
+    into (name, input_keywords, output_keywords) tuples. Keywords are comma-separated as in
+    AUDIO_INPUT_DEVICE / AUDIO_OUTPUT_DEVICE.
+    """
+    zones = []
+    for entry in text.split(";"):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, _, devices = entry.partition("=")
+        input_part, _, output_part = devices.partition(">")
+        if not output_part:
+            raise ValueError(f"Zone '{name.strip()}' needs devices as input>output")
+        zones.append((name.strip(), input_part.split(","), output_part.split(",")))
+    return zones
+
+
+def zone_specs_from_env():
+    """Zones from AUDIO_ZONES, or a single "Main" zone on AUDIO_INPUT_DEVICE / AUDIO_OUTPUT_DEVICE."""
+    zones = os.getenv("AUDIO_ZONES")
+    if zones:
+        return parse_zones(zones)
+    # Device keywords (or indices) can be overridden in .env
+    input_keywords = os.getenv("AUDIO_INPUT_DEVICE", "CABLE Output - TEST").split(",")
+    output_keywords = os.getenv("AUDIO_OUTPUT_DEVICE", "Headphones,Speakers").split(",")
+    return [("Main", input_keywords, output_keywords)]
+
+
+class Zone:
+    """
+    One input/output device pair with its own EQ gains, device correction,
+    filter state, limiter and stream. Zones share the coefficient cache, so zones on the same preset
+    and rate use the same designed sections.
+    """
+
+    def __init__(self, name, backend, bands, input_keywords, output_keywords, cache,
+                 engine_name="cascade", engine_options=None):
+        self.name = name
+        self.backend = backend
+        self.input_keywords = input_keywords
+        self.output_keywords = output_keywords
+        self.engine = create_engine(engine_name, bands, sample_rate=44100, channels=2, cache=cache,
+                                    **(engine_options or {}))
+        # Headphone/speaker correction stacked after the genre EQ (CORRECTION_PROFILE)
+        self.correction = CorrectionStage(sample_rate=44100, channels=2)
+        # Look-ahead limiter after the cascade keeps boosts from clipping
+        self.limiter = Limiter(sample_rate=44100, channels=2, full_scale=1.0)
+        # Meters loudness before and after the EQ; with LOUDNESS_MATCH=1 it also evens it out between presets
+        self.loudness = LoudnessMatcher(sample_rate=44100, channels=2,
+                                        enabled=os.getenv("LOUDNESS_MATCH", "0") == "1")
+        # Long-term input spectrum for AUTO_EQ_MODE=spectrum
+        self.spectrum = None
+        if spectral_eq_enabled():
+            self.spectrum = LongTermSpectrum(bands, sample_rate=44100, channels=2,
+                                             time_constant=float(os.getenv("AUTO_EQ_TIME", "30")))
+        self.enabled = True
+        self.bypassed = False  # Whether the last block skipped the EQ
+        self.preset = "Flat"
+        # AUDIO_BLOCKSIZE=auto starts at 1024 frames and lets BlockSizeController resize the stream
+        blocksize = os.getenv("AUDIO_BLOCKSIZE", "1024")
+        self.adaptive = blocksize == "auto"
+        self.blocksize = 1024 if self.adaptive else int(blocksize)
+        self.stream_config = None  # Devices and rates of the open stream, reused when resizing it
+        self.stream_open = False  # Whether start_stream succeeded; ZoneManager retries the zones that failed
+        self.callback_lock = threading.Lock()  # Only contended while two streams hand over
+        # Spectrum analyzer and response curve, attached only while this zone is shown
+        self.analyzer = None
+        self.response_curve = None
+        self.display_rate = None  # Rate the displays are set to; they only change on the GUI thread
+        # CaptureWriter while callback traffic is being recorded
+        self.recorder = None
+        self.recorded_state = None
+
+    def set_gains(self, gains):
+        self.engine.set_gains(gains)
+
+    def gains(self):
+        return [int(gain) for gain in self.engine.settings.gains]
+
+    def set_correction(self, profile):
+        """Apply a correction profile from correction.fit_profile (None removes it)."""
+        self.correction.set_profile(profile)
+        if profile:
+            print(f"[{self.name}] Correction '{profile['name']}': {len(profile['bands'])} bands, "
+                  f"preamp {profile['preamp_db']:.1f} dB, fit error {profile['error_db']:.2f} dB")
+
+    def prepare(self, gains):
+        """Design (and cache) the coefficients for `gains` ahead of use."""
+        self.engine.prepare(gains)
+
+    def spectrum_levels(self):
+        """Long-term input level per band in dB, or None (not enabled or not enough audio yet)."""
+        return None if self.spectrum is None else self.spectrum.band_levels()
+
+    def attach_display(self, analyzer, response_curve):
+        """Feed `analyzer` from this zone's output and keep both at this zone's rate (None to detach)."""
+        if analyzer is not None:
+            self.display_rate = self.engine.sample_rate
+            analyzer.set_sample_rate(self.display_rate)
+            response_curve.set_sample_rate(self.display_rate)
+        self.response_curve = response_curve
+        self.analyzer = analyzer
+
+    def start_capture(self, path):
+        self.recorded_state = None
+        self.recorder = CaptureWriter(path, channels=2, max_bytes=int(os.getenv("AUDIO_CAPTURE_MB", "256")) << 20)
+        print(f"[{self.name}] Capturing callback traffic to {path}")
+
+    def stop_capture(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.close()
+
+    def snapshot(self):
+        """Copy of the filter, limiter and loudness state, for restore()."""
+        return {
+            "engine": type(self.engine).__name__,
+            "engine_state": self.engine.snapshot(),
+            "correction": self.correction.snapshot(),
+            "limiter": self.limiter.snapshot(),
+            "loudness": self.loudness.snapshot(),
+            "bypassed": self.bypassed,
+        }
+
+    def restore(self, state):
+        """Continue from a snapshot() taken at the same sample rate and parameters."""
+        if state["engine"] == type(self.engine).__name__:
+            self.engine.restore(state["engine_state"])  # Another engine's state doesn't fit; it starts from rest
+        self.correction.restore(state["correction"])
+        self.limiter.restore(state["limiter"])
+        self.loudness.restore(state["loudness"])
+        self.bypassed = state["bypassed"]
+
+    def record(self, recorder, indata, status):
+        """
+        Append the input block, preceded by the parameters whenever they changed.
+        The first parameters are followed by the processing state, so replay
+        continues from where the live output was instead of the live output
+        having to start from rest.
+        """
+        settings = self.engine.settings
+        correction = self.correction.state
+        if self.recorded_state != (settings, self.enabled, correction):
+            first = self.recorded_state is None
+            self.recorded_state = (settings, self.enabled, correction)
+            recorder.record_params({
+                "engine": type(self.engine).__name__,
+                "bands": [float(band) for band in self.engine.bands],
+                "Q": self.engine.Q,
+                "engine_options": self.engine.options(),
+                "sample_rate": self.engine.sample_rate,
+                "gains": [float(gain) for gain in settings.gains],
+                "enabled": self.enabled,
+                "correction": self.correction.profile,
+                "loudness_match": self.loudness.enabled,
+            })
+            if first:
+                recorder.record_state(self.snapshot())
+        recorder.record_block(indata, status)
+
+    def audio_callback(self, indata, outdata, status):
+        """Process audio data in real-time, writing the result into outdata."""
+        recorder = self.recorder
+        if recorder is not None:
+            self.record(recorder, indata, status)
+        spectrum = self.spectrum
+        if spectrum is not None:
+            spectrum.push(indata)
+        analyzer = self.analyzer
+        # Check if all gains are zero (with no correction) or if bypass mode is enabled. Engines
+        # with a processing delay keep it while flat, so flat gains still go through them.
+        flat = self.engine.is_flat() and not self.engine.latency() and self.correction.is_flat()
+        if not self.enabled or flat:
+            # Bypass the processing, but keep the limiter's look-ahead delay so toggling doesn't shift the audio
+            if not self.bypassed:
+                self.bypassed = True
+                # The filters stop here; their state would replay this audio when the EQ comes back
+                self.engine.reset()
+                self.correction.reset()
+            outdata[:] = self.limiter.bypass(indata)
+            self.loudness.gain = 1.0  # Ramp from unity when the EQ comes back
+            if analyzer is not None:
+                analyzer.push(outdata)
+            return
+
+        self.bypassed = False
+        # Both channels go through the cascade in a single pass
+        processed = self.correction.process(self.engine.process(indata))
+        # Per-setting loudness compensation goes before the limiter so boosts are still caught
+        self.loudness.process(indata, processed, self.engine.settings.gains.tobytes())
+        processed = self.limiter.process(processed)
+
+        # Clip the final output to full scale, straight into the output buffer
+        np.clip(processed, -1.0, 1.0, out=outdata)
+        if analyzer is not None:
+            analyzer.push(outdata)
+
+    def stream_callback(self, backend, indata, outdata, status):
+        """Backend callback: only the zone's current stream processes, an outgoing one plays silence."""
+        if backend is not self.backend:
+            outdata.fill(0.0)
+            return
+        with self.callback_lock:
+            self.audio_callback(indata, outdata, status)
+
+    def stream_latency(self):
+        """Suggested latency from AUDIO_LATENCY, or two blocks when the block size adapts."""
+        latency = os.getenv("AUDIO_LATENCY")
+        if latency is None:
+            return 2 * self.blocksize / self.engine.sample_rate if self.adaptive else None
+        if latency not in ("low", "high"):
+            latency = float(latency)
+        return latency
+
+    def start_stream(self):
+        """Open this zone's stream on its configured devices."""
+        input_device_index = self.backend.find_device(self.input_keywords, kind="input")
+        if input_device_index is not None:
+            print(f"[{self.name}] Selected Input Device: Index {input_device_index}")
+
+        output_device_index = self.backend.find_device(self.output_keywords, kind="output")
+        if output_device_index is None:
+            raise ValueError(f"No suitable output device found for zone '{self.name}'.")
+        print(f"[{self.name}] Selected Output Device: Index {output_device_index}")
+
+        # Run at the output device's native rate unless one is forced in .env
+        forced_rate = os.getenv("AUDIO_SAMPLE_RATE")
+        if forced_rate:
+            sample_rate = input_rate = int(forced_rate)
+        else:
+            sample_rate = self.backend.device_rate(output_device_index) or 44100
+            input_rate = sample_rate
+            if input_device_index is not None:
+                input_rate = self.backend.device_rate(input_device_index) or sample_rate
+        self.set_sample_rate(sample_rate)
+
+        self.stream_config = {
+            "sample_rate": sample_rate,
+            "channels": 2,  # Stereo audio
+            "input_device": input_device_index,
+            "output_device": output_device_index,
+            "input_rate": input_rate,
+        }
+        self.backend.open(partial(self.stream_callback, self.backend), blocksize=self.blocksize,
+                          latency=self.stream_latency(), **self.stream_config)
+        self.backend.start()
+        self.stream_open = True
+
+    def resize_stream(self, blocksize):
+        """
+        Move the running stream to another block size. The new stream is started
+        (playing silence) before the callback is handed over and the old one is
+        closed, so on shared-mode devices there is no gap; EQ, limiter and meter
+        state carry over since none of them depend on the block size. Devices
+        that allow only one stream are reopened in place instead.
+        """
+        if self.stream_config is None:
+            return
+        old = self.backend
+        self.blocksize = blocksize
+        new = old.share()
+        new.stats.histogram = old.stats.histogram  # Timing diagnostics carry over
+        try:
+            new.open(partial(self.stream_callback, new), blocksize=blocksize,
+                     latency=self.stream_latency(), **self.stream_config)
+            new.start()
+        except Exception as e:
+            print(f"[{self.name}] Could not open a second stream ({e}); reopening in place")
+            new.close()
+            old.close()
+            old.open(partial(self.stream_callback, old), blocksize=blocksize,
+                     latency=self.stream_latency(), **self.stream_config)
+            old.start()
+            return
+        self.backend = new
+        old.close()
+
+    def set_sample_rate(self, sample_rate):
+        """Retune every rate-dependent stage; EQ coefficients come from the per-rate cache."""
+        if sample_rate == self.engine.sample_rate:
+            return
+        print(f"[{self.name}] Processing at {sample_rate} Hz")
+        self.engine.set_sample_rate(sample_rate)
+        self.correction.set_sample_rate(sample_rate)
+        self.limiter.set_sample_rate(sample_rate)
+        self.loudness.set_sample_rate(sample_rate)
+        if self.spectrum is not None:
+            self.spectrum.set_sample_rate(sample_rate)
+        # The displays belong to the GUI thread, which picks up the new rate in stats()
+
+    def stats(self):
+        """
+        Callback timing against the deadline for this zone's stream. Called on
+        the GUI thread, it also moves the attached displays to a new stream rate.
+        """
+        analyzer, response_curve = self.analyzer, self.response_curve
+        rate = self.engine.sample_rate
+        if analyzer is not None and rate != self.display_rate:
+            self.display_rate = rate
+            analyzer.set_sample_rate(rate)
+            response_curve.set_sample_rate(rate)
+        summary = self.backend.stats.summary()
+        summary["zone"] = self.name
+        summary["sample_rate"] = self.engine.sample_rate
+        summary["blocksize"] = self.blocksize
+        summary["open"] = self.stream_open
+        summary["loudness"] = self.loudness.summary()
+        summary["correction"] = self.correction.profile["name"] if self.correction.profile else None
+        return summary
+
+
+class ZoneManager:
+    """
+    Runs several zones in one process. Besides Qt, scipy and the Spotify
+    session, zones share one coefficient cache and one host API handle, so
+    each extra zone only adds its stream, filter state and limiter.
+    """
+
+    def __init__(self, bands, specs, backend_name="pyaudio", engine_name="cascade"):
+        self.cache = CoefficientCache()
+        self.backend = create_backend(backend_name)
+        self.lock = threading.Lock()
+        self.zones = []
+        for i, (name, input_keywords, output_keywords) in enumerate(specs):
+            backend = self.backend if i == 0 else self.backend.share()
+            self.zones.append(Zone(name, backend, bands, input_keywords, output_keywords,
+                                   self.cache, engine_name))
+        apply_corrections_from_env(self.zones)
+
+    def start(self):
+        """Open every zone's stream; a zone whose devices are missing is skipped (see retry_failed)."""
+        for zone in self.zones:
+            self.start_zone(zone)
+            if zone.spectrum is not None:
+                zone.spectrum.start()
+
+    def start_zone(self, zone):
+        """Open one zone's stream; returns whether it opened."""
+        try:
+            zone.start_stream()
+            return True
+        except Exception as e:
+            zone.stream_open = False
+            zone.backend.close()  # Drop whatever half opened
+            print(f"Error starting zone '{zone.name}': {e}")
+            return False
+
+    def reopen(self):
+        """
+        Close all streams, re-enumerate devices once and open them again. EQ
+        engines, limiters and their filter state are left untouched.
+        """
+        with self.lock:
+            start = time.perf_counter()
+            try:
+                for zone in self.zones:
+                    zone.backend.close()
+                    zone.stream_open = False
+                self.backend.rescan()
+            except Exception as e:
+                print(f"Error reopening audio streams: {e}")
+                return
+            opened = sum(self.start_zone(zone) for zone in self.zones)
+            if opened:
+                print(f"Audio streams reopened in {(time.perf_counter() - start) * 1000:.1f} ms "
+                      f"({opened} of {len(self.zones)} zones)")
+            else:
+                print("No audio stream could be reopened")
+
+    def retry_failed(self):
+        """Try again to open the zones whose streams failed, leaving the running streams alone."""
+        with self.lock:
+            for zone in self.zones:
+                if not zone.stream_open and self.start_zone(zone):
+                    print(f"[{zone.name}] Audio stream opened")
+
+    def has_failed(self):
+        """Whether some zone's stream could not be opened."""
+        return not all(zone.stream_open for zone in self.zones)
+
+    def resize(self, zone, blocksize):
+        """Change one zone's block size; serialized with reopen()."""
+        with self.lock:
+            start = time.perf_counter()
+            zone.resize_stream(blocksize)
+            print(f"[{zone.name}] Block size {blocksize} frames "
+                  f"({blocksize / zone.engine.sample_rate * 1000:.1f} ms), "
+                  f"switched in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def close(self):
+        for zone in self.zones:
+            zone.backend.close()
+            zone.stream_open = False
+            zone.stop_capture()
+            if zone.spectrum is not None:
+                zone.spectrum.stop()
+
+    def start_capture(self, directory):
+        """Record every zone's callback traffic into its own file in `directory`."""
+        for zone in self.zones:
+            if zone.recorder is None:
+                zone.start_capture(capture_path(directory, zone.name))
+
+    def stop_capture(self):
+        for zone in self.zones:
+            zone.stop_capture()
+
+    def is_active(self):
+        """Whether every opened zone's stream is still delivering callbacks (for DeviceMonitor)."""
+        return all(zone.backend.is_active() for zone in self.zones if zone.stream_open)
+
+    def stats(self):
+        return [zone.stats() for zone in self.zones]